@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -13,9 +13,10 @@ from typing import Dict, List, Optional
 import logging
 from dataclasses import dataclass
 import re
-import threading
-import subprocess
 import json
+from job_runner import JobRunner
+from leases import ACTIVE_QUERY as ACTIVE_LEASES_QUERY
+from thumbnails import ThumbnailCache, ThumbnailError
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +30,9 @@ class APIConfig:
     db_user: str = os.getenv('DB_USER', 'root')
     db_password: str = os.getenv('DB_PASSWORD', 'root')
     jwt_expiration_hours: int = 24
+    thumbnail_cache_dir: str = os.getenv('THUMBNAIL_CACHE_DIR', 'thumbnail_cache')
+    thumbnail_cache_max_mb: int = int(os.getenv('THUMBNAIL_CACHE_MAX_MB', 500))
+    thumbnail_max_age: int = int(os.getenv('THUMBNAIL_MAX_AGE', 7 * 24 * 3600))
     allowed_origins: List[str] = None
 
     def __post_init__(self):
@@ -81,76 +85,112 @@ class DatabaseManager:
                 connection.close()
 
 class ScraperManager:
-    def __init__(self):
-        self.is_running = False
-        self.last_run = None
-        self.last_status = None
-        self.last_error = None
+    """Lance les collectes dans le processus de l'API via le JobRunner
     
-    def run_scraper(self):
-        """Lance le scraper dans un thread séparé"""
+    Un seul job de collecte à la fois; la progression (enregistrements/s,
+    pourcentage), les derniers logs et l'identifiant du job sont exposés par
+    get_status. Le délai maximal est configurable par SCRAPER_TIMEOUT (secondes,
+    0 = sans limite).
+    
+    Les baux en cours (table `scrape_leases`, voir leases.py) donnent l'état de
+    la collecte sur tous les nœuds: un job n'est pas lancé si un autre worker
+    ou conteneur collecte déjà.
+    """
+    def __init__(self, db: 'DatabaseManager', timeout: float = float(os.getenv('SCRAPER_TIMEOUT', 300))):
+        self.db = db
+        self.timeout = timeout or None
+        self.runner = JobRunner(max_workers=1)
+    
+    @property
+    def is_running(self) -> bool:
+        return bool(self.runner.active())
+    
+    def active_leases(self) -> Optional[List[Dict]]:
+        """Baux de collecte en cours sur tous les nœuds (None si la base est injoignable)"""
+        try:
+            leases = self.db.execute_query(ACTIVE_LEASES_QUERY)
+        except Error as e:
+            # Table créée au premier run du scraper
+            if e.errno == 1146:
+                return []
+            logger.warning(f"Lecture des baux de collecte impossible: {e}")
+            return None
+        return [{
+            'dataset': lease['dataset'],
+            'holder': lease['holder'],
+            'runId': lease['run_id'],
+            'recordsCollected': lease['records_collected'],
+            'acquiredAt': lease['acquired_at'].isoformat() if lease['acquired_at'] else None,
+            'heartbeatAt': lease['heartbeat_at'].isoformat() if lease['heartbeat_at'] else None,
+            'expiresAt': lease['expires_at'].isoformat() if lease['expires_at'] else None
+        } for lease in leases]
+    
+    def run_scraper(self, resume: bool = False, mode: Optional[str] = None):
+        """Lance le scraper en tâche de fond
+        
+        Avec `resume`, le scraper reprend le dernier run interrompu à son dernier point de reprise.
+        `mode` (incremental ou full) remplace SCRAPER_MODE pour ce run.
+        """
         if self.is_running:
             return False, "Le scraper est déjà en cours d'exécution"
-        
-        def scraper_thread():
+        leases = self.active_leases()
+        if leases:
+            holders = ', '.join(f"{lease['dataset']} sur {lease['holder']}" for lease in leases)
+            return False, f"Collecte déjà en cours sur un autre nœud ({holders})"
+        
+        argv = ['--resume'] if resume else []
+        if mode:
+            argv += ['--mode', mode]
+        
+        def scraper_job(context):
+            # Import différé: le collecteur n'est chargé qu'au premier lancement
+            import scraper
+            args = scraper.parse_args(argv)
             try:
-                self.is_running = True
-                self.last_run = datetime.now()
-                self.last_status = "running"
-                self.last_error = None
-                
-                # Déterminer le chemin de l'interpréteur Python
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                
-                # Essayer d'utiliser l'interpréteur de l'environnement virtuel
-                venv_python = os.path.join(script_dir, 'venv', 'Scripts', 'python.exe')
-                if os.path.exists(venv_python):
-                    python_executable = venv_python
-                else:
-                    # Fallback vers l'interpréteur système
-                    python_executable = 'python'
-                
-                # Exécuter le scraper
-                result = subprocess.run(
-                    [python_executable, 'scraper.py'],
-                    cwd=script_dir,
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minutes timeout
-                )
-                
-                if result.returncode == 0:
-                    self.last_status = "success"
-                    logger.info("Scraper exécuté avec succès")
-                else:
-                    self.last_status = "error"
-                    self.last_error = result.stderr
-                    logger.error(f"Erreur du scraper: {result.stderr}")
-                    
-            except subprocess.TimeoutExpired:
-                self.last_status = "timeout"
-                self.last_error = "Le scraper a dépassé le délai d'attente"
-                logger.error("Timeout du scraper")
-            except Exception as e:
-                self.last_status = "error"
-                self.last_error = str(e)
-                logger.error(f"Erreur lors de l'exécution du scraper: {e}")
-            finally:
-                self.is_running = False
-        
-        thread = threading.Thread(target=scraper_thread)
-        thread.daemon = True
-        thread.start()
-        
-        return True, "Scraper démarré"
+                scraper.run(args, progress_callback=context.progress)
+            except Exception:
+                # Une annulation ou un dépassement de délai prime sur l'erreur remontée
+                context.check()
+                raise
+            logger.info("Scraper exécuté avec succès")
+        
+        job = self.runner.submit('scraper', scraper_job, timeout=self.timeout)
+        return True, f"Scraper démarré (job {job.id})"
     
-    def get_status(self):
-        """Retourne le statut du scraper"""
+    def cancel(self, job_id: Optional[str] = None) -> bool:
+        """Demande l'annulation du job donné, ou du job en cours"""
+        if job_id is None:
+            active = self.runner.active()
+            if not active:
+                return False
+            job_id = active[0].id
+        return self.runner.cancel(job_id)
+    
+    def get_status(self, job_id: Optional[str] = None):
+        """Retourne le statut du scraper (dernier job de ce nœud, ou job demandé)
+        
+        `is_running` vaut pour tous les nœuds: job local en cours ou bail actif
+        (détaillés dans `leases`).
+        """
+        job = self.runner.get(job_id) if job_id else self.runner.latest()
+        leases = self.active_leases()
+        is_running = self.is_running or bool(leases)
+        if job is None:
+            return {
+                'is_running': is_running,
+                'last_run': None,
+                'last_status': None,
+                'last_error': None,
+                'job': None,
+                'leases': leases
+            }
         return {
-            'is_running': self.is_running,
-            'last_run': self.last_run.isoformat() if self.last_run else None,
-            'last_status': self.last_status,
-            'last_error': self.last_error
+            'is_running': is_running,
+            'last_run': job.started_at.isoformat() if job.started_at else None,
+            'last_status': job.status,
+            'last_error': job.error,
+            'job': job.to_dict(),
+            'leases': leases
         }
 
 class AuthManager:
@@ -202,7 +242,8 @@ limiter = Limiter(
 # Initialisation des managers
 db_manager = DatabaseManager(config)
 auth_manager = AuthManager(config)
-scraper_manager = ScraperManager()
+scraper_manager = ScraperManager(db_manager)
+thumbnail_cache = ThumbnailCache(config.thumbnail_cache_dir, max_bytes=config.thumbnail_cache_max_mb * 1024 * 1024)
 
 def token_required(f):
     """Décorateur pour vérifier l'authentification JWT"""
@@ -646,9 +687,20 @@ def get_filtered_data(filter_type):
 @token_required
 @limiter.limit("10 per hour")
 def trigger_scrape():
-    """POST /api/scrape -> déclenchement du scraper"""
+    """POST /api/scrape -> déclenchement du scraper
+    
+    Corps JSON optionnel: {"resume": true} pour reprendre le dernier run interrompu,
+    {"mode": "full"} pour un rechargement complet (les projets retirés en amont sont supprimés).
+    """
     try:
-        success, message = scraper_manager.run_scraper()
+        payload = request.get_json(silent=True) or {}
+        mode = payload.get('mode')
+        if mode not in (None, 'incremental', 'full'):
+            return standardize_response(
+                error={'message': 'Mode invalide (incremental ou full)', 'code': 'INVALID_MODE'},
+                status_code=400
+            )
+        success, message = scraper_manager.run_scraper(resume=bool(payload.get('resume', False)), mode=mode)
         
         if success:
             return standardize_response(
@@ -668,13 +720,50 @@ def trigger_scrape():
             status_code=500
         )
 
+@app.route('/api/scrape/cancel', methods=['POST'])
+@token_required
+@limiter.limit("10 per hour")
+def cancel_scrape():
+    """POST /api/scrape/cancel -> annulation du job de collecte en cours
+
+    Corps JSON optionnel: {"job_id": "..."}; l'arrêt intervient après le lot en cours.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        if not scraper_manager.cancel(payload.get('job_id')):
+            return standardize_response(
+                error={'message': 'Aucun job de collecte en cours', 'code': 'NO_ACTIVE_JOB'},
+                status_code=404
+            )
+        return standardize_response(
+            data=scraper_manager.get_status(payload.get('job_id')),
+            message='Annulation demandée'
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de l'annulation du scraper: {e}")
+        return standardize_response(
+            error={'message': 'Erreur serveur', 'code': 'SERVER_ERROR'},
+            status_code=500
+        )
+
 @app.route('/api/scrape/status', methods=['GET'])
 @limiter.limit("30 per minute")
 def get_scrape_status():
-    """GET /api/scrape/status -> statut du scraper"""
+    """GET /api/scrape/status -> statut du scraper
+    
+    Inclut le job en cours ou le dernier job de ce nœud (?job_id= pour un job
+    précis): enregistrements/s, pourcentage d'avancement et derniers logs, ainsi
+    que les baux de collecte en cours sur tous les nœuds.
+    """
     try:
+        job_id = request.args.get('job_id')
+        if job_id and scraper_manager.runner.get(job_id) is None:
+            return standardize_response(
+                error={'message': 'Job introuvable', 'code': 'JOB_NOT_FOUND'},
+                status_code=404
+            )
         return standardize_response(
-            data=scraper_manager.get_status()
+            data=scraper_manager.get_status(job_id)
         )
     except Exception as e:
         logger.error(f"Erreur lors de la récupération du statut du scraper: {e}")
@@ -683,6 +772,61 @@ def get_scrape_status():
             status_code=500
         )
 
+@app.route('/api/scrape/runs', methods=['GET'])
+@limiter.limit("30 per minute")
+def get_scrape_runs():
+    """GET /api/scrape/runs -> historique des runs de collecte et leurs mesures par étape
+    
+    Paramètres optionnels: dataset, status et limit (1 à 200, 50 par défaut).
+    Durées en ms (récupération, transformation, insertion), octets téléchargés,
+    appels et reprises HTTP, lignes insérées/mises à jour/ignorées, pic de
+    mémoire (Ko) et débit (lignes/s), du plus récent au plus ancien.
+    """
+    try:
+        limit = int(request.args.get('limit', 50))
+        limit = min(max(limit, 1), 200)
+        
+        where_conditions = []
+        params = []
+        if request.args.get('dataset'):
+            where_conditions.append("dataset_name = %s")
+            params.append(request.args.get('dataset'))
+        if request.args.get('status'):
+            where_conditions.append("status = %s")
+            params.append(request.args.get('status'))
+        where_clause = f"WHERE {' AND '.join(where_conditions)}" if where_conditions else ""
+        
+        # SELECT *: les colonnes de mesures n'existent qu'après le premier run du scraper mis à jour
+        runs = db_manager.execute_query(f"""
+            SELECT * FROM collection_logs
+            {where_clause}
+            ORDER BY collection_time DESC, id DESC
+            LIMIT %s
+        """, tuple(params + [limit]))
+        
+        for run in runs:
+            if run.get('collection_time'):
+                run['collection_time'] = run['collection_time'].isoformat()
+        
+        return standardize_response(
+            data={
+                'runs': runs,
+                'count': len(runs)
+            }
+        )
+        
+    except ValueError:
+        return standardize_response(
+            error={'message': 'Paramètre limit invalide', 'code': 'INVALID_PARAMETER'},
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des runs de collecte: {e}")
+        return standardize_response(
+            error={'message': 'Erreur serveur', 'code': 'SERVER_ERROR'},
+            status_code=500
+        )
+
 @app.route('/api/scrape/reset-limits', methods=['POST'])
 @token_required
 def reset_scraper_limits():
@@ -766,6 +910,136 @@ def get_project(project_id):
             status_code=500
         )
 
+@app.route('/api/projects/<int:project_id>/thumbnail', methods=['GET'])
+@limiter.limit("300 per minute")
+def get_project_thumbnail(project_id):
+    """GET /api/projects/<id>/thumbnail?w=320 -> miniature JPEG de la photo du projet
+    
+    La largeur est ramenée à la plus proche des largeurs générées (160, 320, 640).
+    La photo source n'est téléchargée qu'une fois; la miniature est servie
+    depuis le cache disque avec un ETag et un Cache-Control de longue durée.
+    """
+    try:
+        width = request.args.get('w', type=int)
+        project = db_manager.execute_query(
+            "SELECT url_photo FROM paris_projects WHERE id = %s", (project_id,), fetchall=False
+        )
+        
+        if not project:
+            return standardize_response(
+                error={'message': 'Projet non trouvé', 'code': 'PROJECT_NOT_FOUND'},
+                status_code=404
+            )
+        if not project['url_photo']:
+            return standardize_response(
+                error={'message': 'Projet sans photo', 'code': 'PHOTO_NOT_FOUND'},
+                status_code=404
+            )
+        
+        # Fichier ouvert à la lecture du cache: une éviction concurrente ne le supprime pas avant l'envoi
+        thumbnail = thumbnail_cache.get(project['url_photo'], width, open_file=True)
+        try:
+            response = send_file(thumbnail.file, mimetype='image/jpeg', etag=thumbnail.key,
+                                 max_age=config.thumbnail_max_age, conditional=True)
+        except Exception:
+            thumbnail.file.close()
+            raise
+        if response.status_code == 200:
+            response.content_length = thumbnail.size
+        response.cache_control.public = True
+        return response
+        
+    except ThumbnailError as e:
+        logger.warning(f"Miniature indisponible pour le projet {project_id}: {e}")
+        return standardize_response(
+            error={'message': 'Photo indisponible', 'code': 'PHOTO_UNAVAILABLE'},
+            status_code=502
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération de la miniature du projet {project_id}: {e}")
+        return standardize_response(
+            error={'message': 'Erreur serveur', 'code': 'SERVER_ERROR'},
+            status_code=500
+        )
+
+@app.route('/api/projects/<int:project_id>/history', methods=['GET'])
+@limiter.limit("60 per minute")
+def get_project_history(project_id):
+    """GET /api/projects/<id>/history -> chronologie des modifications du projet
+    
+    Une entrée par run ayant modifié le projet, du plus récent au plus ancien,
+    avec l'ancienne et la nouvelle valeur de chaque colonne modifiée.
+    Paramètre optionnel: limit (1 à 500, 100 par défaut).
+    """
+    try:
+        limit = int(request.args.get('limit', 100))
+        limit = min(max(limit, 1), 500)
+        
+        project = db_manager.execute_query(
+            "SELECT id, record_id, nom_projet, created_at FROM paris_projects WHERE id = %s",
+            (project_id,), fetchall=False
+        )
+        
+        if not project:
+            return standardize_response(
+                error={'message': 'Projet non trouvé', 'code': 'PROJECT_NOT_FOUND'},
+                status_code=404
+            )
+        
+        try:
+            entries = db_manager.execute_query("""
+                SELECT run_id, run_date, changes, recorded_at
+                FROM paris_projects_history
+                WHERE record_key = %s
+                ORDER BY recorded_at DESC, id DESC
+                LIMIT %s
+            """, (project['record_id'], limit))
+        except Error as e:
+            # Table créée au premier run du scraper qui enregistre l'historique
+            if e.errno != 1146:
+                raise
+            entries = []
+        
+        timeline = []
+        for entry in entries:
+            changes = entry['changes']
+            if isinstance(changes, (str, bytes)):
+                changes = json.loads(changes)
+            timeline.append({
+                'runId': entry['run_id'],
+                'runDate': entry['run_date'].isoformat() if entry['run_date'] else None,
+                'recordedAt': entry['recorded_at'].isoformat() if entry['recorded_at'] else None,
+                'changes': {
+                    column: {'old': values[0], 'new': values[1]}
+                    for column, values in changes.items()
+                }
+            })
+        
+        return standardize_response(
+            data={
+                'project': {
+                    'id': project['id'],
+                    'recordId': project['record_id'],
+                    'nomProjet': project['nom_projet'],
+                    'createdAt': project['created_at'].isoformat() if project['created_at'] else None
+                },
+                'history': timeline,
+                'count': len(timeline)
+            }
+        )
+        
+    except ValueError:
+        return standardize_response(
+            error={'message': 'Paramètre limit invalide', 'code': 'INVALID_PARAMETER'},
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération de l'historique du projet {project_id}: {e}")
+        return standardize_response(
+            error={'message': 'Erreur serveur', 'code': 'SERVER_ERROR'},
+            status_code=500
+        )
+
 @app.route('/api/statistics', methods=['GET'])
 @limiter.limit("20 per minute")
 def get_statistics():
@@ -957,9 +1231,13 @@ def get_metadata():
                     'filtered_data': '/api/data/<filter_type>',
                     'projects': '/api/projects',
                     'project_detail': '/api/projects/<id>',
+                    'project_thumbnail': '/api/projects/<id>/thumbnail?w=',
+                    'project_history': '/api/projects/<id>/history',
                     'statistics': '/api/statistics',
                     'scrape': '/api/scrape',
                     'scrape_status': '/api/scrape/status',
+                    'scrape_cancel': '/api/scrape/cancel',
+                    'scrape_runs': '/api/scrape/runs',
                     'scheduler_status': '/api/scheduler/status',
                     'scheduler_config': '/api/scheduler/config',
                     'scheduler_logs': '/api/scheduler/logs',
@@ -1050,7 +1328,8 @@ def get_scheduler_config():
             'frequency': os.getenv('SCRAPE_FREQUENCY', 'daily'),
             'time': os.getenv('SCRAPE_TIME', '02:00'),
             'day': os.getenv('SCRAPE_DAY', 'monday'),
-            'frequencies': ['hourly', 'daily', 'weekly'],
+            'fullRefreshDays': float(os.getenv('SCRAPE_FULL_REFRESH_DAYS', 7)),
+            'frequencies': ['hourly', 'daily', 'weekly', 'adaptive'],
             'days': ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
         }
         
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark du chargement en base: executemany (upsert) contre LOAD DATA LOCAL INFILE
+
+Génère des projets synthétiques, les transforme comme le collecteur puis les
+insère dans une table de benchmark vidée avant chaque mesure, avec chacune
+des deux méthodes. Nécessite un serveur MySQL démarré avec local_infile=ON
+(variables DB_HOST, DB_NAME, DB_USER, DB_PASSWORD comme le scraper).
+
+    python bench_bulk_load.py --sizes 10000,100000,1000000
+"""
+
+import argparse
+import logging
+import os
+import time
+from dataclasses import replace
+from typing import Iterator, List
+
+from datasets import PARIS_PROJECTS
+from opendata_stub import synthetic_records
+from scraper import DatabaseConfig, ParisOpenDataCollector
+from transform import transform_batch
+
+BENCH_DATASET = replace(PARIS_PROJECTS, table='bench_paris_projects')
+
+def synthetic_batches(total: int, batch_size: int, seed: int = 42) -> Iterator[List[tuple]]:
+    """Lots de lignes transformées à partir d'enregistrements réalistes"""
+    records = synthetic_records(total, seed)
+    for start in range(0, total, batch_size):
+        yield transform_batch(records[start:start + batch_size], classify_arrondissements=True)
+
+def run(db_config: DatabaseConfig, method: str, total: int, batch_size: int) -> float:
+    """Charge `total` lignes avec la méthode donnée et retourne la durée en secondes"""
+    collector = ParisOpenDataCollector(db_config, dataset=BENCH_DATASET, load_method=method,
+                                       bulk_rows=max(batch_size, 50000), commit_every=0)
+    with collector.db_session() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_DATASET.table}")
+        cursor.execute(BENCH_DATASET.create_statement())
+        cursor.close()
+
+    # La génération des lignes n'est pas comptée dans la mesure
+    elapsed = 0.0
+    with collector.db_session() as connection:
+        for rows in synthetic_batches(total, batch_size):
+            started = time.perf_counter()
+            collector.insert_rows(rows)
+            elapsed += time.perf_counter() - started
+        started = time.perf_counter()
+        collector.flush_bulk()
+        connection.commit()
+        elapsed += time.perf_counter() - started
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark executemany / LOAD DATA LOCAL INFILE')
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help="Nombres de lignes à charger, séparés par des virgules")
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help="Taille des lots transmis au collecteur (taille des lots d'export)")
+    parser.add_argument('--keep-table', action='store_true',
+                        help="Conserve la table de benchmark à la fin")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    db_config = DatabaseConfig(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'paris_opendata'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', 'root')
+    )
+
+    print(f"{'lignes':>10} {'executemany':>16} {'LOAD DATA':>16} {'accélération':>14}")
+    for total in [int(size) for size in args.sizes.split(',')]:
+        upsert_seconds = run(db_config, 'upsert', total, args.batch_size)
+        bulk_seconds = run(db_config, 'bulk', total, args.batch_size)
+        print(f"{total:>10} {total / upsert_seconds:>12.0f} l/s {total / bulk_seconds:>12.0f} l/s "
+              f"{'x' + format(upsert_seconds / bulk_seconds, '.1f'):>14}")
+
+    if not args.keep_table:
+        collector = ParisOpenDataCollector(db_config, dataset=BENCH_DATASET)
+        with collector.db_session() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_DATASET.table}")
+            cursor.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la normalisation des dates
+
+Compare l'ancienne boucle strptime de ParisOpenDataCollector.parse_date au
+DateNormalizer sur un échantillon réaliste de valeurs (dates répétées entre
+enregistrements, formats ISO et français, valeurs vides ou invalides) et
+vérifie que les deux donnent exactement le même résultat.
+"""
+
+import argparse
+import logging
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from date_parser import DateNormalizer
+
+def legacy_parse_date(date_str: str) -> Optional[str]:
+    """Implémentation historique (trois strptime, exceptions comme contrôle de flux)"""
+    if not date_str:
+        return None
+
+    date_formats = ['%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%dT%H:%M:%S%z']
+
+    for fmt in date_formats:
+        try:
+            parsed_date = datetime.strptime(date_str.split('T')[0], fmt.split('T')[0])
+            return parsed_date.strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+
+    logging.warning(f"Format de date non reconnu: {date_str}")
+    return None
+
+def build_sample(records: int, seed: int = 42) -> List[Optional[str]]:
+    """Trois dates par enregistrement, comme dans process_project_record"""
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    # Les projets partagent un nombre limité de dates de début / livraison
+    days = [start + timedelta(days=rng.randint(0, 4000)) for _ in range(600)]
+    values = []
+    for _ in range(records * 3):
+        day = rng.choice(days)
+        kind = rng.random()
+        if kind < 0.55:
+            values.append(day.isoformat())
+        elif kind < 0.75:
+            values.append(f"{day.isoformat()}T00:00:00+01:00")
+        elif kind < 0.85:
+            values.append(day.strftime('%d/%m/%Y'))
+        elif kind < 0.97:
+            values.append(None)
+        else:
+            values.append(rng.choice(['2e trimestre 2025', 'fin 2024', 'N/A', '2023-02-30']))
+    return values
+
+def run(parse, values) -> float:
+    started = time.perf_counter()
+    for value in values:
+        parse(value)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark de la normalisation des dates')
+    parser.add_argument('--records', type=int, default=50000, help="Nombre d'enregistrements simulés")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    values = build_sample(args.records)
+
+    normalizer = DateNormalizer()
+    mismatches = [v for v in values if legacy_parse_date(v) != normalizer.normalize(v)]
+    if mismatches:
+        print(f"❌ {len(mismatches)} résultats différents, par exemple: {mismatches[:5]}")
+        exit(1)
+
+    legacy_seconds = run(legacy_parse_date, values)
+    normalizer = DateNormalizer()
+    fast_seconds = run(normalizer.normalize, values)
+
+    print(f"Valeurs analysées : {len(values)}")
+    print(f"strptime (historique) : {legacy_seconds * 1000:.1f} ms")
+    print(f"DateNormalizer        : {fast_seconds * 1000:.1f} ms")
+    print(f"Accélération          : x{legacy_seconds / fast_seconds:.1f}")
+    print(f"Compteurs             : {dict(normalizer.stats.counts)}")
+
+if __name__ == "__main__":
+    main()
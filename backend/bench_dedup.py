@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la détection des quasi-doublons (MinHash + LSH en mémoire)
+
+Indexe des projets synthétiques de taille croissante puis cherche les
+candidats d'un lot de quasi-doublons (faute de frappe dans le titre,
+adresse reformatée): le temps par recherche doit rester à peu près constant
+quand l'index grandit, là où une comparaison à chaque ligne croît avec lui.
+
+    python bench_dedup.py --sizes 10000,50000,200000
+"""
+
+import argparse
+import random
+import time
+
+from dedup import LSHIndex, MinHasher, normalize_text, similarity
+
+def synthetic_projects(total: int, rng: random.Random):
+    words = [''.join(rng.choice('abcdefghijlmnoprstuvé') for _ in range(rng.randint(3, 10))) for _ in range(3000)]
+    streets = [f"{rng.choice(['rue', 'avenue', 'boulevard'])} {rng.choice(words).capitalize()}" for _ in range(500)]
+    for index in range(total):
+        title = ' '.join(rng.choice(words) for _ in range(5)).capitalize()
+        address = f"{rng.randint(1, 200)} {rng.choice(streets)}"
+        description = ' '.join(rng.choice(words) for _ in range(40))
+        yield f"p{index}", title, address, description
+
+def perturb(title: str, address: str, rng: random.Random):
+    position = rng.randrange(len(title))
+    return title[:position] + title[position + 1:], address.replace('rue', 'Rue').replace(' ', ', ', 1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Temps de recherche des quasi-doublons selon la taille de l\'index')
+    parser.add_argument('--sizes', default='10000,50000,200000', help="Tailles d'index, séparées par des virgules")
+    parser.add_argument('--queries', type=int, default=500, help="Nombre de quasi-doublons recherchés")
+    parser.add_argument('--bands', type=int, default=16)
+    parser.add_argument('--threshold', type=float, default=0.7)
+    args = parser.parse_args()
+
+    hasher = MinHasher()
+    print(f"{'lignes':>8} {'indexation':>11} {'recherche/ligne':>16} {'candidats':>10} {'rappel':>7}")
+    for size in [int(value) for value in args.sizes.split(',')]:
+        rng = random.Random(size)
+        index = LSHIndex(args.bands)
+        signatures = {}
+        projects = []
+        started = time.perf_counter()
+        for key, title, address, description in synthetic_projects(size, rng):
+            signature = hasher.signature(' '.join(normalize_text(part) for part in (title, address, description[:300])))
+            index.add(key, signature)
+            signatures[key] = signature
+            projects.append((key, title, address, description))
+        indexing = time.perf_counter() - started
+
+        found = candidates = 0
+        started = time.perf_counter()
+        for key, title, address, description in rng.sample(projects, min(args.queries, size)):
+            title, address = perturb(title, address, rng)
+            signature = hasher.signature(' '.join(normalize_text(part) for part in (title, address, description[:300])))
+            matches = index.candidates(signature)
+            candidates += len(matches)
+            found += any(match == key and similarity(signature, signatures[match]) >= args.threshold
+                         for match in matches)
+        queries = min(args.queries, size)
+        per_query = (time.perf_counter() - started) / queries
+        print(f"{size:>8} {indexing:>10.1f}s {per_query * 1000:>13.2f} ms {candidates / queries:>10.1f} "
+              f"{found / queries:>7.1%}")
+
+if __name__ == "__main__":
+    main()
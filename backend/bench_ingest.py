@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark de bout en bout de la collecte contre le stub OpenData local
+
+Démarre opendata_stub dans le processus (ou utilise --stub-url), puis exécute
+le chemin complet du scraper (récupération, transformation, insertion dans
+une table de benchmark) sur un MySQL local, avec les variables DB_HOST,
+DB_NAME, DB_USER, DB_PASSWORD comme le scraper. Affiche les lignes/s, les
+latences p50/p99 des pages, le pic mémoire et le temps par étape; avec
+--output, chaque run est ajouté en JSON à un fichier pour comparer les
+résultats d'un run à l'autre.
+
+    python bench_ingest.py --records 20000 --latency-ms 50 --concurrency 4
+    python bench_ingest.py --records 9000 --rate-429 0.05 --output bench_ingest.jsonl
+
+Le pic mémoire (ru_maxrss) couvre tout le processus, y compris le stub
+lorsqu'il est démarré en interne; lancer opendata_stub.py à part et passer
+--stub-url pour ne mesurer que le collecteur.
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, List
+
+from datasets import PARIS_PROJECTS
+from metrics import peak_rss_kb
+from opendata_stub import OpenDataStub, StubConfig, load_records, synthetic_records
+from scraper import DatabaseConfig, ParisOpenDataCollector, run_collection
+
+# Nom distinct du jeu de données réel: marque haute et logs propres au benchmark
+BENCH_DATASET = replace(PARIS_PROJECTS, name='bench_parissetransforme', table='bench_ingest_projects')
+
+def percentile(values: List[float], rank: float) -> float:
+    """Centile par la méthode du rang le plus proche"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(rank / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def reset_tables(collector: ParisOpenDataCollector):
+    """Repart d'une table vide et sans marque haute pour le jeu de données du benchmark"""
+    collector.create_database_schema()
+    with collector.db_session() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_DATASET.table}")
+        cursor.execute(f"DELETE FROM {BENCH_DATASET.rejects_table}")
+        if collector.deduplicator is not None:
+            for table in (collector.deduplicator.signatures_table, collector.deduplicator.lsh_table):
+                cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("DELETE FROM collection_state WHERE dataset_name = %s", (BENCH_DATASET.name,))
+        cursor.close()
+
+def run_once(db_config: DatabaseConfig, base_url: str, args) -> Dict:
+    """Exécute une collecte complète et retourne ses mesures"""
+    collector = ParisOpenDataCollector(
+        db_config,
+        dataset=BENCH_DATASET,
+        base_url=base_url,
+        concurrency=args.concurrency,
+        requests_per_second=args.rps,
+        page_size=args.page_size,
+        source=args.source,
+        pipeline=args.pipeline,
+        commit_every=args.commit_every,
+        load_method=args.load_method,
+        max_retries=args.max_retries,
+        batch_size=args.batch_size,
+        stream_json=args.stream_json,
+        dedup=args.dedup
+    )
+    reset_tables(collector)
+
+    # Latence de chaque page (jusqu'aux en-têtes de réponse), reprises comprises
+    latencies = []
+    def record_latency(response, *args, **kwargs):
+        if '/records' in response.url or '/exports/' in response.url:
+            latencies.append(response.elapsed.total_seconds() * 1000)
+    collector.session.hooks['response'].append(record_latency)
+
+    started = time.perf_counter()
+    run_collection(collector, 'incremental')
+    elapsed = time.perf_counter() - started
+
+    summary = collector.metrics.summary(collector.total_collected, collector.stats)
+    return {
+        'rows': collector.total_collected,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(collector.total_collected / elapsed, 1) if elapsed > 0 else 0.0,
+        'pages': len(latencies),
+        'latency_p50_ms': round(percentile(latencies, 50), 1),
+        'latency_p99_ms': round(percentile(latencies, 99), 1),
+        'peak_rss_mb': round((peak_rss_kb() or 0) / 1024, 1),
+        'stages': summary,
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de bout en bout de la collecte (stub OpenData local)')
+    stub_group = parser.add_argument_group('stub')
+    stub_group.add_argument('--stub-url', help="Racine d'un stub déjà démarré (sinon un stub est démarré en interne)")
+    stub_group.add_argument('--data', help="Enregistrements enregistrés servis par le stub interne (JSONL)")
+    stub_group.add_argument('--records', type=int, default=9000, help="Nombre d'enregistrements synthétiques")
+    stub_group.add_argument('--latency-ms', type=float, default=50.0, help="Latence ajoutée par le stub à chaque requête")
+    stub_group.add_argument('--jitter-ms', type=float, default=20.0, help="Latence aléatoire supplémentaire")
+    stub_group.add_argument('--rate-429', type=float, default=0.0, help="Proportion de réponses 429")
+    stub_group.add_argument('--fail-rate', type=float, default=0.0, help="Proportion de réponses 503")
+    stub_group.add_argument('--retry-after', type=float, default=0.5, help="Retry-After des 429 (secondes)")
+    stub_group.add_argument('--page-cap', type=int, default=100, help="Valeur maximale de limit acceptée par le stub")
+
+    collector_group = parser.add_argument_group('collecteur')
+    collector_group.add_argument('--concurrency', type=int, default=1)
+    collector_group.add_argument('--rps', type=float, default=50.0, help="Plafond de requêtes par seconde")
+    collector_group.add_argument('--page-size', type=int, default=100)
+    collector_group.add_argument('--source', choices=['records', 'export'], default='records')
+    collector_group.add_argument('--pipeline', action='store_true')
+    collector_group.add_argument('--commit-every', type=int, default=1)
+    collector_group.add_argument('--load-method', choices=['upsert', 'bulk'], default='upsert')
+    collector_group.add_argument('--max-retries', type=int, default=5)
+    collector_group.add_argument('--batch-size', type=int, default=500)
+    collector_group.add_argument('--stream-json', action='store_true', help="Décode les pages au fil de la réception")
+    collector_group.add_argument('--dedup', choices=['off', 'flag', 'merge'], default='off',
+                                 help="Détection des quasi-doublons")
+
+    parser.add_argument('--repeat', type=int, default=1, help="Nombre de runs mesurés")
+    parser.add_argument('--output', help="Fichier JSONL auquel ajouter le résultat de chaque run")
+    parser.add_argument('--keep-table', action='store_true', help="Conserve la table de benchmark à la fin")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    db_config = DatabaseConfig(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'paris_opendata'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', 'root')
+    )
+
+    stub = None
+    base_url = args.stub_url
+    if base_url is None:
+        records = load_records(args.data) if args.data else synthetic_records(args.records)
+        stub = OpenDataStub(StubConfig(
+            records=records,
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            rate_429=args.rate_429,
+            retry_after=args.retry_after,
+            fail_rate=args.fail_rate,
+            max_limit=args.page_cap
+        )).start()
+        base_url = stub.base_url
+
+    try:
+        print(f"{'run':>4} {'lignes':>8} {'durée':>8} {'lignes/s':>10} {'pages':>6} {'p50':>8} {'p99':>8} "
+              f"{'récup.':>8} {'transf.':>8} {'insert.':>8} {'reprises':>8} {'RSS':>8}")
+        for index in range(1, args.repeat + 1):
+            result = run_once(db_config, base_url, args)
+            stages = result['stages']
+            print(f"{index:>4} {result['rows']:>8} {result['seconds']:>7.1f}s {result['rows_per_second']:>10.0f} "
+                  f"{result['pages']:>6} {result['latency_p50_ms']:>6.0f}ms {result['latency_p99_ms']:>6.0f}ms "
+                  f"{stages['fetch_ms']:>6}ms {stages['transform_ms']:>6}ms {stages['insert_ms']:>6}ms "
+                  f"{stages['http_retries']:>8} {result['peak_rss_mb']:>6.0f}Mo")
+            if args.output:
+                entry = {
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'revision': git_revision(),
+                    'config': {name: value for name, value in vars(args).items() if name not in ('output', 'repeat')},
+                    **result
+                }
+                with open(args.output, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    if not args.keep_table:
+        collector = ParisOpenDataCollector(db_config, dataset=BENCH_DATASET)
+        with collector.db_session() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_DATASET.table}")
+            for suffix in ('rejects', 'signatures', 'lsh', 'duplicates'):
+                cursor.execute(f"DROP TABLE IF EXISTS {BENCH_DATASET.table}_{suffix}")
+            cursor.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark mémoire du décodage JSON: response.json() contre décodage en flux
+
+Écrit une réponse /records synthétique de plusieurs centaines de Mo
+({"total_count": N, "results": [...]}) puis la décode, dans un processus
+neuf pour chaque méthode afin que le pic de mémoire résidente (ru_maxrss) ne
+mesure qu'elle:
+
+- full: json.load du corps entier puis transformation de la liste
+- stream: StreamingJSONArray sur des morceaux de 64 Ko, transformation par lots
+
+    python bench_json_stream.py --mb 300 --batch-size 500
+
+Avec --max-growth-mb, le script sert de contrôle automatisé: il échoue (code
+de sortie 1) si le pic mémoire du décodage en flux dépasse de plus de cette
+valeur la mémoire du processus avant décodage, quelle que soit la taille de
+la réponse:
+
+    python bench_json_stream.py --mb 200 --methods stream --max-growth-mb 64
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from json_stream import StreamingJSONArray, iter_batches
+from metrics import peak_rss_kb
+from opendata_stub import synthetic_records
+from transform import transform_batch
+
+def write_payload(path: str, megabytes: int) -> int:
+    """Écrit une réponse /records d'environ `megabytes` Mo et retourne son nombre d'enregistrements"""
+    target = megabytes * 1024 * 1024
+    sample = [json.dumps(record, ensure_ascii=False) for record in synthetic_records(1000)]
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"total_count": 0, "results": [')
+        written = 0
+        while written < target:
+            line = sample[count % len(sample)].replace('"Projet ', f'"Projet {count}-', 1)
+            if count:
+                f.write(',')
+            f.write(line)
+            written += len(line) + 1
+            count += 1
+        f.write(']}')
+    return count
+
+def read_chunks(path: str, chunk_size: int = 64 * 1024):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def decode(path: str, method: str, batch_size: int):
+    """Processus enfant: décode et transforme le fichier, affiche les mesures en JSON"""
+    baseline = peak_rss_kb()
+    started = time.perf_counter()
+    rows = 0
+    if method == 'full':
+        with open(path, 'rb') as f:
+            data = json.loads(f.read())
+        rows = len(transform_batch(data['results'], classify_arrondissements=True))
+    else:
+        for batch in iter_batches(StreamingJSONArray(read_chunks(path)), batch_size):
+            rows += len(transform_batch(batch, classify_arrondissements=True))
+    print(json.dumps({
+        'rows': rows,
+        'seconds': round(time.perf_counter() - started, 2),
+        'baseline_mb': round(baseline / 1024, 1),
+        'peak_mb': round(peak_rss_kb() / 1024, 1),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description='Pic mémoire du décodage JSON complet et en flux')
+    parser.add_argument('--mb', type=int, default=300, help="Taille de la réponse synthétique en Mo")
+    parser.add_argument('--batch-size', type=int, default=500, help="Taille des lots du décodage en flux")
+    parser.add_argument('--methods', default='stream,full', help="Méthodes mesurées, séparées par des virgules")
+    parser.add_argument('--max-growth-mb', type=float, default=None,
+                        help="Échoue si le pic RSS du décodage en flux dépasse le RSS initial de plus de N Mo")
+    parser.add_argument('--decode', choices=['full', 'stream'], help=argparse.SUPPRESS)
+    parser.add_argument('--payload', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.decode:
+        decode(args.payload, args.decode, args.batch_size)
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.json', prefix='bench_records_')
+    os.close(fd)
+    failed = False
+    try:
+        count = write_payload(path, args.mb)
+        print(f"Réponse synthétique: {os.path.getsize(path) / 1024 / 1024:.0f} Mo, {count} enregistrements")
+        print(f"{'méthode':>8} {'lignes':>10} {'durée':>8} {'RSS initial':>12} {'pic RSS':>10}")
+        for method in args.methods.split(','):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--decode', method, '--payload', path,
+                 '--batch-size', str(args.batch_size)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{method:>8} {result['rows']:>10} {result['seconds']:>7.1f}s "
+                  f"{result['baseline_mb']:>9.0f} Mo {result['peak_mb']:>7.0f} Mo")
+            if method == 'stream' and args.max_growth_mb is not None:
+                growth = result['peak_mb'] - result['baseline_mb']
+                if result['rows'] != count or growth > args.max_growth_mb:
+                    failed = True
+                status = 'FAIL' if failed else 'PASS'
+                print(f"{status} décodage en flux: {result['rows']}/{count} lignes, "
+                      f"+{growth:.0f} Mo (maximum {args.max_growth_mb:g} Mo)")
+    finally:
+        os.remove(path)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Chargement en masse par LOAD DATA LOCAL INFILE
+
+Les lignes validées sont écrites dans un fichier TSV temporaire (format
+par défaut de LOAD DATA: tabulations, `\\N` pour NULL, caractères spéciaux
+échappés par un antislash). Au vidage, le fichier est chargé dans une table
+temporaire de même structure que la cible puis fusionné en une seule requête
+INSERT ... SELECT ... ON DUPLICATE KEY UPDATE; les colonnes calculées
+(POINT() des coordonnées) sont évaluées une fois pour tout le lot.
+
+La connexion doit être ouverte avec `allow_local_infile=True` et le serveur
+démarré avec `local_infile=ON`.
+"""
+
+import logging
+import os
+import tempfile
+from typing import IO, Iterable, Optional, Tuple
+
+from datasets import DatasetDefinition
+
+# Échappements du format TSV de LOAD DATA (ESCAPED BY '\\')
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+def format_tsv_value(value) -> str:
+    """Convertit une valeur en champ TSV lisible par LOAD DATA"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return value.translate(_ESCAPES)
+    return str(value)
+
+def write_tsv(rows: Iterable[Tuple], file: IO[str]) -> int:
+    """Écrit des lignes au format TSV et retourne leur nombre"""
+    count = 0
+    for row in rows:
+        file.write('\t'.join([format_tsv_value(value) for value in row]))
+        file.write('\n')
+        count += 1
+    return count
+
+class BulkLoader:
+    """Fichier tampon TSV vidé par LOAD DATA LOCAL INFILE puis fusion ensembliste"""
+    def __init__(self, dataset: DatasetDefinition, directory: Optional[str] = None):
+        self.dataset = dataset
+        self.directory = directory
+        self.pending = 0
+        self._spool = None
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def add(self, rows: Iterable[Tuple]):
+        """Ajoute des lignes (ordre des colonnes du jeu de données) au fichier tampon"""
+        if self._spool is None:
+            self._spool = tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', newline='', suffix='.tsv', prefix=f"{self.dataset.table}_",
+                dir=self.directory, delete=False
+            )
+        self.pending += write_tsv(rows, self._spool)
+
+    def load(self, connection, table: Optional[str] = None) -> int:
+        """Charge le fichier tampon dans `table` et retourne le nombre de lignes affectées
+
+        La validation de la transaction reste à la charge de l'appelant.
+        """
+        if self._spool is None:
+            return 0
+        table = table or self.dataset.table
+        staging = f"{table}_load"
+        columns = ', '.join(self.dataset.columns)
+        self._spool.close()
+
+        cursor = connection.cursor()
+        try:
+            # Table temporaire (propre à la connexion) sans index ni contraintes d'unicité
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {staging} SELECT {columns} FROM {table} LIMIT 0")
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns})",
+                (self._spool.name,)
+            )
+            loaded = cursor.rowcount
+            if loaded != self.pending:
+                logging.warning(f"LOAD DATA: {loaded} lignes chargées sur {self.pending} écrites")
+            cursor.execute(self.dataset.merge_query(staging, table))
+            affected = cursor.rowcount
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+            logging.info(f"Chargement en masse: {loaded} lignes fusionnées dans {table}")
+            return affected
+        finally:
+            cursor.close()
+            self.discard()
+
+    def discard(self):
+        """Supprime le fichier tampon courant"""
+        if self._spool is not None:
+            self._spool.close()
+            try:
+                os.remove(self._spool.name)
+            except FileNotFoundError:
+                pass
+            self._spool = None
+        self.pending = 0
@@ -0,0 +1,136 @@
+"""
+Registre déclaratif des jeux de données opendata.paris.fr collectés
+
+Chaque DatasetDefinition décrit le jeu de données source (identifiant de
+l'API Explore), la transformation des enregistrements en lignes de la table
+cible, la table et sa clé unique. Le collecteur en déduit les URL, le schéma,
+la requête d'upsert et le nom utilisé dans collection_logs.
+
+Pour ajouter un jeu de données, déclarer ses colonnes et sa transformation
+(voir transform_record) puis l'enregistrer avec register_dataset().
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from transform import PROJECT_COLUMNS, transform_record, validate_project_rows
+
+@dataclass(frozen=True)
+class DatasetDefinition:
+    name: str
+    table: str
+    key: str
+    columns: Tuple[str, ...]
+    transform: Callable[[Dict], Tuple]
+    # CREATE TABLE IF NOT EXISTS {table} (...) : le nom est substitué pour la table fantôme
+    schema: str
+    # Validation d'un lot: (code, détail) par ligne rejetée, None pour une ligne valide
+    validate: Optional[Callable[[List[Tuple]], List[Optional[Tuple[str, str]]]]] = None
+    computed_columns: Dict[str, str] = field(default_factory=dict)
+    partition_field: Optional[str] = None
+    touch_column: Optional[str] = 'updated_at'
+    # Colonnes texte comparées par la détection des quasi-doublons (dedup.py), la dernière est tronquée
+    dedup_columns: Tuple[str, ...] = ()
+    # Points geo_point_2d classés par arrondissement en un appel par lot avant la transformation
+    classify_arrondissements: bool = False
+
+    @property
+    def rejects_table(self) -> str:
+        """Table de quarantaine des lignes rejetées par la validation"""
+        return f"{self.table}_rejects"
+
+    def index(self, column: str) -> int:
+        return self.columns.index(column)
+
+    def create_statement(self, table: Optional[str] = None) -> str:
+        """CREATE TABLE du jeu de données, éventuellement sous un autre nom (table fantôme)"""
+        return self.schema.format(table=table or self.table)
+
+    def _update_clause(self) -> str:
+        columns = list(self.columns) + list(self.computed_columns)
+        updates = [f"{column} = VALUES({column})" for column in columns if column != self.key]
+        if self.touch_column:
+            updates.append(f"{self.touch_column} = CURRENT_TIMESTAMP")
+        return f"ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+
+    def upsert_query(self, table: Optional[str] = None) -> str:
+        """Requête INSERT ... ON DUPLICATE KEY UPDATE dérivée des colonnes"""
+        columns = list(self.columns) + list(self.computed_columns)
+        values = ['%s'] * len(self.columns) + list(self.computed_columns.values())
+        return (
+            f"INSERT INTO {table or self.table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(values)}) "
+            f"{self._update_clause()}"
+        )
+
+    def merge_query(self, staging: str, table: Optional[str] = None) -> str:
+        """Fusion ensembliste d'une table de chargement dans la table cible"""
+        columns = list(self.columns) + list(self.computed_columns)
+        values = list(self.columns) + list(self.computed_columns.values())
+        return (
+            f"INSERT INTO {table or self.table} ({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} FROM {staging} "
+            f"{self._update_clause()}"
+        )
+
+PARIS_PROJECTS = DatasetDefinition(
+    name='parissetransforme',
+    table='paris_projects',
+    key='record_id',
+    columns=PROJECT_COLUMNS,
+    transform=transform_record,
+    validate=validate_project_rows,
+    # Calculé à partir des colonnes longitude/latitude de la même ligne
+    computed_columns={'coordonnees_geo': 'POINT(longitude, latitude)'},
+    partition_field='code_postal',
+    dedup_columns=('nom_projet', 'adresse', 'description'),
+    classify_arrondissements=True,
+    schema="""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            record_id VARCHAR(255) UNIQUE,
+            nom_projet TEXT,
+            description TEXT,
+            categorie VARCHAR(255),
+            sous_categorie VARCHAR(255),
+            arrondissement VARCHAR(50),
+            adresse TEXT,
+            code_postal VARCHAR(10),
+            coordonnees_geo POINT NOT NULL,
+            latitude DECIMAL(10, 8) NOT NULL,
+            longitude DECIMAL(11, 8) NOT NULL,
+            etat_avancement VARCHAR(100),
+            date_debut DATE,
+            date_fin DATE,
+            budget DECIMAL(15, 2),
+            maitre_ouvrage VARCHAR(255),
+            url_parisfr TEXT,
+            url_photo TEXT,
+            credit_photo VARCHAR(255),
+            content_hash CHAR(32),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_arrondissement (arrondissement),
+            INDEX idx_code_postal (code_postal),
+            INDEX idx_categorie (categorie),
+            INDEX idx_sous_categorie (sous_categorie),
+            INDEX idx_etat (etat_avancement),
+            INDEX idx_lat_lng (latitude, longitude),
+            SPATIAL INDEX idx_geo (coordonnees_geo)
+        )
+    """
+)
+
+DATASETS: Dict[str, DatasetDefinition] = {}
+
+def register_dataset(definition: DatasetDefinition):
+    """Ajoute un jeu de données au registre"""
+    DATASETS[definition.name] = definition
+
+def get_dataset(name: str) -> DatasetDefinition:
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise ValueError(f"Jeu de données inconnu: {name} (disponibles: {', '.join(sorted(DATASETS))})")
+
+register_dataset(PARIS_PROJECTS)
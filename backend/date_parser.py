@@ -0,0 +1,155 @@
+"""
+Normalisation des dates des enregistrements OpenData au format YYYY-MM-DD
+
+Les formats courants (ISO `YYYY-MM-DD...` et `DD/MM/YYYY`) sont découpés à
+la main sans passer par `strptime`; les autres valeurs retombent sur
+l'ancienne boucle de formats pour garder exactement le même résultat. Les
+valeurs déjà vues sont mémorisées dans un cache borné et les valeurs non
+reconnues sont comptées puis résumées en fin de collecte au lieu d'un
+avertissement par occurrence.
+
+Le cache est partagé, les compteurs non: `recording()` dirige ceux du thread
+courant vers un DateStats propre au lot, que l'appelant fusionne dans les
+compteurs de son run (y compris ceux renvoyés par les processus de
+transformation).
+"""
+
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, Optional
+
+# Formats historiques, utilisés en dernier recours
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%dT%H:%M:%S%z']
+
+def _is_digits(value: str) -> bool:
+    return value.isascii() and value.isdigit()
+
+class DateStats:
+    """Compteurs d'analyse des dates (appels, cache, chemins, valeurs non reconnues)
+
+    Incrémentés sans verrou par un seul thread; `merge` est sûr entre threads.
+    """
+    def __init__(self, max_samples: int = 20):
+        self.max_samples = max_samples
+        self.counts: Counter = Counter()
+        self.unparseable_samples: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Renvoyé par les processus de transformation
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add_unparseable(self, value: str, count: int = 1):
+        if len(self.unparseable_samples) < self.max_samples or value in self.unparseable_samples:
+            self.unparseable_samples[value] += count
+
+    def merge(self, other: 'DateStats'):
+        with self._lock:
+            self.counts.update(other.counts)
+            for value, count in other.unparseable_samples.items():
+                self.add_unparseable(value, count)
+
+    def log_summary(self):
+        """Résumé unique des dates non reconnues pour la collecte"""
+        with self._lock:
+            counts = Counter(self.counts)
+            samples = self.unparseable_samples.most_common(5)
+        if counts['unparseable']:
+            examples = ', '.join(f"{value!r} (x{count})" for value, count in samples)
+            logging.warning(f"{counts['unparseable']} dates non reconnues, par exemple: {examples}")
+        logging.info(
+            f"Dates: {counts['calls']} analysées, {counts['cache_hits']} depuis le cache, "
+            f"{counts['fast_path']} par le chemin rapide, {counts['slow_path']} par strptime"
+        )
+
+class DateNormalizer:
+    def __init__(self, cache_size: int = 4096, max_samples: int = 20):
+        self.cache_size = cache_size
+        self.max_samples = max_samples
+        self._cache: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Compteurs des appels faits hors de recording() (appels isolés, benchmark)
+        self.stats = DateStats(max_samples)
+
+    @contextmanager
+    def recording(self, stats: Optional[DateStats] = None):
+        """Compte les dates analysées par le thread courant dans `stats` (un nouveau DateStats par défaut)"""
+        previous = getattr(self._local, 'stats', None)
+        self._local.stats = stats = stats if stats is not None else DateStats(self.max_samples)
+        try:
+            yield stats
+        finally:
+            self._local.stats = previous
+
+    def normalize(self, date_str: str) -> Optional[str]:
+        """Retourne la date au format YYYY-MM-DD, ou None si elle n'est pas reconnue"""
+        if not date_str:
+            return None
+        stats = getattr(self._local, 'stats', None) or self.stats
+        counts = stats.counts
+        counts['calls'] += 1
+
+        result = self._cache.get(date_str, self)
+        if result is not self:
+            counts['cache_hits'] += 1
+        else:
+            result = self._parse_fast(date_str)
+            if result is not None:
+                counts['fast_path'] += 1
+            else:
+                counts['slow_path'] += 1
+                result = self._parse_slow(date_str)
+            with self._lock:
+                if len(self._cache) >= self.cache_size:
+                    # Éviction de la plus ancienne entrée (ordre d'insertion du dict)
+                    self._cache.pop(next(iter(self._cache)), None)
+                self._cache[date_str] = result
+
+        if result is None:
+            counts['unparseable'] += 1
+            stats.add_unparseable(date_str)
+        return result
+
+    def _parse_fast(self, date_str: str) -> Optional[str]:
+        """Chemin rapide pour `YYYY-MM-DD[T...]` et `DD/MM/YYYY`"""
+        length = len(date_str)
+        if length == 10 or (length > 10 and date_str[10] == 'T'):
+            if date_str[4] == '-' and date_str[7] == '-':
+                year, month, day = date_str[0:4], date_str[5:7], date_str[8:10]
+            elif length == 10 and date_str[2] == '/' and date_str[5] == '/':
+                day, month, year = date_str[0:2], date_str[3:5], date_str[6:10]
+            else:
+                return None
+            # Les années < 1000 gardent le formatage de strftime (sans zéros)
+            if not (_is_digits(year) and _is_digits(month) and _is_digits(day)) or year[0] == '0':
+                return None
+            try:
+                # Valide le jour dans le mois (ex: 30 février) comme strptime
+                parsed = date(int(year), int(month), int(day))
+            except ValueError:
+                return None
+            return parsed.isoformat()
+        return None
+
+    def _parse_slow(self, date_str: str) -> Optional[str]:
+        """Ancienne boucle de formats strptime pour les valeurs atypiques"""
+        for fmt in DATE_FORMATS:
+            try:
+                parsed_date = datetime.strptime(date_str.split('T')[0], fmt.split('T')[0])
+                return parsed_date.strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        return None
+
+# Instance (et cache) partagée par le collecteur et les fonctions de transformation
+date_normalizer = DateNormalizer()
@@ -0,0 +1,332 @@
+"""
+Détection des quasi-doublons à l'ingestion (MinHash et LSH)
+
+La clé des projets est une empreinte du titre, de l'adresse et du code
+postal: une faute de frappe corrigée en amont crée une nouvelle ligne et
+l'ancienne reste en table. Chaque ligne reçoit une signature MinHash de ses
+4-grammes de caractères (titre, adresse, début de la description), calculée
+en un passage par hachage à permutation unique (un seul hachage par
+4-gramme, réparti entre `num_perm` cases). Les signatures sont découpées en
+bandes: deux lignes dont une bande est identique sont candidates, ce qui ne
+demande qu'une recherche par bande au lieu d'une comparaison avec chaque
+ligne. Un candidat n'est retenu que si la similarité estimée dépasse le
+seuil et que les deux points sont proches.
+
+Les signatures et les seaux LSH sont conservés dans MySQL (tables
+`<table>_signatures` et `<table>_lsh`), les paires détectées dans
+`<table>_duplicates` (signalées, ou fusionnées: l'ancienne ligne est
+supprimée au profit de la nouvelle).
+"""
+
+import hashlib
+import math
+import re
+import struct
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from datasets import DatasetDefinition
+
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+Signature = Tuple[int, ...]
+
+def normalize_text(text: Optional[str]) -> str:
+    """Minuscules sans accents ni ponctuation, blancs réduits"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', text).strip()
+
+def shingles(text: str, size: int = 4) -> Set[str]:
+    """Ensemble des n-grammes de caractères du texte normalisé"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle_size: int = 4, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+
+    def signature(self, text: str) -> Optional[Signature]:
+        """Signature du texte (None s'il est vide)
+
+        Hachage à permutation unique: chaque n-gramme est haché une fois, la
+        partie haute du hachage choisit la case et la partie basse y est
+        comparée au minimum. Les cases vides prennent la valeur de la
+        première case remplie à leur droite (densification par rotation).
+        """
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        empty = _MASK32 + 1
+        bins = [empty] * self.num_perm
+        num_perm = self.num_perm
+        seed = self.seed
+        for gram in grams:
+            value = ((zlib.crc32(gram.encode('utf-8')) ^ seed) * 0x9E3779B97F4A7C15) & _MASK64
+            value ^= value >> 31
+            index = (value >> 32) % num_perm
+            low = value & _MASK32
+            if low < bins[index]:
+                bins[index] = low
+
+        signature = list(bins)
+        for index in range(num_perm):
+            if bins[index] == empty:
+                distance = 1
+                while bins[(index + distance) % num_perm] == empty:
+                    distance += 1
+                signature[index] = (bins[(index + distance) % num_perm] + distance * 0x9E3779B9) & _MASK32
+        return tuple(signature)
+
+def similarity(first: Signature, second: Signature) -> float:
+    """Estimation de la similarité de Jaccard: part des cases égales"""
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance à vol d'oiseau en mètres (haversine)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * 6371000 * math.asin(min(1.0, math.sqrt(a)))
+
+def band_buckets(signature: Signature, bands: int) -> List[int]:
+    """Seau de chaque bande de la signature (entier positif de 63 bits, numéro de bande inclus)"""
+    rows = len(signature) // bands
+    buckets = []
+    for band in range(bands):
+        data = struct.pack(f'<H{rows}I', band, *signature[band * rows:(band + 1) * rows])
+        buckets.append(int.from_bytes(hashlib.md5(data).digest()[:8], 'little') >> 1)
+    return buckets
+
+class LSHIndex:
+    """Index LSH en mémoire (seau -> clés)"""
+    def __init__(self, bands: int = 16):
+        self.bands = bands
+        self.buckets: Dict[int, List[str]] = {}
+
+    def add(self, key: str, signature: Signature):
+        for bucket in band_buckets(signature, self.bands):
+            self.buckets.setdefault(bucket, []).append(key)
+
+    def candidates(self, signature: Signature) -> Set[str]:
+        found = set()
+        for bucket in band_buckets(signature, self.bands):
+            found.update(self.buckets.get(bucket, ()))
+        return found
+
+@dataclass
+class Duplicate:
+    record_key: str
+    duplicate_of: str
+    similarity: float
+    distance_m: Optional[float]
+
+@dataclass
+class _Entry:
+    key: str
+    signature: Signature
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+class NearDuplicateDetector:
+    def __init__(self, dataset: DatasetDefinition, num_perm: int = 128, bands: int = 16,
+                 threshold: float = 0.7, max_distance_m: float = 150.0, description_chars: int = 300):
+        """`threshold`: similarité estimée minimale, `max_distance_m`: distance maximale entre
+        les deux points lorsqu'ils sont connus"""
+        if not dataset.dedup_columns:
+            raise ValueError(f"Aucune colonne de comparaison déclarée pour {dataset.name}")
+        if num_perm % bands:
+            raise ValueError("num_perm doit être un multiple du nombre de bandes")
+        self.dataset = dataset
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.threshold = threshold
+        self.max_distance_m = max_distance_m
+        self.description_chars = description_chars
+        self.signatures_table = f"{dataset.table}_signatures"
+        self.lsh_table = f"{dataset.table}_lsh"
+        self.duplicates_table = f"{dataset.table}_duplicates"
+        self._key_index = dataset.index(dataset.key)
+        self._text_indexes = [dataset.index(column) for column in dataset.dedup_columns]
+        self._lat_index = dataset.index('latitude') if 'latitude' in dataset.columns else None
+        self._lon_index = dataset.index('longitude') if 'longitude' in dataset.columns else None
+
+    def unindexed_query(self, limit: int) -> str:
+        """Lignes de la table sans signature, par clé croissante à partir de %s (rattrapage)"""
+        key = self.dataset.key
+        return (
+            f"SELECT {', '.join(f't.{column}' for column in self.dataset.columns)} "
+            f"FROM {self.dataset.table} t LEFT JOIN {self.signatures_table} s ON s.record_key = t.{key} "
+            f"WHERE s.record_key IS NULL AND t.{key} > %s ORDER BY t.{key} LIMIT {int(limit)}"
+        )
+
+    def merged_query(self) -> str:
+        """Clés supprimées par une fusion: elles ne sont pas réinsérées si la source les publie encore"""
+        return f"SELECT DISTINCT duplicate_of FROM {self.duplicates_table} WHERE status = 'merged'"
+
+    def create_statements(self) -> List[str]:
+        return [
+            f"""
+                CREATE TABLE IF NOT EXISTS {self.signatures_table} (
+                    record_key VARCHAR(255) PRIMARY KEY,
+                    signature VARBINARY({4 * self.hasher.num_perm}) NOT NULL,
+                    latitude DECIMAL(10, 8),
+                    longitude DECIMAL(11, 8)
+                )
+            """,
+            f"""
+                CREATE TABLE IF NOT EXISTS {self.lsh_table} (
+                    bucket BIGINT NOT NULL,
+                    record_key VARCHAR(255) NOT NULL,
+                    PRIMARY KEY (bucket, record_key),
+                    INDEX idx_record_key (record_key)
+                )
+            """,
+            f"""
+                CREATE TABLE IF NOT EXISTS {self.duplicates_table} (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    record_key VARCHAR(255) NOT NULL,
+                    duplicate_of VARCHAR(255) NOT NULL,
+                    similarity FLOAT,
+                    distance_m FLOAT,
+                    status ENUM('flagged', 'merged') NOT NULL,
+                    run_id CHAR(32),
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY uk_pair (record_key, duplicate_of),
+                    INDEX idx_duplicate_of (duplicate_of)
+                )
+            """,
+        ]
+
+    def text(self, row: Tuple) -> str:
+        """Texte comparé: colonnes de dedup_columns normalisées (la dernière tronquée)"""
+        parts = [normalize_text(row[index]) for index in self._text_indexes]
+        parts[-1] = parts[-1][:self.description_chars]
+        return ' '.join(part for part in parts if part)
+
+    def _entry(self, row: Tuple) -> Optional[_Entry]:
+        key = row[self._key_index]
+        signature = self.hasher.signature(self.text(row)) if key is not None else None
+        if signature is None:
+            return None
+        latitude = row[self._lat_index] if self._lat_index is not None else None
+        longitude = row[self._lon_index] if self._lon_index is not None else None
+        return _Entry(key, signature, latitude, longitude)
+
+    def _match(self, entry: _Entry, other: _Entry) -> Optional[Duplicate]:
+        score = similarity(entry.signature, other.signature)
+        if score < self.threshold:
+            return None
+        distance = None
+        if None not in (entry.latitude, entry.longitude, other.latitude, other.longitude):
+            distance = distance_m(float(entry.latitude), float(entry.longitude),
+                                  float(other.latitude), float(other.longitude))
+            if distance > self.max_distance_m:
+                return None
+        return Duplicate(entry.key, other.key, round(score, 3), round(distance, 1) if distance is not None else None)
+
+    def _best(self, entry: _Entry, candidates: Iterable[_Entry]) -> Optional[Duplicate]:
+        best = None
+        for other in candidates:
+            if other.key == entry.key:
+                continue
+            match = self._match(entry, other)
+            if match is not None and (best is None or match.similarity > best.similarity):
+                best = match
+        return best
+
+    def _stored_candidates(self, cursor, buckets: Sequence[int], chunk: int = 1000) -> Dict[int, List[_Entry]]:
+        """Lignes déjà indexées partageant un seau, par seau"""
+        found: Dict[int, List[_Entry]] = {}
+        for start in range(0, len(buckets), chunk):
+            part = buckets[start:start + chunk]
+            cursor.execute(f"""
+                SELECT l.bucket, s.record_key, s.signature, s.latitude, s.longitude
+                FROM {self.lsh_table} l
+                JOIN {self.signatures_table} s ON s.record_key = l.record_key
+                WHERE l.bucket IN ({', '.join(['%s'] * len(part))})
+            """, tuple(part))
+            for bucket, key, signature, latitude, longitude in cursor.fetchall():
+                values = struct.unpack(f'<{self.hasher.num_perm}I', bytes(signature))
+                found.setdefault(bucket, []).append(_Entry(key, values, latitude, longitude))
+        return found
+
+    def detect(self, cursor, rows: Sequence[Tuple], new_keys: Set[str]) -> List[Duplicate]:
+        """Indexe les lignes du lot et retourne les quasi-doublons des nouvelles clés
+
+        Une nouvelle ligne est comparée aux lignes déjà indexées et aux lignes
+        qui la précèdent dans le lot, uniquement via les seaux LSH partagés.
+        """
+        entries = [entry for entry in map(self._entry, rows) if entry is not None]
+        if not entries:
+            return []
+        buckets = {entry.key: band_buckets(entry.signature, self.bands) for entry in entries}
+
+        new_entries = [entry for entry in entries if entry.key in new_keys]
+        stored = self._stored_candidates(
+            cursor, sorted({bucket for entry in new_entries for bucket in buckets[entry.key]})
+        ) if new_entries else {}
+
+        duplicates = []
+        batch_index: Dict[int, List[_Entry]] = {}
+        for entry in entries:
+            if entry.key in new_keys:
+                candidates = {}
+                for bucket in buckets[entry.key]:
+                    for other in stored.get(bucket, []) + batch_index.get(bucket, []):
+                        candidates[other.key] = other
+                match = self._best(entry, candidates.values())
+                if match is not None:
+                    duplicates.append(match)
+            for bucket in buckets[entry.key]:
+                batch_index.setdefault(bucket, []).append(entry)
+
+        self._store(cursor, entries, buckets)
+        return duplicates
+
+    def index(self, cursor, rows: Sequence[Tuple]) -> int:
+        """Indexe des lignes sans les comparer (lignes déjà en table à l'activation de la détection)"""
+        entries = [entry for entry in map(self._entry, rows) if entry is not None]
+        if entries:
+            self._store(cursor, entries, {entry.key: band_buckets(entry.signature, self.bands) for entry in entries})
+        return len(entries)
+
+    def _store(self, cursor, entries: List[_Entry], buckets: Dict[str, List[int]]):
+        """Remplace les signatures et les seaux des lignes du lot"""
+        self.forget(cursor, [entry.key for entry in entries], signatures=False)
+        cursor.executemany(f"""
+            INSERT INTO {self.signatures_table} (record_key, signature, latitude, longitude)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE signature = VALUES(signature),
+                latitude = VALUES(latitude), longitude = VALUES(longitude)
+        """, [(entry.key, struct.pack(f'<{self.hasher.num_perm}I', *entry.signature),
+               entry.latitude, entry.longitude) for entry in entries])
+        cursor.executemany(f"INSERT IGNORE INTO {self.lsh_table} (bucket, record_key) VALUES (%s, %s)",
+                           [(bucket, entry.key) for entry in entries for bucket in buckets[entry.key]])
+
+    def forget(self, cursor, keys: Sequence[str], signatures: bool = True):
+        """Retire des lignes de l'index"""
+        if not keys:
+            return
+        placeholders = ', '.join(['%s'] * len(keys))
+        cursor.execute(f"DELETE FROM {self.lsh_table} WHERE record_key IN ({placeholders})", tuple(keys))
+        if signatures:
+            cursor.execute(f"DELETE FROM {self.signatures_table} WHERE record_key IN ({placeholders})", tuple(keys))
+
+    def record(self, cursor, duplicates: List[Duplicate], status: str, run_id: Optional[str]):
+        cursor.executemany(f"""
+            INSERT IGNORE INTO {self.duplicates_table}
+            (record_key, duplicate_of, similarity, distance_m, status, run_id)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [(duplicate.record_key, duplicate.duplicate_of, duplicate.similarity, duplicate.distance_m,
+               status, run_id) for duplicate in duplicates])
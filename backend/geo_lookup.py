@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Arrondissement d'un point par test d'appartenance aux polygones des limites
+
+Les limites des arrondissements sont lues depuis un fichier GeoJSON local
+(export du jeu de données `arrondissements` d'opendata.paris.fr, voir
+download_boundaries). L'emprise est découpée en une grille uniforme
+précalculée: une cellule que ne traverse aucune limite porte directement
+son arrondissement (ou aucun), seules les cellules traversées par une
+limite gardent la courte liste des polygones candidats à tester. La
+recherche d'un point est donc en temps constant, et classify() traite un
+lot entier de points en un appel.
+
+    python geo_lookup.py --download
+    python geo_lookup.py --locate 48.8566 2.3522
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import requests
+
+BOUNDARIES_URL = "https://opendata.paris.fr/api/explore/v2.1/catalog/datasets/arrondissements/exports/geojson"
+DEFAULT_BOUNDARIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'arrondissements.geojson')
+
+Ring = List[Tuple[float, float]]
+# Un polygone: contour extérieur puis trous, en (longitude, latitude)
+Polygon = List[Ring]
+
+def _ring_contains(ring: Ring, x: float, y: float) -> bool:
+    """Test du rayon horizontal (pair-impair) pour un anneau"""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+def polygon_contains(polygon: Polygon, x: float, y: float) -> bool:
+    """Le point est dans le contour extérieur et hors des trous"""
+    if not _ring_contains(polygon[0], x, y):
+        return False
+    return not any(_ring_contains(hole, x, y) for hole in polygon[1:])
+
+class ArrondissementIndex:
+    def __init__(self, areas: Sequence[Tuple[int, List[Polygon]]], cell_size: float = 0.0025):
+        """`areas`: (numéro d'arrondissement, polygones), `cell_size`: côté des cellules en degrés"""
+        self.labels = [label for label, _ in areas]
+        self.polygons = [polygons for _, polygons in areas]
+        self.bboxes = []
+        for polygons in self.polygons:
+            xs = [x for polygon in polygons for x, _ in polygon[0]]
+            ys = [y for polygon in polygons for _, y in polygon[0]]
+            self.bboxes.append((min(xs), min(ys), max(xs), max(ys)))
+        self.min_x = min(bbox[0] for bbox in self.bboxes)
+        self.min_y = min(bbox[1] for bbox in self.bboxes)
+        self.cell_size = cell_size
+        self.nx = int((max(bbox[2] for bbox in self.bboxes) - self.min_x) / cell_size) + 1
+        self.ny = int((max(bbox[3] for bbox in self.bboxes) - self.min_y) / cell_size) + 1
+        self.cells = self._build_grid()
+
+    def _cell_range(self, low: float, high: float, origin: float, count: int) -> range:
+        start = max(0, int((low - origin) / self.cell_size))
+        end = min(count - 1, int((high - origin) / self.cell_size))
+        return range(start, end + 1)
+
+    def _segment_cells(self, x1: float, y1: float, x2: float, y2: float) -> Iterable[int]:
+        """Cellules traversées par un segment: par rangée, l'intervalle en x de la portion du segment"""
+        for iy in self._cell_range(min(y1, y2), max(y1, y2), self.min_y, self.ny):
+            if y1 == y2:
+                low, high = min(x1, x2), max(x1, x2)
+            else:
+                band_low = self.min_y + iy * self.cell_size
+                xs = [x1 + (min(max(y, min(y1, y2)), max(y1, y2)) - y1) * (x2 - x1) / (y2 - y1)
+                      for y in (band_low, band_low + self.cell_size)]
+                low, high = min(xs), max(xs)
+            for ix in self._cell_range(low, high, self.min_x, self.nx):
+                yield iy * self.nx + ix
+
+    def _build_grid(self) -> list:
+        """Précalcule, par cellule: l'indice de la zone (int, -1 hors zone) ou les zones candidates (tuple)"""
+        # Cellules traversées par une limite
+        boundary: Dict[int, set] = {}
+        for index, polygons in enumerate(self.polygons):
+            for polygon in polygons:
+                for ring in polygon:
+                    x1, y1 = ring[-1]
+                    for x2, y2 in ring:
+                        for cell in self._segment_cells(x1, y1, x2, y2):
+                            boundary.setdefault(cell, set()).add(index)
+                        x1, y1 = x2, y2
+
+        # Une zone qui contient une cellule sans que ses limites la traversent contient aussi son centre
+        for cell, candidates in boundary.items():
+            iy, ix = divmod(cell, self.nx)
+            inner = self._scan(*self._center(ix, iy))
+            if inner >= 0:
+                candidates.add(inner)
+
+        cells: list = [None] * (self.nx * self.ny)
+        for cell, candidates in boundary.items():
+            cells[cell] = tuple(sorted(candidates))
+
+        # Deux cellules voisines sans limite appartiennent à la même zone: un seul test par composante
+        for start in range(len(cells)):
+            if cells[start] is not None:
+                continue
+            iy, ix = divmod(start, self.nx)
+            value = self._scan(*self._center(ix, iy))
+            cells[start] = value
+            queue = deque([start])
+            while queue:
+                iy, ix = divmod(queue.popleft(), self.nx)
+                for nx_, ny_ in ((ix - 1, iy), (ix + 1, iy), (ix, iy - 1), (ix, iy + 1)):
+                    if 0 <= nx_ < self.nx and 0 <= ny_ < self.ny:
+                        neighbour = ny_ * self.nx + nx_
+                        if cells[neighbour] is None:
+                            cells[neighbour] = value
+                            queue.append(neighbour)
+        return cells
+
+    def _center(self, ix: int, iy: int) -> Tuple[float, float]:
+        return self.min_x + (ix + 0.5) * self.cell_size, self.min_y + (iy + 0.5) * self.cell_size
+
+    def _scan(self, x: float, y: float) -> int:
+        """Recherche exhaustive (construction de la grille): indice de zone ou -1"""
+        for index, (min_x, min_y, max_x, max_y) in enumerate(self.bboxes):
+            if min_x <= x <= max_x and min_y <= y <= max_y and self._contains(index, x, y):
+                return index
+        return -1
+
+    def _contains(self, index: int, x: float, y: float) -> bool:
+        return any(polygon_contains(polygon, x, y) for polygon in self.polygons[index])
+
+    def locate(self, latitude: float, longitude: float) -> Optional[int]:
+        """Numéro d'arrondissement du point, ou None hors des limites"""
+        ix = int((longitude - self.min_x) / self.cell_size)
+        iy = int((latitude - self.min_y) / self.cell_size)
+        if not (0 <= ix < self.nx and 0 <= iy < self.ny) or longitude < self.min_x or latitude < self.min_y:
+            return None
+        cell = self.cells[iy * self.nx + ix]
+        if isinstance(cell, int):
+            return self.labels[cell] if cell >= 0 else None
+        for index in cell:
+            if self._contains(index, longitude, latitude):
+                return self.labels[index]
+        return None
+
+    def classify(self, points: Iterable[Optional[Tuple[float, float]]]) -> List[Optional[int]]:
+        """Classe un lot de points (latitude, longitude), None pour un point absent ou hors limites"""
+        locate = self.locate
+        return [locate(point[0], point[1]) if point is not None else None for point in points]
+
+    @classmethod
+    def from_geojson(cls, path: str, label_property: str = 'c_ar', cell_size: float = 0.0025) -> 'ArrondissementIndex':
+        """Construit l'index depuis un FeatureCollection de Polygon / MultiPolygon"""
+        with open(path, encoding='utf-8') as f:
+            collection = json.load(f)
+        areas = []
+        for feature in collection.get('features', []):
+            geometry = feature.get('geometry') or {}
+            label = int(feature.get('properties', {})[label_property])
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                continue
+            areas.append((label, [[[(float(x), float(y)) for x, y, *_ in ring] for ring in polygon]
+                                  for polygon in polygons]))
+        if not areas:
+            raise ValueError(f"Aucun polygone dans {path}")
+        return cls(areas, cell_size)
+
+_index: Optional[ArrondissementIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+def get_index() -> Optional[ArrondissementIndex]:
+    """Index chargé une fois par processus depuis ARRONDISSEMENTS_GEOJSON (None si le fichier est absent)"""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                path = os.getenv('ARRONDISSEMENTS_GEOJSON', DEFAULT_BOUNDARIES_PATH)
+                if os.path.exists(path):
+                    _index = ArrondissementIndex.from_geojson(path)
+                    logging.info(f"Limites des arrondissements chargées depuis {path} ({_index.nx}x{_index.ny} cellules)")
+                else:
+                    logging.warning(f"Limites des arrondissements absentes ({path}), "
+                                    f"arrondissement déduit du code postal uniquement")
+                _index_loaded = True
+    return _index
+
+def download_boundaries(path: str = DEFAULT_BOUNDARIES_PATH, url: str = BOUNDARIES_URL) -> str:
+    """Télécharge les limites des arrondissements (GeoJSON) dans `path`"""
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    collection = response.json()
+    if not collection.get('features'):
+        raise ValueError(f"Aucune limite dans la réponse de {url}")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(collection, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    logging.info(f"{len(collection['features'])} limites d'arrondissements enregistrées dans {path}")
+    return path
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Limites des arrondissements de Paris")
+    parser.add_argument('--path', default=os.getenv('ARRONDISSEMENTS_GEOJSON', DEFAULT_BOUNDARIES_PATH))
+    parser.add_argument('--download', action='store_true', help="Télécharge les limites depuis opendata.paris.fr")
+    parser.add_argument('--if-missing', action='store_true', help="Avec --download, seulement si le fichier est absent")
+    parser.add_argument('--locate', nargs=2, type=float, metavar=('LATITUDE', 'LONGITUDE'))
+    args = parser.parse_args()
+
+    if args.download and not (args.if_missing and os.path.exists(args.path)):
+        download_boundaries(args.path)
+    if args.locate:
+        index = ArrondissementIndex.from_geojson(args.path)
+        print(index.locate(*args.locate))
+
+if __name__ == "__main__":
+    main()
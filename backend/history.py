@@ -0,0 +1,149 @@
+"""
+Historique des modifications des lignes, en ajout seul
+
+L'upsert écrase les valeurs précédentes. Avant l'écriture d'un lot, les
+valeurs en service des lignes modifiées sont lues en une requête et seules
+les colonnes qui changent sont enregistrées, en une ligne JSON
+{colonne: [ancienne, nouvelle]} par enregistrement et par run, dans
+`<table>_history`.
+
+La table est partitionnée par mois de run (RANGE sur TO_DAYS(run_date)):
+la partition du mois est ajoutée au début de chaque run et les runs
+anciens sont purgés par DROP PARTITION, sans parcourir la table.
+"""
+
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from datasets import DatasetDefinition
+
+_PARTITION = re.compile(r'^p(\d{4})(\d{2})$')
+
+def month_start(day: date, months: int = 0) -> date:
+    """Premier jour du mois de `day`, décalé de `months` mois"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(day: date) -> str:
+    return f"p{day.year}{day.month:02d}"
+
+def partition_clause(day: date) -> str:
+    """Partition du mois de `day` (bornée par le premier jour du mois suivant)"""
+    return f"PARTITION {partition_name(day)} VALUES LESS THAN (TO_DAYS('{month_start(day, 1).isoformat()}'))"
+
+def unchanged(stored, value) -> bool:
+    """La nouvelle valeur est égale à la valeur en base, à l'échelle des DECIMAL et au format des dates"""
+    if stored is None or value is None:
+        return stored is value
+    if isinstance(stored, Decimal):
+        try:
+            return Decimal(str(value)).quantize(stored) == stored
+        except (InvalidOperation, ValueError):
+            return False
+    if isinstance(stored, (date, datetime)):
+        return str(value) == stored.isoformat()
+    return stored == value
+
+def stored_value(value):
+    """Valeur en base sérialisable en JSON"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+class ChangeHistory:
+    def __init__(self, dataset: DatasetDefinition):
+        self.dataset = dataset
+        self.table = f"{dataset.table}_history"
+        self.key_index = dataset.index(dataset.key)
+        # Colonnes suivies: toutes les colonnes de données hors clé et empreinte
+        self.columns = [column for column in dataset.columns if column not in (dataset.key, 'content_hash')]
+        self._indexes = [dataset.index(column) for column in self.columns]
+
+    def create_statement(self, today: date) -> str:
+        return f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                id BIGINT AUTO_INCREMENT,
+                record_key VARCHAR(255) NOT NULL,
+                run_id CHAR(32),
+                run_date DATE NOT NULL,
+                changes JSON NOT NULL,
+                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, run_date),
+                INDEX idx_record (record_key, run_date)
+            )
+            PARTITION BY RANGE (TO_DAYS(run_date)) (
+                {partition_clause(today)},
+                PARTITION pmax VALUES LESS THAN MAXVALUE
+            )
+        """
+
+    def partitions(self, cursor) -> List[str]:
+        cursor.execute("""
+            SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        """, (self.table,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def ensure_partition(self, cursor, today: date) -> bool:
+        """Ajoute la partition du mois en la détachant de pmax (False si elle existe déjà)"""
+        existing = self.partitions(cursor)
+        if partition_name(today) in existing:
+            return False
+        # Les mois manquants entre la dernière partition et aujourd'hui restent dans la suivante
+        cursor.execute(f"""
+            ALTER TABLE {self.table} REORGANIZE PARTITION pmax INTO (
+                {partition_clause(today)},
+                PARTITION pmax VALUES LESS THAN MAXVALUE
+            )
+        """)
+        return True
+
+    def expired_partitions(self, cursor, before: date) -> List[str]:
+        """Partitions dont tous les runs sont antérieurs à `before`"""
+        expired = []
+        for name in self.partitions(cursor):
+            match = _PARTITION.match(name)
+            if match and month_start(date(int(match.group(1)), int(match.group(2)), 1), 1) <= before:
+                expired.append(name)
+        return sorted(expired)
+
+    def drop_partitions(self, cursor, names: Sequence[str]):
+        if names:
+            cursor.execute(f"ALTER TABLE {self.table} DROP PARTITION {', '.join(names)}")
+
+    def current_query(self, count: int, table: Optional[str] = None) -> str:
+        """Valeurs en service des colonnes suivies pour `count` clés"""
+        return (
+            f"SELECT {self.dataset.key}, {', '.join(self.columns)} FROM {table or self.dataset.table} "
+            f"WHERE {self.dataset.key} IN ({', '.join(['%s'] * count)})"
+        )
+
+    def diff(self, current: Dict[str, Tuple], rows: Sequence[Tuple]) -> List[Tuple[str, str]]:
+        """(clé, JSON des colonnes modifiées) pour chaque ligne dont une colonne suivie change
+
+        `current`: clé -> valeurs en base des colonnes suivies (ordre de `columns`).
+        """
+        changes = []
+        for row in rows:
+            old = current.get(row[self.key_index])
+            if old is None:
+                continue
+            changed = {}
+            for column, index, stored in zip(self.columns, self._indexes, old):
+                value = row[index]
+                if not unchanged(stored, value):
+                    changed[column] = [stored_value(stored), value]
+            if changed:
+                changes.append((row[self.key_index], json.dumps(changed, ensure_ascii=False, default=str)))
+        return changes
+
+    def insert_query(self) -> str:
+        return f"""
+            INSERT INTO {self.table} (record_key, run_id, run_date, changes)
+            VALUES (%s, %s, %s, %s)
+        """
@@ -0,0 +1,154 @@
+"""
+Cache disque des réponses HTTP avec requêtes conditionnelles
+
+Chaque réponse est stockée avec son ETag / Last-Modified; à la requête
+suivante on envoie If-None-Match / If-Modified-Since et, sur un 304, on
+relit le corps depuis le disque. L'index (SQLite) garde la date du dernier
+accès pour évincer les entrées les moins récemment utilisées au-delà de la
+taille maximale.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import urlencode
+
+import requests
+
+class ResponseCache:
+    def __init__(self, directory: str, max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER,
+                last_access REAL
+            )
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict] = None) -> str:
+        """Clé de cache dérivée de l'URL et des paramètres triés"""
+        query = urlencode(sorted((params or {}).items()))
+        return hashlib.sha256(f"{url}?{query}".encode()).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.body")
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if not row or not os.path.exists(self._body_path(key)):
+            return None
+        return {'etag': row[0], 'last_modified': row[1]}
+
+    def _read(self, key: str) -> bytes:
+        with open(self._body_path(key), 'rb') as f:
+            body = f.read()
+        with self._lock:
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return body
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _store(self, key: str, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str]):
+        tmp_path = f"{self._body_path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, self._body_path(key))
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO entries (key, url, etag, last_modified, size, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, url, etag, last_modified, len(body), time.time()))
+            self._db.commit()
+        self._evict()
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille maximale"""
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self._db.execute(
+                "SELECT key, size FROM entries ORDER BY last_access ASC"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._body_path(key))
+                except FileNotFoundError:
+                    pass
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                self.stats['evictions'] += 1
+            self._db.commit()
+
+    def fetch(self, session: requests.Session, url: str, params: Optional[Dict] = None,
+              timeout: int = 30, on_download: Optional[Callable[[bytes], None]] = None) -> bytes:
+        """Effectue un GET conditionnel et retourne le corps (depuis le cache sur un 304)
+
+        `on_download` reçoit le corps des réponses réellement téléchargées (hors 304).
+        """
+        key = self.make_key(url, params)
+        entry = self._lookup(key)
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = session.get(url, params=params, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry:
+            try:
+                body = self._read(key)
+            except FileNotFoundError:
+                # Corps évincé entre la recherche et le 304: entrée oubliée, requête sans condition
+                logging.info(f"Cache HTTP: corps de {url} évincé, nouveau téléchargement")
+                self._forget(key)
+                response = session.get(url, params=params, timeout=timeout)
+            else:
+                self.stats['hits'] += 1
+                self.stats['bytes_saved'] += len(body)
+                return body
+
+        response.raise_for_status()
+        body = response.content
+        self.stats['misses'] += 1
+        if on_download is not None:
+            on_download(body)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self._store(key, url, body, etag, last_modified)
+        return body
+
+    def log_summary(self):
+        logging.info(
+            f"Cache HTTP: {self.stats['hits']} réponses 304 réutilisées, {self.stats['misses']} téléchargements, "
+            f"{self.stats['bytes_saved'] / 1024:.0f} Ko économisés, {self.stats['evictions']} évictions"
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,191 @@
+"""
+Exécution des collectes en tâche de fond dans le processus de l'API
+
+Chaque job s'exécute dans un thread du pool (un seul à la fois par défaut) et
+reçoit un JobContext: il y publie sa progression, qui sert à calculer le
+débit et le pourcentage d'avancement, et y vérifie l'annulation et le délai
+maximal. Ces vérifications ont lieu entre deux lots: une requête HTTP ou un
+chargement en cours n'est pas interrompu (il est borné par son propre délai)
+et le job s'arrête au point de contrôle suivant.
+
+Les logs émis pendant le job sont conservés au fil de l'eau dans un tampon
+borné consultable pendant l'exécution. Seuls ceux émis dans le contexte du
+job (variable `current_job`) y sont copiés: les threads que le job démarre
+doivent hériter de son contexte (`contextvars.copy_context().run`), les
+logs des requêtes Flask et des autres jobs sont écartés.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Identifiant du job en cours dans le contexte d'exécution courant
+current_job: ContextVar[Optional[str]] = ContextVar('current_job', default=None)
+
+class JobCancelled(Exception):
+    """Levée dans le job lorsqu'une annulation a été demandée"""
+
+class JobTimeout(Exception):
+    """Levée dans le job lorsque son délai maximal est dépassé"""
+
+class _JobLogHandler(logging.Handler):
+    """Copie dans son tampon les logs émis dans le contexte d'un job"""
+    def __init__(self, job: 'Job'):
+        super().__init__(level=logging.INFO)
+        self.job = job
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Les filtres s'exécutent dans le thread qui émet le log
+        return current_job.get() == self.job.id and super().filter(record)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.job.logs.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+class Job:
+    def __init__(self, name: str, timeout: Optional[float] = None, max_log_lines: int = 200):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.timeout = timeout
+        self.status = 'queued'
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.logs = deque(maxlen=max_log_lines)
+        # Progression par partie du job (ex: un jeu de données): (enregistrements, total attendu)
+        self.progress: Dict[str, tuple] = {}
+        self._cancel = threading.Event()
+        self._started = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def to_dict(self, log_lines: int = 20) -> Dict:
+        with self._lock:
+            parts = dict(self.progress)
+        records = sum(done for done, _ in parts.values())
+        totals = [total for _, total in parts.values()]
+        total = sum(totals) if totals and all(totals) else None
+        elapsed = (time.monotonic() - self._started) if self._started else 0.0
+        if self.finished_at and self.started_at:
+            elapsed = (self.finished_at - self.started_at).total_seconds()
+        return {
+            'job_id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'elapsed_seconds': round(elapsed, 1),
+            'records': records,
+            'total': total,
+            'percent_complete': round(min(100.0, 100.0 * records / total), 1) if total else None,
+            'records_per_second': round(records / elapsed, 1) if elapsed > 0 else 0.0,
+            'parts': {name: {'records': done, 'total': part_total} for name, (done, part_total) in parts.items()},
+            'logs': list(self.logs)[-log_lines:] if log_lines else []
+        }
+
+class JobContext:
+    """Interface passée au job: progression, annulation et délai"""
+    def __init__(self, job: Job):
+        self.job = job
+
+    def check(self):
+        """Lève JobCancelled ou JobTimeout si le job doit s'arrêter (appelé entre deux lots)"""
+        if self.job._cancel.is_set():
+            raise JobCancelled("Job annulé")
+        if self.job.timeout and time.monotonic() - self.job._started > self.job.timeout:
+            raise JobTimeout(f"Délai maximal de {self.job.timeout:g}s dépassé")
+
+    def progress(self, part: str, records: int, total: Optional[int] = None):
+        """Publie l'avancement d'une partie du job puis vérifie l'arrêt"""
+        with self.job._lock:
+            self.job.progress[part] = (records, total)
+        self.check()
+
+class JobRunner:
+    def __init__(self, max_workers: int = 1, history: int = 20):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, target: Callable[[JobContext], None], timeout: Optional[float] = None) -> Job:
+        """Planifie `target(context)` et retourne le job (son id permet de le suivre)"""
+        job = Job(name, timeout)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Ne garder que l'historique récent des jobs terminés
+            while len(self._jobs) > self._history:
+                oldest = next((j for j in self._jobs.values() if not j.is_active), None)
+                if oldest is None:
+                    break
+                del self._jobs[oldest.id]
+        self._executor.submit(self._run, job, target)
+        return job
+
+    def _run(self, job: Job, target: Callable[[JobContext], None]):
+        handler = _JobLogHandler(job)
+        root = logging.getLogger()
+        root.addHandler(handler)
+        token = current_job.set(job.id)
+        job.status = 'running'
+        job.started_at = datetime.now()
+        job._started = time.monotonic()
+        try:
+            context = JobContext(job)
+            context.check()
+            target(context)
+            job.status = 'success'
+        except JobCancelled as e:
+            job.status = 'cancelled'
+            job.error = str(e)
+            logging.warning(f"Job {job.name} ({job.id}) annulé")
+        except JobTimeout as e:
+            job.status = 'timeout'
+            job.error = str(e)
+            logging.error(f"Job {job.name} ({job.id}): {e}")
+        except Exception as e:
+            job.status = 'error'
+            job.error = str(e)
+            logging.error(f"Job {job.name} ({job.id}) en erreur: {e}")
+        finally:
+            job.finished_at = datetime.now()
+            root.removeHandler(handler)
+            current_job.reset(token)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def latest(self) -> Optional[Job]:
+        with self._lock:
+            return next(reversed(self._jobs.values()), None)
+
+    def active(self) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.is_active]
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """Demande l'annulation d'un job (prise en compte au prochain point de contrôle)"""
+        job = self._jobs.get(job_id)
+        if job is None or not job.is_active:
+            return False
+        job._cancel.set()
+        return True
@@ -0,0 +1,129 @@
+"""
+Décodage incrémental d'un tableau JSON au fil de la réception
+
+`response.json()` attend tout le corps puis le décode d'un bloc: la mémoire
+d'une requête croît avec la taille de la réponse. StreamingJSONArray lit le
+corps par morceaux et produit un à un les éléments du tableau `results`
+(clé configurable) d'un objet JSON, ou d'un tableau JSON de premier niveau
+(export au format json), en décodant chaque élément avec
+`JSONDecoder.raw_decode` dès qu'il est complet. Seuls le morceau en cours et
+l'élément en cours de décodage sont conservés; les autres clés de l'objet
+(`total_count`...) sont disponibles dans `fields` dès qu'elles ont été lues.
+"""
+
+import codecs
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+_WHITESPACE = ' \t\n\r'
+
+class StreamingJSONArray:
+    def __init__(self, chunks: Iterable[bytes], key: Optional[str] = 'results'):
+        """`chunks`: morceaux bruts du corps (ex: response.iter_content()),
+        `key`: clé du tableau dans l'objet de premier niveau (None: le document est le tableau)"""
+        self.key = key
+        self.fields: Dict[str, Any] = {}
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Ajoute le morceau suivant au tampon (False en fin de flux)"""
+        if self._eof:
+            return False
+        # Ne conserver que la partie non encore décodée
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += self._text.decode(chunk)
+                return True
+        self._buffer += self._text.decode(b'', final=True)
+        self._eof = True
+        return False
+
+    def _peek(self) -> str:
+        """Premier caractère significatif (les blancs sont consommés), '' en fin de flux"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, expected: str):
+        char = self._peek()
+        if char != expected:
+            raise ValueError(f"JSON inattendu: {char or 'fin de flux'!r} au lieu de {expected!r}")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """Décode la valeur JSON suivante, en lisant des morceaux tant qu'elle est incomplète"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Un nombre en fin de tampon peut se poursuivre dans le morceau suivant
+            if end == len(self._buffer) and not self._eof and not isinstance(value, (dict, list, str)):
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    def _items(self) -> Iterator[Any]:
+        """Éléments du tableau dont le '[' vient d'être lu"""
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            char = self._peek()
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"JSON inattendu: {char or 'fin de flux'!r} dans le tableau")
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.key is None:
+            self._expect('[')
+            yield from self._items()
+            return
+
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            name = self._value()
+            self._expect(':')
+            if name == self.key and self._peek() == '[':
+                self._pos += 1
+                yield from self._items()
+            else:
+                self.fields[name] = self._value()
+            char = self._peek()
+            self._pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"JSON inattendu: {char or 'fin de flux'!r} dans l'objet")
+
+def iter_batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Regroupe un flux d'éléments en lots d'au plus `size` éléments"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
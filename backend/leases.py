@@ -0,0 +1,260 @@
+"""
+Baux de collecte partagés entre les nœuds, dans MySQL
+
+ScraperManager ne voit que les jobs de son processus: plusieurs workers ou
+conteneurs de l'API pourraient collecter le même jeu de données en même
+temps. Avant de collecter, un nœud prend le bail du jeu de données dans
+`scrape_leases` (une ligne par jeu de données, verrouillée par SELECT ...
+FOR UPDATE): il n'est accordé que s'il est libre ou expiré.
+
+Le détenteur prolonge son bail par un battement de cœur toutes les
+`ttl / 3` secondes, sur une connexion dédiée. S'il s'arrête (plantage,
+coupure réseau), le bail expire au bout de `ttl` secondes et un autre nœud
+peut le reprendre. Les échéances sont calculées avec l'horloge du serveur
+MySQL, pas celle des nœuds.
+
+Un détenteur dont le bail a été repris, ou qui ne l'a pas prolongé depuis
+`ttl - ttl / 3` secondes, le considère perdu: `check()` lève LeaseLost et le
+collecteur s'arrête avant de valider le lot suivant. Le délai est compté
+depuis l'envoi de la dernière prolongation réussie, avant son exécution par
+le serveur: l'échéance locale tombe toujours avant celle de MySQL, avec une
+marge d'un battement de cœur (pause du processus, lot bloqué).
+"""
+
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Tuple
+
+from mysql.connector import Error
+
+LEASES_TABLE = 'scrape_leases'
+
+CREATE_STATEMENT = f"""
+    CREATE TABLE IF NOT EXISTS {LEASES_TABLE} (
+        dataset VARCHAR(100) PRIMARY KEY,
+        holder VARCHAR(255),
+        token CHAR(32),
+        run_id CHAR(32),
+        records_collected INT DEFAULT 0,
+        acquired_at DATETIME(3),
+        heartbeat_at DATETIME(3),
+        expires_at DATETIME(3),
+        released_at DATETIME(3)
+    )
+"""
+
+# Baux en cours sur tous les nœuds (non libérés et non expirés)
+ACTIVE_QUERY = f"""
+    SELECT dataset, holder, run_id, records_collected, acquired_at, heartbeat_at, expires_at
+    FROM {LEASES_TABLE}
+    WHERE token IS NOT NULL AND expires_at > NOW(3)
+    ORDER BY dataset
+"""
+
+def node_id() -> str:
+    """Identifiant du détenteur: hôte (nom du conteneur) et processus"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class LeaseUnavailable(Exception):
+    """Le bail du jeu de données est détenu par un autre nœud"""
+    def __init__(self, dataset: str, holder: Optional[str], expires_at=None):
+        self.dataset = dataset
+        self.holder = holder
+        self.expires_at = expires_at
+        super().__init__(f"Collecte du jeu de données {dataset} déjà en cours sur {holder} "
+                         f"(bail jusqu'à {expires_at})")
+
+class LeaseLost(Exception):
+    """Le bail a expiré ou a été repris pendant la collecte"""
+
+class Lease:
+    """Bail détenu sur un jeu de données, prolongé par un thread de fond
+
+    `progress`, s'il est renseigné, retourne (run_id, enregistrements collectés),
+    publiés à chaque battement de cœur pour le statut global.
+    """
+    def __init__(self, manager: 'LeaseManager', dataset: str, token: str, renewed: float):
+        self.manager = manager
+        self.dataset = dataset
+        self.token = token
+        self.progress: Optional[Callable[[], Tuple[Optional[str], int]]] = None
+        # Instant (monotone) d'envoi de la dernière prise ou prolongation réussie
+        self._renewed = renewed
+        self._lost: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'Lease':
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._beat,),
+                                        name=f"lease-{self.dataset}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _beat(self):
+        while not self._stop.wait(self.manager.heartbeat_interval):
+            self.renew()
+            if self._lost:
+                return
+
+    def renew(self):
+        """Prolonge le bail; il est perdu s'il a été repris ou si l'échéance est passée sans prolongation"""
+        run_id, records = self.progress() if self.progress is not None else (None, 0)
+        sent = time.monotonic()
+        try:
+            if self.manager.renew(self, run_id, records):
+                self._renewed = sent
+                return
+            self._lost = "bail repris par un autre nœud"
+        except Error as e:
+            logging.warning(f"Prolongation du bail de {self.dataset} impossible: {e}")
+        if self._lost:
+            logging.error(f"Bail du jeu de données {self.dataset} perdu: {self._lost}")
+
+    @property
+    def lost(self) -> Optional[str]:
+        deadline = self.manager.ttl - self.manager.safety_margin
+        if self._lost is None and time.monotonic() - self._renewed > deadline:
+            self._lost = f"non prolongé depuis plus de {deadline:.0f} s"
+        return self._lost
+
+    def check(self):
+        """Lève LeaseLost si le bail n'est plus garanti (à appeler avant chaque validation)"""
+        reason = self.lost
+        if reason:
+            raise LeaseLost(f"Bail du jeu de données {self.dataset} perdu: {reason}")
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.manager.release(self)
+        except Error as e:
+            # Le bail expirera de lui-même
+            logging.warning(f"Libération du bail de {self.dataset} impossible: {e}")
+
+    def __enter__(self) -> 'Lease':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class LeaseManager:
+    """Prise, prolongation et libération des baux d'un nœud, sur une connexion dédiée
+
+    La connexion est partagée par les battements de cœur de tous les baux du
+    nœud et reste hors du pool des collecteurs, pour qu'un pool saturé ne
+    retarde pas les prolongations.
+    """
+    def __init__(self, connect: Callable, ttl: float = 60, holder: Optional[str] = None):
+        self._connect = connect
+        self._connection = None
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self.heartbeat_interval = ttl / 3
+        # Le détenteur renonce à son bail cette durée avant l'échéance vue par MySQL
+        self.safety_margin = self.heartbeat_interval
+        self.holder = holder or node_id()
+
+    def _get_connection(self):
+        if self._connection is None or not self._connection.is_connected():
+            self._connection = self._connect()
+        return self._connection
+
+    def ensure_table(self):
+        with self._lock:
+            connection = self._get_connection()
+            cursor = connection.cursor()
+            try:
+                cursor.execute(CREATE_STATEMENT)
+                connection.commit()
+            except Error as e:
+                logging.error(f"Erreur lors de la création de la table des baux: {e}")
+                raise
+            finally:
+                cursor.close()
+
+    def acquire(self, dataset: str) -> Lease:
+        """Prend le bail du jeu de données et démarre ses battements de cœur
+
+        Lève LeaseUnavailable si un autre nœud le détient et qu'il n'a pas expiré.
+        """
+        token = uuid.uuid4().hex
+        sent = time.monotonic()
+        with self._lock:
+            connection = self._get_connection()
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"INSERT IGNORE INTO {LEASES_TABLE} (dataset) VALUES (%s)", (dataset,))
+                cursor.execute(f"""
+                    SELECT holder, token, expires_at, expires_at > NOW(3)
+                    FROM {LEASES_TABLE} WHERE dataset = %s FOR UPDATE
+                """, (dataset,))
+                holder, current, expires_at, active = cursor.fetchone()
+                if current is not None and active:
+                    connection.rollback()
+                    raise LeaseUnavailable(dataset, holder, expires_at)
+                cursor.execute(f"""
+                    UPDATE {LEASES_TABLE}
+                    SET holder = %s, token = %s, run_id = NULL, records_collected = 0,
+                        acquired_at = NOW(3), heartbeat_at = NOW(3),
+                        expires_at = NOW(3) + INTERVAL %s SECOND, released_at = NULL
+                    WHERE dataset = %s
+                """, (self.holder, token, self.ttl, dataset))
+                connection.commit()
+            except Error as e:
+                logging.error(f"Erreur lors de la prise du bail de {dataset}: {e}")
+                if connection.is_connected():
+                    connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+        if current is not None:
+            logging.warning(f"Bail expiré de {holder} sur {dataset} repris (détenteur arrêté sans libération)")
+        logging.info(f"Bail du jeu de données {dataset} pris par {self.holder} (échéance {self.ttl:.0f} s)")
+        return Lease(self, dataset, token, sent).start()
+
+    def renew(self, lease: Lease, run_id: Optional[str] = None, records: int = 0) -> bool:
+        """Repousse l'échéance du bail; False s'il n'appartient plus à ce détenteur"""
+        with self._lock:
+            connection = self._get_connection()
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"""
+                    UPDATE {LEASES_TABLE}
+                    SET heartbeat_at = NOW(3), expires_at = NOW(3) + INTERVAL %s SECOND,
+                        run_id = COALESCE(%s, run_id), records_collected = %s
+                    WHERE dataset = %s AND token = %s
+                """, (self.ttl, run_id, records, lease.dataset, lease.token))
+                renewed = cursor.rowcount == 1
+                connection.commit()
+                return renewed
+            finally:
+                cursor.close()
+
+    def release(self, lease: Lease):
+        """Libère le bail (le détenteur et les dates restent comme trace du dernier run)"""
+        with self._lock:
+            connection = self._get_connection()
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"""
+                    UPDATE {LEASES_TABLE} SET token = NULL, released_at = NOW(3)
+                    WHERE dataset = %s AND token = %s
+                """, (lease.dataset, lease.token))
+                connection.commit()
+            finally:
+                cursor.close()
+        logging.info(f"Bail du jeu de données {lease.dataset} libéré")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._connection.is_connected():
+                self._connection.close()
+            self._connection = None
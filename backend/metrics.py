@@ -0,0 +1,141 @@
+"""
+Mesures par étape d'un run de collecte
+
+RunMetrics cumule, de façon sûre entre threads, le temps passé dans chaque
+étape (récupération HTTP, transformation, insertion) et les volumes associés
+(octets téléchargés, appels et reprises HTTP, lignes rejetées par motif). La
+mémoire résidente est relevée à chaque mesure d'étape: son pic est celui du
+run, pas celui de toute la vie du processus (API ou planificateur). Le
+résumé d'un run est enregistré avec son log dans `collection_logs`
+(colonnes METRIC_COLUMNS).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Colonnes ajoutées à collection_logs, dans l'ordre de RunMetrics.as_row()
+METRIC_COLUMNS: List[Tuple[str, str]] = [
+    ('run_id', 'CHAR(32)'),
+    ('duration_ms', 'INT'),
+    ('fetch_ms', 'INT'),
+    ('bytes_downloaded', 'BIGINT'),
+    ('http_calls', 'INT'),
+    ('http_retries', 'INT'),
+    ('transform_ms', 'INT'),
+    ('insert_ms', 'INT'),
+    ('rows_inserted', 'INT'),
+    ('rows_updated', 'INT'),
+    ('rows_skipped', 'INT'),
+    ('rows_rejected', 'INT'),
+    # Nombre de lignes rejetées par code de motif (JSON)
+    ('reject_reasons', 'TEXT'),
+    ('near_duplicates', 'INT'),
+    ('peak_rss_kb', 'BIGINT'),
+    ('rows_per_second', 'FLOAT'),
+]
+
+def peak_rss_kb() -> Optional[int]:
+    """Pic de mémoire résidente du processus en Ko (None si indisponible)"""
+    if resource is None:
+        return None
+    # ru_maxrss est en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def current_rss_kb() -> Optional[int]:
+    """Mémoire résidente actuelle du processus en Ko (None hors Linux)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+class RunMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.timings = {'fetch': 0.0, 'transform': 0.0, 'insert': 0.0}
+            self.counters = {'bytes_downloaded': 0, 'http_calls': 0, 'http_retries': 0, 'rows_invalid': 0,
+                             'near_duplicates': 0}
+            self.rejects = Counter()
+            self.peak_rss = current_rss_kb()
+
+    def sample_rss(self):
+        """Relève la mémoire résidente actuelle pour le pic du run"""
+        rss = current_rss_kb()
+        if rss is None:
+            return
+        with self._lock:
+            self.peak_rss = max(self.peak_rss or 0, rss)
+
+    def add_time(self, stage: str, seconds: float):
+        self.sample_rss()
+        with self._lock:
+            self.timings[stage] += seconds
+
+    def add(self, counter: str, value: int = 1):
+        with self._lock:
+            self.counters[counter] += value
+
+    def reject(self, reasons: Counter):
+        """Compte des lignes rejetées par la validation, par code de motif"""
+        with self._lock:
+            self.rejects.update(reasons)
+            self.counters['rows_invalid'] += sum(reasons.values())
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Ajoute la durée du bloc au temps de l'étape"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - started)
+
+    def summary(self, records: int, stats: Dict[str, int]) -> Dict:
+        """Résumé du run: durées en ms, volumes, lignes par issue, pic mémoire et débit"""
+        self.sample_rss()
+        with self._lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+            rejects = dict(self.rejects)
+            elapsed = time.perf_counter() - self.started
+            peak_rss = self.peak_rss
+        return {
+            'duration_ms': round(elapsed * 1000),
+            'fetch_ms': round(timings['fetch'] * 1000),
+            'bytes_downloaded': counters['bytes_downloaded'],
+            'http_calls': counters['http_calls'],
+            'http_retries': counters['http_retries'],
+            'transform_ms': round(timings['transform'] * 1000),
+            'insert_ms': round(timings['insert'] * 1000),
+            'rows_inserted': stats.get('inserted', 0),
+            'rows_updated': stats.get('updated', 0),
+            'rows_skipped': stats.get('unchanged', 0) + counters['rows_invalid'],
+            'rows_rejected': counters['rows_invalid'],
+            'reject_reasons': rejects,
+            'near_duplicates': counters['near_duplicates'],
+            'peak_rss_kb': peak_rss,
+            'rows_per_second': round(records / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+    def as_row(self, run_id: Optional[str], records: int, stats: Dict[str, int]) -> Tuple:
+        """Valeurs des colonnes METRIC_COLUMNS"""
+        summary = self.summary(records, stats)
+        summary['run_id'] = run_id
+        summary['reject_reasons'] = json.dumps(summary['reject_reasons']) if summary['reject_reasons'] else None
+        return tuple(summary[column] for column, _ in METRIC_COLUMNS)
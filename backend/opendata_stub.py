@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Serveur local imitant l'API Explore v2.1 d'opendata.paris.fr
+
+Sert, pour n'importe quel identifiant de jeu de données, des enregistrements
+enregistrés (fichier JSONL, un enregistrement par ligne, par exemple un export
+/exports/jsonl) ou synthétiques, avec le même contrat que l'API réelle:
+
+- /catalog/datasets/<id>: métadonnées (metas.default.modified)
+- /catalog/datasets/<id>/records: pagination limit/offset, plafond de taille
+  de page et de fenêtre d'offset (400 au-delà), filtres `where` d'égalité
+  (`champ="valeur"`, `champ is null`) et `select=<champ>, count(*) as n` avec
+  `group_by`; les autres conditions `where` sont ignorées
+- /catalog/datasets/<id>/exports/jsonl: export complet en flux
+- /media/<largeur>x<hauteur>.jpg (ou .png): photo générée, pour les miniatures
+  (nécessite Pillow)
+
+La latence, la proportion de 429 (avec Retry-After) et de 503 injectés sont
+configurables. Le collecteur est redirigé vers le stub par OPENDATA_BASE_URL:
+
+    python opendata_stub.py --records 50000 --latency-ms 80 --rate-429 0.02
+    OPENDATA_BASE_URL=http://127.0.0.1:8765/api/explore/v2.1/catalog/datasets python scraper.py
+"""
+
+import argparse
+import io
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = '/api/explore/v2.1/catalog/datasets'
+
+_MEDIA = re.compile(r'^/media/(\d+)x(\d+)\.(jpg|png)$')
+_ROUTE = re.compile(rf'^{API_PREFIX}/([^/]+)(/records|/exports/jsonl)?/?$')
+_EQUALS = re.compile(r'(\w+)\s*=\s*"((?:[^"\\]|\\.)*)"')
+_IS_NULL = re.compile(r'(\w+)\s+is\s+null', re.IGNORECASE)
+_GROUP_SELECT = re.compile(r'^\s*(\w+)\s*,\s*count\(\*\)\s+as\s+(\w+)\s*$', re.IGNORECASE)
+
+def synthetic_records(total: int, seed: int = 42) -> List[Dict]:
+    """Enregistrements Paris se transforme réalistes (titres uniques, arrondissements variés)"""
+    rng = random.Random(seed)
+    categories = ['Espaces verts', 'Voirie', 'Équipements', 'Logement', 'Mobilités']
+    records = []
+    for i in range(total):
+        arrondissement = rng.randint(1, 20)
+        records.append({
+            'titre_descriptif': f"Projet {i}",
+            'corps_descriptif': "Description\tsur plusieurs\nlignes " * rng.randint(1, 5),
+            'categorie': rng.choice(categories),
+            'sous_categorie': rng.choice(['En cours', 'Livré', 'À l\'étude']),
+            'adresse': f"{rng.randint(1, 200)} rue de l'Exemple",
+            'code_postal': f"750{arrondissement:02d}",
+            'geo_point_2d': {'lat': 48.8 + rng.random() * 0.1, 'lon': 2.25 + rng.random() * 0.15},
+            'date_debut': f"20{rng.randint(15, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            'date_liv': None,
+            'budget': f"{rng.randint(10, 5000) * 1000} €",
+            'url_parisfr': f"https://www.paris.fr/projets/{i}",
+        })
+    return records
+
+def load_records(path: str) -> List[Dict]:
+    """Charge des enregistrements enregistrés (JSONL, ou réponse JSON de /records)"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            data = json.load(f)
+            return data.get('results', []) if isinstance(data, dict) else data
+        return [json.loads(line) for line in f if line.strip()]
+
+@dataclass
+class StubConfig:
+    records: List[Dict] = field(default_factory=list)
+    latency: float = 0.0
+    jitter: float = 0.0
+    max_limit: int = 100
+    max_window: int = 10000
+    rate_429: float = 0.0
+    retry_after: float = 1.0
+    fail_rate: float = 0.0
+    modified: str = '2024-01-01T00:00:00+00:00'
+    seed: int = 0
+
+def _matches(record: Dict, where: Optional[str]) -> bool:
+    if not where:
+        return True
+    for name, value in _EQUALS.findall(where):
+        if str(record.get(name)) != value.replace('\\"', '"'):
+            return False
+    for name in _IS_NULL.findall(where):
+        if record.get(name) is not None:
+            return False
+    return True
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: 'OpenDataStub'
+
+    def log_message(self, format, *args):
+        logging.debug(f"Stub: {format % args}")
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, headers: Optional[Dict] = None):
+        self._send_json(status, {'error_code': 'StubError', 'message': message}, headers)
+
+    def do_GET(self):
+        stub = self.server
+        config = stub.config
+        url = urlparse(self.path)
+        media = _MEDIA.match(url.path)
+        if media:
+            stub.count('media')
+            self._media(int(media.group(1)), int(media.group(2)), media.group(3))
+            return
+        route = _ROUTE.match(url.path)
+        if route is None:
+            self._error(404, f"Chemin inconnu: {url.path}")
+            return
+
+        stub.count('requests')
+        delay = config.latency + (stub.random() * config.jitter if config.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        # Injection d'erreurs (avant tout traitement, comme un proxy surchargé)
+        draw = stub.random()
+        if draw < config.rate_429:
+            stub.count('throttled')
+            self._error(429, "Too many requests", {'Retry-After': f"{config.retry_after:g}"})
+            return
+        if draw < config.rate_429 + config.fail_rate:
+            stub.count('failed')
+            self._error(503, "Service unavailable (injecté)")
+            return
+
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        endpoint = route.group(2)
+        if endpoint is None:
+            self._send_json(200, {
+                'dataset_id': route.group(1),
+                'metas': {'default': {'modified': config.modified, 'data_processed': config.modified,
+                                      'records_count': len(config.records)}}
+            })
+        elif endpoint == '/records':
+            self._records(params)
+        else:
+            self._export(params)
+
+    def _records(self, params: Dict[str, str]):
+        config = self.server.config
+        try:
+            limit = int(params.get('limit', 10))
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            self._error(400, "limit et offset doivent être des entiers")
+            return
+        if limit > config.max_limit:
+            self._error(400, f"limit doit être inférieur ou égal à {config.max_limit}")
+            return
+        if offset + limit > config.max_window:
+            self._error(400, f"offset + limit doit être inférieur ou égal à {config.max_window}")
+            return
+
+        selected = [record for record in config.records if _matches(record, params.get('where'))]
+
+        group = _GROUP_SELECT.match(params.get('select', ''))
+        if params.get('group_by') and group:
+            name, alias = group.groups()
+            counts = Counter(record.get(name) for record in selected)
+            results = [{name: value, alias: count} for value, count in counts.items()]
+            self._send_json(200, {'total_count': len(results), 'results': results[offset:offset + limit]})
+            return
+
+        self._send_json(200, {'total_count': len(selected), 'results': selected[offset:offset + limit]})
+
+    def _media(self, width: int, height: int, extension: str):
+        from PIL import Image
+        # Dégradé déterministe dépendant des dimensions
+        image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+        output = io.BytesIO()
+        image.save(output, 'JPEG' if extension == 'jpg' else 'PNG')
+        body = output.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg' if extension == 'jpg' else 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _export(self, params: Dict[str, str]):
+        config = self.server.config
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/jsonl; charset=utf-8')
+        self.end_headers()
+        # Sans Content-Length: le corps se termine à la fermeture de la connexion (HTTP/1.0)
+        for record in config.records:
+            if _matches(record, params.get('where')):
+                self.wfile.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+
+class OpenDataStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: StubConfig, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _StubHandler)
+        self.config = config
+        self.stats = Counter()
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def random(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def start(self) -> 'OpenDataStub':
+        """Sert les requêtes dans un thread de fond (port 0 = port libre choisi par le système)"""
+        self._thread = threading.Thread(target=self.serve_forever, name='opendata-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stub local de l'API OpenData Paris (Explore v2.1)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--data', help="Enregistrements enregistrés (JSONL ou réponse JSON de /records)")
+    parser.add_argument('--records', type=int, default=10000,
+                        help="Nombre d'enregistrements synthétiques servis si --data est absent")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latence ajoutée à chaque requête")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Latence aléatoire supplémentaire (uniforme)")
+    parser.add_argument('--page-cap', type=int, default=100, help="Valeur maximale de limit (400 au-delà)")
+    parser.add_argument('--offset-window', type=int, default=10000, help="Plafond de offset + limit (400 au-delà)")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Proportion de réponses 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Valeur de Retry-After des 429 (secondes)")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Proportion de réponses 503")
+    parser.add_argument('--seed', type=int, default=0, help="Graine des tirages (latence, erreurs)")
+    return parser.parse_args(argv)
+
+def config_from_args(args) -> StubConfig:
+    records = load_records(args.data) if args.data else synthetic_records(args.records)
+    return StubConfig(
+        records=records,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        max_limit=args.page_cap,
+        max_window=args.offset_window,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        fail_rate=args.fail_rate,
+        seed=args.seed
+    )
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+    stub = OpenDataStub(config_from_args(args), args.host, args.port)
+    logging.info(f"Stub OpenData: {len(stub.config.records)} enregistrements servis sur {stub.base_url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server_close()
+        logging.info(f"Stub arrêté: {dict(stub.stats)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Pipeline d'ingestion récupération / transformation / chargement
+
+Les trois étapes tournent en parallèle et sont reliées par des files bornées:
+une étape lente bloque l'étape en amont (contre-pression) au lieu de laisser
+la mémoire grossir.
+"""
+
+import contextvars
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Marqueur de fin de flux transmis d'une étape à la suivante
+_END = object()
+
+@dataclass
+class StageCounters:
+    """Compteurs de débit d'une étape du pipeline"""
+    name: str
+    batches: int = 0
+    records: int = 0
+    busy_seconds: float = 0.0
+    wait_seconds: float = 0.0
+
+    @property
+    def records_per_second(self) -> float:
+        """Débit de l'étape rapporté à son temps de travail effectif"""
+        return self.records / self.busy_seconds if self.busy_seconds else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'stage': self.name,
+            'batches': self.batches,
+            'records': self.records,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'wait_seconds': round(self.wait_seconds, 3),
+            'records_per_second': round(self.records_per_second, 1)
+        }
+
+@dataclass
+class IngestPipeline:
+    """Exécute fetch -> transform -> load de manière concurrente
+
+    - `source` produit des lots d'enregistrements bruts (itérable de listes)
+    - `transform` convertit un lot brut en lot prêt à insérer
+    - `load` insère un lot; il s'exécute dans le thread appelant, qui garde
+      ainsi la connexion à la base de données
+    - `on_batch`, optionnel, reçoit le numéro d'ordre (à partir de 0) de
+      chaque lot source juste avant son chargement, même s'il est vide
+    """
+    source: Iterable[List[Dict]]
+    transform: Callable[[List[Dict]], List[Dict]]
+    load: Callable[[List[Dict]], None]
+    queue_size: int = 4
+    on_batch: Optional[Callable[[int], None]] = None
+    counters: Dict[str, StageCounters] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._raw = queue.Queue(maxsize=self.queue_size)
+        self._processed = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self.counters = {name: StageCounters(name) for name in ('fetch', 'transform', 'load')}
+
+    def _put(self, target: queue.Queue, item, counters: StageCounters) -> bool:
+        """Dépose un élément en aval; abandonne si le pipeline est arrêté"""
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                counters.wait_seconds += time.perf_counter() - started
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue, counters: StageCounters):
+        """Récupère un élément en amont; renvoie _END si le pipeline est arrêté"""
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = source.get(timeout=0.1)
+                counters.wait_seconds += time.perf_counter() - started
+                return item
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error: BaseException):
+        """Mémorise la première erreur et arrête toutes les étapes"""
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _fetch_stage(self):
+        counters = self.counters['fetch']
+        try:
+            iterator = iter(self.source)
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                batch = next(iterator, _END)
+                counters.busy_seconds += time.perf_counter() - started
+                if batch is _END:
+                    break
+                counters.batches += 1
+                counters.records += len(batch)
+                if not self._put(self._raw, batch, counters):
+                    return
+        except Exception as e:
+            logging.error(f"Pipeline: erreur dans l'étape de récupération: {e}")
+            self._fail(e)
+            return
+        self._put(self._raw, _END, counters)
+
+    def _transform_stage(self):
+        counters = self.counters['transform']
+        try:
+            while True:
+                batch = self._get(self._raw, counters)
+                if batch is _END:
+                    break
+                started = time.perf_counter()
+                processed = self.transform(batch)
+                counters.busy_seconds += time.perf_counter() - started
+                counters.batches += 1
+                counters.records += len(processed)
+                if not self._put(self._processed, processed, counters):
+                    return
+        except Exception as e:
+            logging.error(f"Pipeline: erreur dans l'étape de transformation: {e}")
+            self._fail(e)
+            return
+        self._put(self._processed, _END, counters)
+
+    def run(self) -> Dict[str, StageCounters]:
+        """Lance le pipeline et attend la fin des trois étapes
+
+        La première erreur rencontrée dans une étape arrête les autres et est
+        relancée dans le thread appelant.
+        """
+        threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(self._fetch_stage,),
+                             name='pipeline-fetch', daemon=True),
+            threading.Thread(target=contextvars.copy_context().run, args=(self._transform_stage,),
+                             name='pipeline-transform', daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+
+        counters = self.counters['load']
+        try:
+            while True:
+                batch = self._get(self._processed, counters)
+                if batch is _END:
+                    break
+                started = time.perf_counter()
+                if self.on_batch is not None:
+                    self.on_batch(counters.batches)
+                if batch:
+                    self.load(batch)
+                counters.busy_seconds += time.perf_counter() - started
+                counters.batches += 1
+                counters.records += len(batch)
+        except BaseException as e:
+            logging.error(f"Pipeline: erreur dans l'étape de chargement: {e}")
+            self._fail(e)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.log_summary()
+        if self._error is not None:
+            raise self._error
+        return self.counters
+
+    def bottleneck(self) -> StageCounters:
+        """Étape ayant passé le plus de temps à travailler"""
+        return max(self.counters.values(), key=lambda c: c.busy_seconds)
+
+    def log_summary(self):
+        for counters in self.counters.values():
+            logging.info(
+                f"Pipeline [{counters.name}]: {counters.records} enregistrements en {counters.batches} lots, "
+                f"{counters.busy_seconds:.2f}s actif, {counters.wait_seconds:.2f}s en attente, "
+                f"{counters.records_per_second:.0f} enr/s"
+            )
+        logging.info(f"Pipeline: étape limitante = {self.bottleneck().name}")
@@ -1,6 +1,19 @@
 #!/usr/bin/env python3
 """
 Scheduler pour les tâches automatiques de scraping
+
+Avec SCRAPE_FREQUENCY=adaptive, le scheduler interroge les métadonnées du
+catalogue de chaque jeu de données (date `data_processed` / `modified`,
+requête conditionnelle) et ne déclenche une collecte que si elles ont
+changé. L'intervalle entre deux contrôles s'adapte aux modifications
+observées: il est réduit après une modification et allongé à chaque
+contrôle sans changement, entre SCRAPE_POLL_MIN_MINUTES et
+SCRAPE_POLL_MAX_MINUTES.
+
+Les collectes sont incrémentales (upsert): un projet retiré en amont reste en
+base. Une collecte sur SCRAPE_FULL_REFRESH_DAYS jours (7 par défaut, 0 pour
+désactiver) est donc un rechargement complet (`mode: full`), qui remplace la
+table et supprime ces projets; la première collecte après le démarrage en est un.
 """
 
 import os
@@ -9,8 +22,8 @@ import time
 import logging
 import schedule
 import subprocess
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 import requests
 import json
 
@@ -25,11 +38,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEFAULT_OPENDATA_BASE_URL = "https://opendata.paris.fr/api/explore/v2.1/catalog/datasets"
+
+class AdaptiveInterval:
+    """Intervalle de contrôle: divisé après une modification, multiplié sans changement, borné"""
+    def __init__(self, initial: float, minimum: float, maximum: float,
+                 backoff: float = 1.5, speedup: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.speedup = speedup
+        self.value = min(max(initial, minimum), maximum)
+
+    def observe(self, changed: bool) -> float:
+        factor = self.speedup if changed else self.backoff
+        self.value = min(max(self.value * factor, self.minimum), self.maximum)
+        return self.value
+
 class ScrapingScheduler:
     def __init__(self):
         self.api_base_url = os.getenv('API_BASE_URL', 'http://localhost:5000/api')
         self.admin_token = None
         self.last_scrape_time = None
+        # Mode adaptatif: dernière modification vue (et ETag des métadonnées) par jeu de données
+        self.opendata_base_url = os.getenv('OPENDATA_BASE_URL', DEFAULT_OPENDATA_BASE_URL).rstrip('/')
+        self.datasets = [name.strip() for name in os.getenv('SCRAPER_DATASETS', 'parissetransforme').split(',')
+                         if name.strip()]
+        self.last_modified: Dict[str, str] = {}
+        # Dernière date lue en amont et son ETag, réutilisée sur une réponse 304
+        self.upstream_modified: Dict[str, str] = {}
+        self.metadata_etags: Dict[str, str] = {}
+        self.poll_interval = AdaptiveInterval(
+            initial=float(os.getenv('SCRAPE_POLL_MINUTES', 60)),
+            minimum=float(os.getenv('SCRAPE_POLL_MIN_MINUTES', 15)),
+            maximum=float(os.getenv('SCRAPE_POLL_MAX_MINUTES', 360))
+        )
+        self.next_poll_time = datetime.now()
+        # Collecte déclenchée sur modification: (job, dates vues), retenues seulement si le job réussit
+        self.last_job_id: Optional[str] = None
+        self.pending_collection: Optional[Tuple[str, Dict[str, str]]] = None
+        # Rechargement complet périodique: dernier réussi et (job, heure de déclenchement) en cours
+        full_refresh_days = float(os.getenv('SCRAPE_FULL_REFRESH_DAYS', 7))
+        self.full_refresh_interval = timedelta(days=full_refresh_days) if full_refresh_days > 0 else None
+        self.last_full_refresh: Optional[datetime] = None
+        self.full_refresh_job: Optional[Tuple[str, datetime]] = None
         
     def authenticate(self) -> bool:
         """Authentifie l'utilisateur admin pour pouvoir déclencher le scraper"""
@@ -59,8 +111,8 @@ class ScrapingScheduler:
             logger.error(f"Erreur lors de l'authentification: {e}")
             return False
     
-    def trigger_scraping(self) -> bool:
-        """Déclenche le scraping via l'API"""
+    def trigger_scraping(self, mode: Optional[str] = None) -> bool:
+        """Déclenche le scraping via l'API (`mode`: incremental ou full, SCRAPER_MODE de l'API par défaut)"""
         try:
             if not self.admin_token:
                 logger.warning("Token d'authentification manquant, tentative de reconnexion...")
@@ -74,13 +126,20 @@ class ScrapingScheduler:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(scrape_url, headers=headers, timeout=60)
+            # Reprise automatique d'un run interrompu (timeout, erreur) à son dernier point de reprise
+            payload = {'resume': True}
+            if mode:
+                payload['mode'] = mode
+            response = requests.post(scrape_url, headers=headers, json=payload, timeout=60)
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
                     self.last_scrape_time = datetime.now()
-                    logger.info("Scraping déclenché avec succès")
+                    self.last_job_id = ((data.get('data') or {}).get('job') or {}).get('job_id')
+                    if mode == 'full' and self.last_job_id:
+                        self.full_refresh_job = (self.last_job_id, self.last_scrape_time)
+                    logger.info("Scraping déclenché avec succès" + (" (rechargement complet)" if mode == 'full' else ""))
                     return True
                 else:
                     logger.error(f"Erreur API: {data.get('error', 'Erreur inconnue')}")
@@ -88,7 +147,7 @@ class ScrapingScheduler:
             elif response.status_code == 401:
                 logger.warning("Token expiré, tentative de reconnexion...")
                 self.admin_token = None
-                return self.trigger_scraping()  # Retry avec nouvelle authentification
+                return self.trigger_scraping(mode)  # Retry avec nouvelle authentification
             else:
                 logger.error(f"Erreur HTTP: {response.status_code} - {response.text}")
                 return False
@@ -114,6 +173,58 @@ class ScrapingScheduler:
             logger.error(f"Erreur lors de la vérification du statut: {e}")
             return None
     
+    def job_status(self, job_id: str) -> Tuple[bool, Optional[str]]:
+        """(job connu de l'API, statut du job); (True, None) si l'API est injoignable"""
+        try:
+            response = requests.get(f"{self.api_base_url}/scrape/status", params={'job_id': job_id}, timeout=30)
+            if response.status_code == 404:
+                return False, None
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success'):
+                    return True, ((data.get('data') or {}).get('job') or {}).get('status')
+            return True, None
+            
+        except Exception as e:
+            logger.error(f"Erreur lors de la vérification du job {job_id}: {e}")
+            return True, None
+    
+    def scraping_mode(self) -> Optional[str]:
+        """'full' si le rechargement complet périodique est dû, sinon None (mode par défaut de l'API)"""
+        if self.full_refresh_interval is None:
+            return None
+        if self.full_refresh_job is not None:
+            job_id, triggered_at = self.full_refresh_job
+            known, status = self.job_status(job_id)
+            if known and status in (None, 'queued', 'running'):
+                return None
+            self.full_refresh_job = None
+            if status == 'success':
+                self.last_full_refresh = triggered_at
+            else:
+                logger.warning(f"Rechargement complet {job_id} terminé avec le statut {status or 'inconnu'}, "
+                               f"nouvelle tentative à la prochaine collecte")
+        if self.last_full_refresh is None or datetime.now() - self.last_full_refresh >= self.full_refresh_interval:
+            return 'full'
+        return None
+    
+    def check_pending_collection(self) -> bool:
+        """Retient les dates vues quand la collecte déclenchée a réussi; True tant qu'elle est en cours"""
+        job_id, changed = self.pending_collection
+        known, status = self.job_status(job_id)
+        if known and status in (None, 'queued', 'running'):
+            return True
+        
+        self.pending_collection = None
+        if status == 'success':
+            self.last_modified.update(changed)
+            logger.info(f"Collecte {job_id} réussie, jeux de données à jour: {', '.join(changed)}")
+        else:
+            # Les dates ne sont pas retenues: la modification sera revue au prochain contrôle
+            logger.warning(f"Collecte {job_id} terminée avec le statut {status or 'inconnu'}, "
+                           f"nouvelle tentative au prochain contrôle")
+        return False
+    
     def scheduled_scraping(self):
         """Fonction appelée par le scheduler pour le scraping automatique"""
         logger.info("Début du scraping automatique planifié")
@@ -125,13 +236,71 @@ class ScrapingScheduler:
             return
         
         # Déclencher le scraping
-        success = self.trigger_scraping()
+        success = self.trigger_scraping(self.scraping_mode())
         
         if success:
             logger.info("Scraping automatique déclenché avec succès")
         else:
             logger.error("Échec du scraping automatique")
     
+    def fetch_dataset_modified(self, dataset: str) -> Optional[str]:
+        """Date de dernière modification du jeu de données (métadonnées du catalogue)
+        
+        Requête conditionnelle: une réponse 304 renvoie la dernière date lue.
+        """
+        headers = {}
+        if dataset in self.metadata_etags:
+            headers['If-None-Match'] = self.metadata_etags[dataset]
+        response = requests.get(f"{self.opendata_base_url}/{dataset}", headers=headers,
+                                params={'select': 'metas'}, timeout=30)
+        if response.status_code == 304:
+            return self.upstream_modified.get(dataset)
+        response.raise_for_status()
+        metas = response.json().get('metas', {}).get('default', {})
+        modified = metas.get('data_processed') or metas.get('modified')
+        if modified:
+            self.upstream_modified[dataset] = modified
+            if response.headers.get('ETag'):
+                self.metadata_etags[dataset] = response.headers['ETag']
+        return modified
+    
+    def changed_datasets(self) -> Dict[str, str]:
+        """Jeux de données dont la date de modification diffère de la dernière vue"""
+        changed = {}
+        for dataset in self.datasets:
+            try:
+                modified = self.fetch_dataset_modified(dataset)
+            except Exception as e:
+                logger.error(f"Erreur lors de la lecture des métadonnées de {dataset}: {e}")
+                continue
+            if modified and modified != self.last_modified.get(dataset):
+                changed[dataset] = modified
+        return changed
+    
+    def poll_freshness(self):
+        """Mode adaptatif: déclenche une collecte si un jeu de données a changé en amont"""
+        if self.pending_collection is not None and self.check_pending_collection():
+            return
+        if datetime.now() < self.next_poll_time:
+            return
+        
+        changed = self.changed_datasets()
+        if changed:
+            logger.info("Modification en amont: " + ', '.join(f"{name} ({modified})" for name, modified in changed.items()))
+            status = self.check_scraper_status()
+            if status and status.get('is_running'):
+                # Les dates ne sont pas retenues: la modification sera revue au prochain contrôle
+                logger.info("Un scraping est déjà en cours, collecte reportée au prochain contrôle")
+            elif self.trigger_scraping(self.scraping_mode()):
+                if self.last_job_id:
+                    self.pending_collection = (self.last_job_id, changed)
+                else:
+                    logger.warning("Identifiant du job de collecte absent de la réponse, dates non retenues")
+        
+        interval = self.poll_interval.observe(bool(changed))
+        self.next_poll_time = datetime.now() + timedelta(minutes=interval)
+        logger.info(f"Prochain contrôle des métadonnées dans {interval:.0f} minutes")
+    
     def health_check(self):
         """Vérifie la santé de l'API"""
         try:
@@ -152,7 +321,13 @@ class ScrapingScheduler:
         scrape_frequency = os.getenv('SCRAPE_FREQUENCY', 'daily')
         scrape_time = os.getenv('SCRAPE_TIME', '02:00')
         
-        if scrape_frequency == 'hourly':
+        if scrape_frequency == 'adaptive':
+            # Le premier contrôle déclenche une collecte (ignorée par le scraper si rien n'a changé
+            # depuis sa marque haute) et mémorise les dates de modification
+            schedule.every(1).minutes.do(self.poll_freshness)
+            logger.info(f"Scraping adaptatif: métadonnées de {', '.join(self.datasets)} contrôlées toutes les "
+                        f"{self.poll_interval.minimum:.0f} à {self.poll_interval.maximum:.0f} minutes")
+        elif scrape_frequency == 'hourly':
             schedule.every().hour.do(self.scheduled_scraping)
             logger.info("Scraping planifié: toutes les heures")
         elif scrape_frequency == 'daily':
@@ -164,6 +339,10 @@ class ScrapingScheduler:
             logger.info(f"Scraping planifié: tous les {day} à {scrape_time}")
         else:
             logger.warning(f"Fréquence de scraping non reconnue: {scrape_frequency}")
+        if self.full_refresh_interval is not None:
+            logger.info(f"Rechargement complet au plus tous les "
+                        f"{self.full_refresh_interval.total_seconds() / 86400:g} jours "
+                        f"(suppression des projets retirés en amont)")
         
         # Health check toutes les 5 minutes
         schedule.every(5).minutes.do(self.health_check)
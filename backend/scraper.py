@@ -1,14 +1,34 @@
 import requests
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import json
+import math
 import time
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
 import logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import os
+import argparse
+import contextvars
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-import hashlib
+from contextlib import contextmanager, nullcontext
+from requests.adapters import HTTPAdapter
+from pipeline import IngestPipeline
+from http_cache import ResponseCache
+from json_stream import StreamingJSONArray, iter_batches
+from bulk_load import BulkLoader
+from metrics import METRIC_COLUMNS, RunMetrics
+from throttling import RETRYABLE_STATUS, AdaptiveTuner, RetryPolicy, TokenBucket
+from date_parser import DateStats
+from dedup import NearDuplicateDetector
+from history import ChangeHistory
+from leases import Lease, LeaseManager
+from datasets import DATASETS, PARIS_PROJECTS, DatasetDefinition, get_dataset
+from thumbnails import ThumbnailCache
+from transform import REJECT_REASONS, parse_date, transform_batch, transform_batch_parallel
 
 # Configuration du logging
 logging.basicConfig(
@@ -27,75 +47,211 @@ class DatabaseConfig:
     user: str = 'root'
     password: str = 'root'
 
+# Racine de l'API, remplaçable par OPENDATA_BASE_URL (ex: stub local, voir opendata_stub.py)
+DEFAULT_BASE_URL = "https://opendata.paris.fr/api/explore/v2.1/catalog/datasets"
+
+# L'API Explore v2.1 refuse les requêtes dont offset + limit dépasse ce plafond
+MAX_OFFSET_WINDOW = 10000
+
+@dataclass
+class FetchRange:
+    """Plage d'enregistrements à récupérer par un worker"""
+    start: int
+    end: int
+    where: Optional[str] = None
+
+def create_http_session(pool_size: int) -> requests.Session:
+    """Session HTTP avec un pool de connexions dimensionné sur le nombre de workers"""
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Paris-OpenData-Collector/1.0',
+        'Accept': 'application/json'
+    })
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def create_connection_pool(db_config: DatabaseConfig, pool_size: int, name: str,
+                           **options) -> pooling.MySQLConnectionPool:
+    """Pool de connexions MySQL (mysql-connector limite la taille à 32)"""
+    return pooling.MySQLConnectionPool(
+        pool_name=name,
+        pool_size=min(pool_size, 32),
+        **db_config.__dict__,
+        **options
+    )
+
 class ParisOpenDataCollector:
-    def __init__(self, db_config: DatabaseConfig):
+    def __init__(self, db_config: DatabaseConfig, concurrency: int = 1,
+                 requests_per_second: float = 4.0, page_size: int = 100,
+                 source: str = 'records', batch_size: int = 500,
+                 watermark_field: Optional[str] = None, commit_every: int = 1,
+                 pool_size: int = 2, pipeline: bool = False, queue_size: int = 4,
+                 cache: Optional[ResponseCache] = None, transform_workers: int = 1,
+                 transform_chunk_size: int = 2000, max_retries: int = 5,
+                 dataset: DatasetDefinition = PARIS_PROJECTS,
+                 session: Optional[requests.Session] = None,
+                 pool: Optional[pooling.MySQLConnectionPool] = None,
+                 tuner: Optional[AdaptiveTuner] = None, min_row_ratio: float = 0.5,
+                 load_method: str = 'upsert', bulk_rows: int = 50000, spool_dir: Optional[str] = None,
+                 resume: bool = False, base_url: Optional[str] = None, stream_json: bool = False,
+                 dedup: str = 'off', history: bool = True, history_retention_days: int = 0,
+                 progress_callback: Optional[Callable[[str, int, Optional[int]], None]] = None):
         self.db_config = db_config
-        self.base_url = "https://opendata.paris.fr/api/explore/v2.1/catalog/datasets"
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Paris-OpenData-Collector/1.0',
-            'Accept': 'application/json'
-        })
-    
-    def drop_existing_table(self):
-        """Supprime la table existante si elle existe pour éviter les conflits de schéma"""
+        self.dataset = dataset
+        # Table de destination des insertions (la table fantôme pendant un rechargement complet)
+        self.table = dataset.table
+        self.min_row_ratio = min_row_ratio
+        # upsert: executemany par lot, bulk: fichier TSV + LOAD DATA LOCAL INFILE tous les `bulk_rows`
+        self.load_method = load_method
+        self.bulk_rows = bulk_rows
+        self._bulk_loader = BulkLoader(dataset, spool_dir) if load_method == 'bulk' else None
+        # Quasi-doublons des nouvelles lignes: off, flag (signalés) ou merge (l'ancienne ligne est supprimée)
+        self.dedup = dedup if dataset.dedup_columns else 'off'
+        self.deduplicator = NearDuplicateDetector(dataset) if self.dedup != 'off' else None
+        # Clés supprimées par une fusion (mode merge): ignorées si la source les publie encore
+        self.merged_keys: set = set()
+        self.merged_skipped = 0
+        # Colonnes modifiées par run dans <table>_history, purgé au-delà de `history_retention_days` (0: jamais)
+        self.history = ChangeHistory(dataset) if history else None
+        self.history_retention_days = history_retention_days
+        # Point de reprise enregistré à chaque COMMIT: position atteinte dans la source après le lot en cours
+        self.resume = resume
+        self.run_id: Optional[str] = None
+        self.run_mode = 'incremental'
+        self.position: Dict = {}
+        self._run_where: Optional[str] = None
+        # Date de modification amont lue au début du run, future marque haute (conservée à la reprise)
+        self._run_upstream_modified: Optional[datetime] = None
+        # Bail du jeu de données pris par run_collection: vérifié avant chaque validation
+        self.lease: Optional[Lease] = None
+        # Appelé après chaque lot avec (jeu de données, enregistrements collectés, total attendu);
+        # une exception levée par le callback (annulation) interrompt la collecte
+        self.progress_callback = progress_callback
+        self.expected_total: Optional[int] = None
+        # Décodage des pages au fil de la réception, par lots de `batch_size` (hors cache HTTP)
+        self.stream_json = stream_json
+        self.base_url = (base_url or os.getenv('OPENDATA_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.source = source
+        self.batch_size = batch_size
+        self.watermark_field = watermark_field
+        self.commit_every = commit_every
+        self.pool_size = pool_size
+        self.pipeline = pipeline
+        self.queue_size = queue_size
+        self.stage_counters = {}
+        self.cache = cache
+        self.transform_workers = transform_workers
+        self.transform_chunk_size = transform_chunk_size
+        self._transform_executor = None
+        # Le pool MySQL, la session HTTP et le réglage du débit peuvent être partagés entre collecteurs
+        self._pool = pool
+        self._session_connection = None
+        self._pending_batches = 0
+        self.timings = {'connect_ms': 0.0}
+        # Débit, reprises et auto-réglage partagés par tous les workers
+        if tuner is None:
+            tuner = AdaptiveTuner(TokenBucket(requests_per_second), requests_per_second,
+                                  max_concurrency=self.concurrency, max_page_size=page_size)
+        self.tuner = tuner
+        self.budget = tuner.bucket
+        self.retry_policy = RetryPolicy(max_attempts=max_retries)
+        self.total_collected = 0
+        self.known_hashes: Dict[str, Optional[str]] = {}
+        self.stats = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        # Temps et volumes par étape du run, enregistrés avec son log
+        self.metrics = RunMetrics()
+        # Compteurs d'analyse des dates du run (le cache du normaliseur est partagé entre collecteurs)
+        self.date_stats = DateStats()
+        self.session = session if session is not None else create_http_session(self.concurrency)
+    
+    def get_connection(self):
+        """Retourne la connexion de la session en cours, sinon une connexion du pool"""
+        if self._session_connection is not None:
+            return self._session_connection
+        
+        started = time.perf_counter()
+        if self._pool is None:
+            self._pool = create_connection_pool(self.db_config, self.pool_size, f"collector_{id(self)}",
+                                                allow_local_infile=self.load_method == 'bulk')
+        connection = self._pool.get_connection()
+        self.timings['connect_ms'] += (time.perf_counter() - started) * 1000
+        return connection
+    
+    def release_connection(self, connection):
+        """Rend une connexion au pool (la connexion de session reste ouverte)"""
+        if connection is not self._session_connection and connection.is_connected():
+            connection.close()
+    
+    @contextmanager
+    def db_session(self):
+        """Partage une seule connexion pour toute la durée d'un run
+        
+        Les insertions sont validées tous les `commit_every` lots
+        (0 = une seule transaction pour tout le run).
+        """
+        if self._session_connection is not None:
+            yield self._session_connection
+            return
+        
+        connection = self.get_connection()
+        self._session_connection = connection
+        self._pending_batches = 0
         try:
-            connection = mysql.connector.connect(**self.db_config.__dict__)
-            cursor = connection.cursor()
-            
-            cursor.execute("DROP TABLE IF EXISTS paris_projects")
-            cursor.execute("DROP TABLE IF EXISTS collection_logs")
-            
+            yield connection
             connection.commit()
-            logging.info("Tables existantes supprimées")
-            
-        except Error as e:
-            logging.error(f"Erreur lors de la suppression des tables: {e}")
+        except Exception:
+            connection.rollback()
             raise
         finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
+            self._session_connection = None
+            self.release_connection(connection)
+            logging.info(f"Temps d'établissement des connexions: {self.timings['connect_ms']:.0f} ms")
+    
+    def _check_lease(self):
+        """Lève LeaseLost si le bail de collecte a expiré ou a été repris par un autre nœud"""
+        if self.lease is not None:
+            self.lease.check()
+    
+    def _commit_batch(self, connection):
+        """Valide un lot d'insertion selon la frontière de transaction configurée"""
+        self._check_lease()
+        if connection is not self._session_connection:
+            connection.commit()
+            return
+        self._pending_batches += 1
+        if self.commit_every and self._pending_batches >= self.commit_every:
+            # Le point de reprise est validé dans la même transaction que les lignes
+            self._save_checkpoint(connection)
+            connection.commit()
+            self._pending_batches = 0
+    
+    def _commit_session(self):
+        """Valide les lots en attente de la session en cours"""
+        self._check_lease()
+        if self._session_connection is not None:
+            self._session_connection.commit()
+            self._pending_batches = 0
+    
+    def _rollback_pending(self):
+        """Annule les lots non validés de la session en cours"""
+        if self._session_connection is not None:
+            self._session_connection.rollback()
+            self._pending_batches = 0
     
     def create_database_schema(self):
         """Crée les tables nécessaires dans la base de données"""
         try:
-            connection = mysql.connector.connect(**self.db_config.__dict__)
+            connection = self.get_connection()
             cursor = connection.cursor()
             
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS paris_projects (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    record_id VARCHAR(255) UNIQUE,
-                    nom_projet TEXT,
-                    description TEXT,
-                    categorie VARCHAR(255),
-                    sous_categorie VARCHAR(255),
-                    arrondissement VARCHAR(50),
-                    adresse TEXT,
-                    code_postal VARCHAR(10),
-                    coordonnees_geo POINT NOT NULL,
-                    latitude DECIMAL(10, 8) NOT NULL,
-                    longitude DECIMAL(11, 8) NOT NULL,
-                    etat_avancement VARCHAR(100),
-                    date_debut DATE,
-                    date_fin DATE,
-                    budget DECIMAL(15, 2),
-                    maitre_ouvrage VARCHAR(255),
-                    url_parisfr TEXT,
-                    url_photo TEXT,
-                    credit_photo VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    INDEX idx_arrondissement (arrondissement),
-                    INDEX idx_code_postal (code_postal),
-                    INDEX idx_categorie (categorie),
-                    INDEX idx_sous_categorie (sous_categorie),
-                    INDEX idx_etat (etat_avancement),
-                    INDEX idx_lat_lng (latitude, longitude),
-                    SPATIAL INDEX idx_geo (coordonnees_geo)
-                )
-            """)
+            cursor.execute(self.dataset.create_statement())
+            
+            # Migration des tables créées avant l'ajout de l'empreinte de contenu
+            self._ensure_column(cursor, self.dataset.table, 'content_hash', 'CHAR(32)')
             
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS collection_logs (
@@ -107,6 +263,59 @@ class ParisOpenDataCollector:
                     error_message TEXT
                 )
             """)
+            # Mesures par étape des runs (colonnes ajoutées aux tables existantes)
+            for column, definition in METRIC_COLUMNS:
+                self._ensure_column(cursor, 'collection_logs', column, definition)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS collection_checkpoints (
+                    run_id CHAR(32) PRIMARY KEY,
+                    dataset_name VARCHAR(255) NOT NULL,
+                    mode VARCHAR(20) NOT NULL,
+                    where_clause TEXT,
+                    position TEXT,
+                    records_collected INT DEFAULT 0,
+                    records_inserted INT DEFAULT 0,
+                    records_updated INT DEFAULT 0,
+                    records_unchanged INT DEFAULT 0,
+                    upstream_modified DATETIME NULL,
+                    status ENUM('running', 'completed', 'failed') NOT NULL,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    INDEX idx_dataset_status (dataset_name, status)
+                )
+            """)
+            self._ensure_column(cursor, 'collection_checkpoints', 'upstream_modified', 'DATETIME NULL')
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS collection_state (
+                    dataset_name VARCHAR(255) PRIMARY KEY,
+                    high_water_mark DATETIME NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+            """)
+            
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.dataset.rejects_table} (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    run_id CHAR(32),
+                    dataset_name VARCHAR(255) NOT NULL,
+                    record_key VARCHAR(255),
+                    reason_code VARCHAR(50) NOT NULL,
+                    reason TEXT,
+                    row_data JSON,
+                    rejected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_run (run_id),
+                    INDEX idx_reason (dataset_name, reason_code)
+                )
+            """)
+            
+            if self.deduplicator is not None:
+                for statement in self.deduplicator.create_statements():
+                    cursor.execute(statement)
+            
+            if self.history is not None:
+                cursor.execute(self.history.create_statement(date.today()))
             
             connection.commit()
             logging.info("Schéma de base de données créé avec succès")
@@ -115,166 +324,447 @@ class ParisOpenDataCollector:
             logging.error(f"Erreur lors de la création du schéma: {e}")
             raise
         finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
+            cursor.close()
+            self.release_connection(connection)
+    
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """Ajoute une colonne à une table existante si elle est absente"""
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logging.info(f"Colonne {column} ajoutée à la table {table}")
+    
+    def load_merged_keys(self) -> set:
+        """Charge les clés supprimées par les fusions des runs précédents"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(self.deduplicator.merged_query())
+            return {key for key, in cursor.fetchall()}
+            
+        except Error as e:
+            logging.error(f"Erreur lors du chargement des clés fusionnées: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def load_existing_hashes(self) -> Dict[str, Optional[str]]:
+        """Charge en une requête la correspondance clé -> empreinte de contenu (None pour une ligne sans empreinte)"""
+        key = self.dataset.key
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(f"SELECT {key}, content_hash FROM {self.table} WHERE {key} IS NOT NULL")
+            return {record_id: content_hash for record_id, content_hash in cursor.fetchall()}
+            
+        except Error as e:
+            logging.error(f"Erreur lors du chargement des empreintes: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def photo_urls(self) -> List[str]:
+        """URLs distinctes des photos du jeu de données (vide s'il n'a pas de colonne url_photo)"""
+        if 'url_photo' not in self.dataset.columns:
+            return []
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(f"SELECT DISTINCT url_photo FROM {self.dataset.table} WHERE url_photo IS NOT NULL AND url_photo <> ''")
+            return [url for url, in cursor.fetchall()]
+            
+        except Error as e:
+            logging.error(f"Erreur lors de la récupération des URLs de photos: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def _send_with_retry(self, send):
+        """Exécute une requête en respectant le débit, avec reprises sur les erreurs transitoires
+        
+        Les 429 suspendent toutes les requêtes le temps indiqué par Retry-After;
+        les 5xx, timeouts et coupures réseau sont repris avec un backoff
+        exponentiel. Chaque résultat alimente l'auto-réglage. Le temps passé, attente
+        du débit et reprises comprises, est compté dans l'étape de récupération.
+        """
+        with self.metrics.timer('fetch'):
+            return self._send_attempts(send)
+    
+    def _send_attempts(self, send):
+        attempt = 0
+        while True:
+            self.budget.acquire()
+            started = time.perf_counter()
+            self.metrics.add('http_calls')
+            if attempt:
+                self.metrics.add('http_retries')
+            try:
+                with self.tuner.slot():
+                    result = send()
+                self.tuner.record_success(time.perf_counter() - started)
+                return result
+            except requests.exceptions.HTTPError as e:
+                response = e.response
+                status = response.status_code if response is not None else None
+                if status not in RETRYABLE_STATUS or attempt + 1 >= self.retry_policy.max_attempts:
+                    raise
+                retry_after = self.retry_policy.retry_after(response)
+                delay = retry_after if retry_after is not None else self.retry_policy.backoff(attempt)
+                if status == 429:
+                    # La pause s'applique à tous les workers
+                    self.tuner.record_failure('throttled')
+                    self.budget.pause(delay)
+                else:
+                    self.tuner.record_failure('server_error')
+                    time.sleep(delay)
+                logging.warning(f"HTTP {status}, nouvelle tentative dans {delay:.1f}s")
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if attempt + 1 >= self.retry_policy.max_attempts:
+                    raise
+                self.tuner.record_failure('timeout')
+                delay = self.retry_policy.backoff(attempt)
+                logging.warning(f"{type(e).__name__}, nouvelle tentative dans {delay:.1f}s")
+                time.sleep(delay)
+            attempt += 1
+    
+    def _get_json(self, url: str, params: Optional[Dict] = None) -> Dict:
+        """GET d'une ressource JSON, via le cache HTTP conditionnel s'il est activé"""
+        def send():
+            if self.cache is not None:
+                return json.loads(self.cache.fetch(self.session, url, params, timeout=30,
+                                                   on_download=self._count_bytes))
+            response = self.session.get(url, params=params, timeout=30)
+            response.raise_for_status()
+            self._count_bytes(response.content)
+            return response.json()
+        return self._send_with_retry(send)
+    
+    def _count_bytes(self, body: bytes):
+        self.metrics.add('bytes_downloaded', len(body))
+    
+    def fetch_dataset_modified(self) -> Optional[datetime]:
+        """Retourne la date de dernière modification du jeu de données (métadonnées du catalogue, en UTC)"""
+        url = f"{self.base_url}/{self.dataset.name}"
+        
+        try:
+            metas = self._get_json(url).get('metas', {}).get('default', {})
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Erreur lors de la récupération des métadonnées: {e}")
+            raise
+        
+        modified = metas.get('data_processed') or metas.get('modified')
+        if not modified:
+            return None
+        parsed = datetime.fromisoformat(modified.replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    
+    def get_high_water_mark(self, dataset_name: str) -> Optional[datetime]:
+        """Lit la marque haute de la dernière collecte réussie"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(
+                "SELECT high_water_mark FROM collection_state WHERE dataset_name = %s",
+                (dataset_name,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+            
+        except Error as e:
+            logging.error(f"Erreur lors de la lecture de la marque haute: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def set_high_water_mark(self, dataset_name: str, mark: datetime):
+        """Enregistre la marque haute après une collecte réussie"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute("""
+                INSERT INTO collection_state (dataset_name, high_water_mark)
+                VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE high_water_mark = VALUES(high_water_mark)
+            """, (dataset_name, mark))
+            
+            connection.commit()
+            
+        except Error as e:
+            logging.error(f"Erreur lors de l'enregistrement de la marque haute: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
     
-    def fetch_paris_projects(self, limit: int = 100, offset: int = 0) -> Dict:
-        """Récupère les données des projets Paris se transforme"""
-        url = f"{self.base_url}/parissetransforme/records"
+    def _save_checkpoint(self, connection, status: str = 'running'):
+        """Enregistre la position et les compteurs du run sur la connexion donnée (sans COMMIT)"""
+        if self.run_id is None:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO collection_checkpoints
+                (run_id, dataset_name, mode, where_clause, position, records_collected,
+                 records_inserted, records_updated, records_unchanged, upstream_modified, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                position = VALUES(position),
+                records_collected = VALUES(records_collected),
+                records_inserted = VALUES(records_inserted),
+                records_updated = VALUES(records_updated),
+                records_unchanged = VALUES(records_unchanged),
+                status = VALUES(status)
+            """, (self.run_id, self.dataset.name, self.run_mode, self._run_where, json.dumps(self.position),
+                  self.total_collected, self.stats['inserted'], self.stats['updated'],
+                  self.stats['unchanged'], self._run_upstream_modified, status))
+        finally:
+            cursor.close()
+    
+    def mark_checkpoint(self, status: str):
+        """Change le statut du point de reprise du run en cours
+        
+        La position et les compteurs restent ceux du dernier COMMIT: après un
+        échec, les lots non validés ont été annulés et seront rejoués.
+        """
+        if self.run_id is None:
+            return
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(
+                "UPDATE collection_checkpoints SET status = %s WHERE run_id = %s",
+                (status, self.run_id)
+            )
+            connection.commit()
+            
+        except Error as e:
+            logging.error(f"Erreur lors de l'enregistrement du point de reprise: {e}")
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def load_checkpoint(self) -> Optional[Dict]:
+        """Retourne le point de reprise du dernier run du jeu de données s'il n'est pas terminé"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            
+            cursor.execute("""
+                SELECT run_id, mode, where_clause, position, records_collected,
+                       records_inserted, records_updated, records_unchanged, upstream_modified,
+                       status, updated_at
+                FROM collection_checkpoints
+                WHERE dataset_name = %s
+                ORDER BY updated_at DESC, started_at DESC
+                LIMIT 1
+            """, (self.dataset.name,))
+            checkpoint = cursor.fetchone()
+            if not checkpoint or checkpoint['status'] == 'completed':
+                return None
+            checkpoint['position'] = json.loads(checkpoint['position'] or '{}')
+            return checkpoint
+            
+        except Error as e:
+            logging.error(f"Erreur lors de la lecture du point de reprise: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def _find_resume_checkpoint(self) -> Optional[Dict]:
+        """Point de reprise utilisable pour le mode courant, si --resume est demandé"""
+        if not self.resume:
+            return None
+        checkpoint = self.load_checkpoint()
+        if not checkpoint:
+            logging.info("Aucun point de reprise, collecte depuis le début")
+            return None
+        if checkpoint['mode'] != self.run_mode:
+            logging.info(f"Point de reprise {checkpoint['run_id']} issu d'un run {checkpoint['mode']}, ignoré en mode {self.run_mode}")
+            return None
+        logging.info(f"Reprise du run {checkpoint['run_id']} à la position {checkpoint['position']} "
+                     f"({checkpoint['records_collected']} enregistrements déjà collectés)")
+        return checkpoint
+    
+    def fetch_records(self, limit: int = 100, offset: int = 0, where: Optional[str] = None) -> Dict:
+        """Récupère une page d'enregistrements du jeu de données"""
+        url = f"{self.base_url}/{self.dataset.name}/records"
         params = {
             'limit': limit,
             'offset': offset,
             'timezone': 'Europe/Paris'
         }
+        if where:
+            params['where'] = where
         
         try:
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(url, params)
         except requests.exceptions.RequestException as e:
             logging.error(f"Erreur lors de la récupération des données: {e}")
             raise
     
-    def process_project_record(self, record: Dict) -> Dict:
-        """Traite un enregistrement de projet pour l'insertion en base"""
+    def stream_records(self, limit: int = 100, offset: int = 0, where: Optional[str] = None) -> StreamingJSONArray:
+        """Comme fetch_records, mais les enregistrements sont décodés au fil de la réception"""
+        url = f"{self.base_url}/{self.dataset.name}/records"
+        params = {
+            'limit': limit,
+            'offset': offset,
+            'timezone': 'Europe/Paris'
+        }
+        if where:
+            params['where'] = where
         
-        # Extraction des coordonnées géographiques
-        geo_point = record.get('geo_point_2d')
-        latitude = longitude = None
-        if geo_point and isinstance(geo_point, dict):
-            latitude = geo_point.get('lat')
-            longitude = geo_point.get('lon')
+        def send():
+            response = self.session.get(url, params=params, stream=True, timeout=(10, 60))
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return response
         
-        # Traitement des dates
-        date_debut = self.parse_date(record.get('date_debut'))
-        date_fin = self.parse_date(record.get('date_fin'))
+        try:
+            return StreamingJSONArray(self._iter_body(self._send_with_retry(send)))
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Erreur lors de la récupération des données: {e}")
+            raise
+    
+    def _iter_body(self, response: requests.Response, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Morceaux du corps d'une réponse en flux (lecture comptée dans la récupération)"""
+        try:
+            chunks = response.iter_content(chunk_size)
+            while True:
+                started = time.perf_counter()
+                chunk = next(chunks, None)
+                self.metrics.add_time('fetch', time.perf_counter() - started)
+                if chunk is None:
+                    return
+                self.metrics.add('bytes_downloaded', len(chunk))
+                yield chunk
+        finally:
+            response.close()
+    
+    def _page_batches(self, limit: int, offset: int, where: Optional[str] = None) -> Tuple[Iterator[List[Dict]], Dict]:
+        """Lots d'enregistrements d'une page et autres champs de la réponse (total_count)
         
-        # Nettoyage du budget
-        budget = None
-        if record.get('budget'):
-            try:
-                budget = float(str(record['budget']).replace('€', '').replace(',', '.').strip())
-            except (ValueError, AttributeError):
-                pass
-        
-        # Extraction de l'arrondissement depuis le code postal
-        arrondissement = None
-        code_postal = record.get('code_postal')
-        if code_postal and code_postal.startswith('750'):
-            try:
-                arr_num = int(code_postal[-2:])
-                if 1 <= arr_num <= 20:
-                    arrondissement = f"{arr_num}e arrondissement"
-            except (ValueError, TypeError):
-                pass
-        
-        # Génération d'un record_id unique basé sur le titre et l'adresse
-        record_id = None
-        titre = record.get('titre_descriptif', '')
-        adresse = record.get('adresse', '')
-        if titre or adresse:
-            unique_string = f"{titre}_{adresse}_{code_postal}"
-            record_id = hashlib.md5(unique_string.encode()).hexdigest()
-        
-        return {
-            'record_id': record_id,
-            'nom_projet': record.get('titre_descriptif'),
-            'description': record.get('corps_descriptif'),
-            'categorie': record.get('categorie'),
-            'sous_categorie': record.get('sous_categorie'),
-            'arrondissement': arrondissement,
-            'adresse': record.get('adresse'),
-            'code_postal': record.get('code_postal'),
-            'latitude': latitude,
-            'longitude': longitude,
-            'etat_avancement': record.get('sous_categorie'),
-            'date_debut': date_debut,
-            'date_fin': self.parse_date(record.get('date_liv')),
-            'budget': budget,
-            'maitre_ouvrage': record.get('categorie'),
-            'url_parisfr': record.get('url_parisfr'),
-            'url_photo': record.get('url_pj'),
-            'credit_photo': record.get('credit_photo')
-        }
+        En mode stream_json la page est décodée au fil de la réception par lots
+        de `batch_size`: `fields` n'est complet qu'une fois les lots consommés.
+        """
+        if self.stream_json:
+            page = self.stream_records(limit=limit, offset=offset, where=where)
+            return iter_batches(page, self.batch_size), page.fields
+        response_data = self.fetch_records(limit=limit, offset=offset, where=where)
+        records = response_data.pop('results', [])
+        return iter([records] if records else []), response_data
+    
+    def process_project_record(self, record: Dict) -> Dict:
+        """Traite un enregistrement de projet pour l'insertion en base"""
+        return dict(zip(self.dataset.columns, self.dataset.transform(record)))
     
     def parse_date(self, date_str: str) -> Optional[str]:
         """Parse une date depuis différents formats"""
-        if not date_str:
-            return None
+        return parse_date(date_str)
+    
+    def insert_projects(self, projects: List[Dict]) -> int:
+        """Insert les projets dans la base de données"""
+        columns = self.dataset.columns
+        return self.insert_rows([tuple(project.get(column) for column in columns) for project in projects])
+    
+    def insert_rows(self, rows: List[Tuple]) -> int:
+        """Insert des lignes (ordre des colonnes du jeu de données) dans la base de données"""
+        if not rows:
+            return 0
         
-        date_formats = ['%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%dT%H:%M:%S%z']
+        key_index = self.dataset.index(self.dataset.key)
+        hash_index = self.dataset.index('content_hash')
+        validate = self.dataset.validate
         
-        for fmt in date_formats:
-            try:
-                parsed_date = datetime.strptime(date_str.split('T')[0], fmt.split('T')[0])
-                return parsed_date.strftime('%Y-%m-%d')
-            except ValueError:
+        # Validation du lot entier, les lignes rejetées vont en quarantaine
+        reasons = validate(rows) if validate else [None] * len(rows)
+        rejects = []
+        
+        # Préparer les données pour l'insertion
+        insert_data = []
+        new_keys = set()
+        changed_keys = set()
+        new_count = changed_count = 0
+        for row, reason in zip(rows, reasons):
+            if reason:
+                rejects.append((row, reason))
+                continue
+            key = row[key_index]
+            # Ligne déjà fusionnée dans un quasi-doublon: la réinsérer relancerait la fusion en sens inverse
+            if key in self.merged_keys:
+                self.merged_skipped += 1
+                continue
+            # Ne pas réécrire les projets dont le contenu n'a pas changé
+            known_hash = self.known_hashes.get(key)
+            if known_hash is not None and known_hash == row[hash_index]:
+                self.stats['unchanged'] += 1
                 continue
+            # Une ligne sans empreinte (antérieure à la colonne content_hash) existe déjà: mise à jour
+            if key not in self.known_hashes:
+                new_count += 1
+                new_keys.add(key)
+            else:
+                changed_count += 1
+                changed_keys.add(key)
+            insert_data.append(row)
         
-        logging.warning(f"Format de date non reconnu: {date_str}")
-        return None
-    
-    def insert_projects(self, projects: List[Dict]) -> int:
-        """Insert les projets dans la base de données"""
-        if not projects:
+        if rejects:
+            self.quarantine_rows(rejects)
+        # Pendant un rechargement complet toutes les lignes sont nouvelles: pas de détection
+        if insert_data and self.deduplicator is not None and self.table == self.dataset.table:
+            merged = self.check_duplicates(insert_data, new_keys)
+            if merged:
+                # Une ligne du lot remplacée par une ligne suivante du même lot n'est pas insérée
+                kept = [row for row in insert_data if row[key_index] not in merged]
+                dropped_new = len(new_keys & merged)
+                new_count -= dropped_new
+                changed_count -= len(insert_data) - len(kept) - dropped_new
+                insert_data = kept
+        if insert_data and self.history is not None:
+            # Rechargement complet: chaque ligne est comparée à la table en service
+            keys = changed_keys if self.table == self.dataset.table else {row[key_index] for row in insert_data}
+            self.record_history(insert_data, keys)
+        if not insert_data:
             return 0
         
+        if self._bulk_loader is not None:
+            return self._spool_rows(insert_data, key_index, hash_index, new_count, changed_count)
+        
+        started = time.perf_counter()
         try:
-            connection = mysql.connector.connect(**self.db_config.__dict__)
+            connection = self.get_connection()
             cursor = connection.cursor()
             
-            insert_query = """
-                INSERT INTO paris_projects 
-                (record_id, nom_projet, description, categorie, sous_categorie, arrondissement, adresse, 
-                 code_postal, latitude, longitude, etat_avancement, date_debut, date_fin, 
-                 budget, maitre_ouvrage, url_parisfr, url_photo, credit_photo, coordonnees_geo)
-                VALUES (%(record_id)s, %(nom_projet)s, %(description)s, %(categorie)s, %(sous_categorie)s, 
-                        %(arrondissement)s, %(adresse)s, %(code_postal)s, %(latitude)s, %(longitude)s, 
-                        %(etat_avancement)s, %(date_debut)s, %(date_fin)s, %(budget)s, %(maitre_ouvrage)s, 
-                        %(url_parisfr)s, %(url_photo)s, %(credit_photo)s, POINT(%(longitude)s, %(latitude)s))
-                ON DUPLICATE KEY UPDATE
-                nom_projet = VALUES(nom_projet),
-                description = VALUES(description),
-                categorie = VALUES(categorie),
-                sous_categorie = VALUES(sous_categorie),
-                arrondissement = VALUES(arrondissement),
-                adresse = VALUES(adresse),
-                code_postal = VALUES(code_postal),
-                latitude = VALUES(latitude),
-                longitude = VALUES(longitude),
-                etat_avancement = VALUES(etat_avancement),
-                date_debut = VALUES(date_debut),
-                date_fin = VALUES(date_fin),
-                budget = VALUES(budget),
-                maitre_ouvrage = VALUES(maitre_ouvrage),
-                url_parisfr = VALUES(url_parisfr),
-                url_photo = VALUES(url_photo),
-                credit_photo = VALUES(credit_photo),
-                coordonnees_geo = VALUES(coordonnees_geo),
-                updated_at = CURRENT_TIMESTAMP
-            """
-            
-            # Préparer les données pour l'insertion
-            insert_data = []
-            for project in projects:
-                # Créer une copie pour éviter les modifications sur l'original
-                data = project.copy()
-                # Vérifier que les coordonnées sont valides
-                if data['latitude'] is None or data['longitude'] is None:
-                    logging.warning(f"Projet {data.get('record_id', 'unknown')} ignoré: coordonnées manquantes")
-                    continue
-                # Vérifier que les coordonnées sont dans des plages valides
-                if not (-90 <= data['latitude'] <= 90) or not (-180 <= data['longitude'] <= 180):
-                    logging.warning(f"Projet {data.get('record_id', 'unknown')} ignoré: coordonnées invalides ({data['latitude']}, {data['longitude']})")
-                    continue
-                insert_data.append(data)
-            
-            cursor.executemany(insert_query, insert_data)
-            connection.commit()
+            cursor.executemany(self.dataset.upsert_query(self.table), insert_data)
+            
+            # Mémoriser les nouvelles empreintes pour la suite de la collecte
+            for row in insert_data:
+                if row[key_index] is not None:
+                    self.known_hashes[row[key_index]] = row[hash_index]
+            self.stats['inserted'] += new_count
+            self.stats['updated'] += changed_count
+            self._commit_batch(connection)
             
             inserted_count = cursor.rowcount
-            logging.info(f"{inserted_count} projets traités dans la base de données")
+            logging.info(f"{inserted_count} lignes traitées dans {self.table}")
             
             return inserted_count
             
@@ -282,84 +772,1024 @@ class ParisOpenDataCollector:
             logging.error(f"Erreur lors de l'insertion: {e}")
             raise
         finally:
-            if connection.is_connected():
+            cursor.close()
+            self.release_connection(connection)
+            self.metrics.add_time('insert', time.perf_counter() - started)
+    
+    def quarantine_rows(self, rejects: List[Tuple[Tuple, Tuple[str, str]]]):
+        """Enregistre en une requête les lignes rejetées et leur motif dans la table de quarantaine
+        
+        Dans une session, les rejets sont validés avec le lot en cours.
+        """
+        columns = self.dataset.columns
+        key_index = self.dataset.index(self.dataset.key)
+        self.metrics.reject(Counter(code for _, (code, _) in rejects))
+        
+        started = time.perf_counter()
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.executemany(f"""
+                INSERT INTO {self.dataset.rejects_table}
+                (run_id, dataset_name, record_key, reason_code, reason, row_data)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [(self.run_id, self.dataset.name, row[key_index], code, detail,
+                   json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+                  for row, (code, detail) in rejects])
+            if connection is not self._session_connection:
+                connection.commit()
+            
+        except Error as e:
+            logging.error(f"Erreur lors de l'enregistrement des lignes rejetées: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+            self.metrics.add_time('insert', time.perf_counter() - started)
+    
+    def check_duplicates(self, rows: List[Tuple], new_keys: set) -> set:
+        """Indexe les lignes et signale (ou fusionne) les quasi-doublons des nouvelles clés
+        
+        Retourne les clés des lignes supprimées par une fusion.
+        """
+        merged = set()
+        started = time.perf_counter()
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            duplicates = self.deduplicator.detect(cursor, rows, new_keys)
+            if duplicates:
+                status = 'merged' if self.dedup == 'merge' else 'flagged'
+                self.deduplicator.record(cursor, duplicates, status, self.run_id)
+                if self.dedup == 'merge':
+                    # Les lignes en attente de chargement en masse doivent être en table avant la suppression;
+                    # le lot en cours n'est pas encore en tampon: pas de point de reprise à ce stade
+                    if self._bulk_loader is not None:
+                        self.flush_bulk(checkpoint=False)
+                    merged = {duplicate.duplicate_of for duplicate in duplicates}
+                    self.merged_keys.update(merged)
+                    keys = sorted(merged)
+                    cursor.execute(
+                        f"DELETE FROM {self.table} WHERE {self.dataset.key} IN ({', '.join(['%s'] * len(keys))})",
+                        tuple(keys)
+                    )
+                    self.deduplicator.forget(cursor, keys)
+                    for key in keys:
+                        self.known_hashes.pop(key, None)
+                self.metrics.add('near_duplicates', len(duplicates))
+            if connection is not self._session_connection:
+                connection.commit()
+            return merged
+            
+        except Error as e:
+            logging.error(f"Erreur lors de la détection des quasi-doublons: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+            self.metrics.add_time('insert', time.perf_counter() - started)
+    
+    def record_history(self, rows: List[Tuple], keys: set):
+        """Ajoute à l'historique les colonnes modifiées des lignes `keys` (une lecture, une écriture par lot)"""
+        keys = sorted(key for key in keys if key is not None)
+        if not keys:
+            return
+        key_index = self.dataset.index(self.dataset.key)
+        started = time.perf_counter()
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(self.history.current_query(len(keys)), tuple(keys))
+            current = {row[0]: row[1:] for row in cursor.fetchall()}
+            changes = self.history.diff(current, [row for row in rows if row[key_index] in current])
+            if changes:
+                run_date = date.today()
+                cursor.executemany(self.history.insert_query(),
+                                   [(key, self.run_id, run_date, data) for key, data in changes])
+            if connection is not self._session_connection:
+                connection.commit()
+            
+        except Error as e:
+            logging.error(f"Erreur lors de l'enregistrement de l'historique: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+            self.metrics.add_time('insert', time.perf_counter() - started)
+    
+    def maintain_history(self):
+        """Ajoute la partition du mois à l'historique et supprime les partitions expirées"""
+        if self.history is None:
+            return
+        today = date.today()
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            if self.history.ensure_partition(cursor, today):
+                logging.info(f"Partition du mois ajoutée à {self.history.table}")
+            if self.history_retention_days > 0:
+                expired = self.history.expired_partitions(cursor, today - timedelta(days=self.history_retention_days))
+                if expired:
+                    self.history.drop_partitions(cursor, expired)
+                    logging.info(f"Partitions expirées supprimées de {self.history.table}: {', '.join(expired)}")
+            
+        except Error as e:
+            logging.error(f"Erreur lors de la maintenance des partitions de l'historique: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def index_existing_rows(self, batch_size: int = 1000):
+        """Calcule les signatures des lignes déjà en table qui n'en ont pas (activation de la détection)
+        
+        Les lignes sont seulement indexées: aucune n'est signalée ni supprimée,
+        seules les lignes nouvelles des runs suivants leur sont comparées.
+        """
+        key_index = self.dataset.index(self.dataset.key)
+        last_key = ''
+        indexed = 0
+        while True:
+            try:
+                connection = self.get_connection()
+                cursor = connection.cursor()
+                cursor.execute(self.deduplicator.unindexed_query(batch_size), (last_key,))
+                rows = cursor.fetchall()
+                if rows:
+                    self.deduplicator.index(cursor, rows)
+                    if connection is not self._session_connection:
+                        connection.commit()
+            except Error as e:
+                logging.error(f"Erreur lors de l'indexation des lignes existantes: {e}")
+                raise
+            finally:
                 cursor.close()
-                connection.close()
+                self.release_connection(connection)
+            if not rows:
+                break
+            last_key = rows[-1][key_index]
+            indexed += len(rows)
+        if indexed:
+            logging.info(f"{indexed} lignes existantes indexées pour la détection des quasi-doublons")
+    
+    def log_rejects(self):
+        """Résumé unique des lignes rejetées pendant le run"""
+        rejects = self.metrics.summary(self.total_collected, self.stats)['reject_reasons']
+        if not rejects:
+            return
+        details = ', '.join(f"{REJECT_REASONS.get(code, code)}: {count}"
+                            for code, count in sorted(rejects.items(), key=lambda item: -item[1]))
+        logging.warning(f"{sum(rejects.values())} lignes rejetées ({details}), "
+                        f"détail dans {self.dataset.rejects_table} (run {self.run_id})")
+    
+    def log_duplicates(self):
+        """Résumé unique des quasi-doublons détectés pendant le run"""
+        count = self.metrics.summary(self.total_collected, self.stats)['near_duplicates']
+        if count:
+            action = 'fusionnés' if self.dedup == 'merge' else 'signalés'
+            logging.warning(f"{count} quasi-doublons {action}, détail dans "
+                            f"{self.deduplicator.duplicates_table} (run {self.run_id})")
+        if self.merged_skipped:
+            logging.info(f"{self.merged_skipped} lignes déjà fusionnées dans un quasi-doublon ignorées")
+    
+    def _spool_rows(self, rows: List[Tuple], key_index: int, hash_index: int,
+                    new_count: int, changed_count: int) -> int:
+        """Mode bulk: ajoute les lignes au fichier tampon et le charge lorsqu'il est plein"""
+        with self.metrics.timer('insert'):
+            self._bulk_loader.add(rows)
+        for row in rows:
+            if row[key_index] is not None:
+                self.known_hashes[row[key_index]] = row[hash_index]
+        self.stats['inserted'] += new_count
+        self.stats['updated'] += changed_count
+        if len(self._bulk_loader) >= self.bulk_rows:
+            self.flush_bulk()
+        return len(rows)
+    
+    def flush_bulk(self, checkpoint: bool = True) -> int:
+        """Charge le fichier tampon du mode bulk dans la table de destination
+        
+        Sans `checkpoint`, les lignes chargées sont validées avec le lot suivant
+        de la session, sans enregistrer de point de reprise.
+        """
+        if self._bulk_loader is None or not len(self._bulk_loader):
+            return 0
+        
+        started = time.perf_counter()
+        try:
+            connection = self.get_connection()
+            
+            affected = self._bulk_loader.load(connection, self.table)
+            if checkpoint:
+                self._commit_batch(connection)
+            elif connection is not self._session_connection:
+                connection.commit()
+            return affected
+            
+        except Error as e:
+            logging.error(f"Erreur lors du chargement en masse: {e}")
+            raise
+        finally:
+            self.release_connection(connection)
+            self.metrics.add_time('insert', time.perf_counter() - started)
     
     def log_collection(self, dataset_name: str, records_count: int, 
                       status: str, error_message: str = None):
-        """Enregistre le résultat d'une collecte"""
+        """Enregistre le résultat d'une collecte et les mesures par étape du run"""
+        metric_columns = [column for column, _ in METRIC_COLUMNS]
         try:
-            connection = mysql.connector.connect(**self.db_config.__dict__)
+            connection = self.get_connection()
             cursor = connection.cursor()
             
-            cursor.execute("""
+            cursor.execute(f"""
                 INSERT INTO collection_logs 
-                (dataset_name, records_collected, status, error_message)
-                VALUES (%s, %s, %s, %s)
-            """, (dataset_name, records_count, status, error_message))
+                (dataset_name, records_collected, status, error_message, {', '.join(metric_columns)})
+                VALUES (%s, %s, %s, %s, {', '.join(['%s'] * len(metric_columns))})
+            """, (dataset_name, records_count, status, error_message)
+                + self.metrics.as_row(self.run_id, records_count, self.stats))
             
             connection.commit()
             
         except Error as e:
             logging.error(f"Erreur lors de l'enregistrement du log: {e}")
         finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
+            cursor.close()
+            self.release_connection(connection)
+    
+    def log_metrics(self):
+        summary = self.metrics.summary(self.total_collected, self.stats)
+        logging.info(
+            f"Mesures du run: récupération {summary['fetch_ms']} ms ({summary['http_calls']} appels, "
+            f"{summary['http_retries']} reprises, {summary['bytes_downloaded'] / 1024:.0f} Ko), "
+            f"transformation {summary['transform_ms']} ms, insertion {summary['insert_ms']} ms, "
+            f"{summary['rows_per_second']} lignes/s, pic mémoire {summary['peak_rss_kb']} Ko"
+        )
     
-    def collect_all_data(self):
-        """Collecte toutes les données disponibles avec pagination"""
-        logging.info("Début de la collecte des données Paris se transforme")
+    def stream_export_records(self, where: Optional[str] = None) -> Iterator[Dict]:
+        """Télécharge l'export complet du jeu de données en flux (une ligne JSON par enregistrement)"""
+        url = f"{self.base_url}/{self.dataset.name}/exports/jsonl"
+        params = {'timezone': 'Europe/Paris'}
+        if where:
+            params['where'] = where
+        
+        def send():
+            response = self.session.get(url, params=params, stream=True, timeout=(10, 60))
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return response
         
         try:
-            offset = 0
-            limit = 100
-            total_collected = 0
+            with self._send_with_retry(send) as response:
+                # Lecture du corps comptée dans la récupération (hors traitement des lots)
+                started = time.perf_counter()
+                for line in response.iter_lines():
+                    self.metrics.add('bytes_downloaded', len(line) + 1)
+                    if line:
+                        record = json.loads(line)
+                        self.metrics.add_time('fetch', time.perf_counter() - started)
+                        yield record
+                        started = time.perf_counter()
+                self.metrics.add_time('fetch', time.perf_counter() - started)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Erreur lors du téléchargement de l'export: {e}")
+            raise
+    
+    def _process_records(self, records: List[Dict]) -> List[Tuple]:
+        """Transforme une page (ou un lot d'export) en lignes prêtes à insérer"""
+        with self.metrics.timer('transform'):
+            return self._transform_records(records)
+    
+    def _transform_records(self, records: List[Dict]) -> List[Tuple]:
+        if self.transform_workers > 1 and len(records) > self.transform_chunk_size:
+            if self._transform_executor is None:
+                self._transform_executor = ProcessPoolExecutor(max_workers=self.transform_workers)
+            return transform_batch_parallel(records, self._transform_executor, self.transform_chunk_size,
+                                            self.dataset.transform, self.date_stats,
+                                            self.dataset.classify_arrondissements)
+        return transform_batch(records, self.dataset.transform, self.date_stats,
+                               self.dataset.classify_arrondissements)
+    
+    def _collect_serially(self, where: Optional[str] = None, start: int = 0):
+        """Parcourt les pages une par une (mode historique)"""
+        offset = start
+        
+        while True:
+            limit = self.tuner.page_size
+            logging.info(f"Récupération des enregistrements {offset} à {offset + limit}")
             
-            while True:
-                logging.info(f"Récupération des enregistrements {offset} à {offset + limit}")
-                
-                response_data = self.fetch_paris_projects(limit=limit, offset=offset)
-                records = response_data.get('results', [])
-                
-                if not records:
-                    logging.info("Aucun enregistrement supplémentaire trouvé")
-                    break
+            batches, fields = self._page_batches(limit, offset, where)
+            # Une page décodée en flux est insérée par lots: elle est relue en entier à la reprise
+            next_offset = offset if self.stream_json else offset + limit
+            received = 0
+            for records in batches:
+                received += len(records)
                 
                 # Traitement des enregistrements
-                processed_projects = []
-                for record in records:
-                    try:
-                        processed_project = self.process_project_record(record)
-                        processed_projects.append(processed_project)
-                    except Exception as e:
-                        logging.warning(f"Erreur lors du traitement de l'enregistrement {record.get('record_id', 'unknown')}: {e}")
+                processed_projects = self._process_records(records)
+                self.position = {'source': 'records', 'offset': next_offset}
                 
                 # Insertion en base
                 if processed_projects:
-                    inserted = self.insert_projects(processed_projects)
-                    total_collected += len(processed_projects)
-                
-                # Vérification s'il y a plus de données
-                total_count = response_data.get('total_count', 0)
-                if offset + limit >= total_count:
+                    self.total_collected += len(processed_projects)
+                    self.insert_rows(processed_projects)
+                    self._report_progress()
+            
+            if not received:
+                logging.info("Aucun enregistrement supplémentaire trouvé")
+                break
+            
+            # Vérification s'il y a plus de données
+            total_count = fields.get('total_count', 0)
+            if offset + limit >= total_count:
+                break
+            
+            offset += limit
+    
+    def _report_progress(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self.dataset.name, self.total_collected, self.expected_total)
+    
+    def _count_records(self, where: Optional[str] = None) -> int:
+        """Retourne le nombre d'enregistrements correspondant au filtre"""
+        return self.fetch_records(limit=1, offset=0, where=where).get('total_count', 0)
+    
+    def _fetch_partition_values(self, field: str, where: Optional[str] = None) -> List[Dict]:
+        """Récupère les valeurs distinctes d'un champ et leur effectif (group_by)"""
+        url = f"{self.base_url}/{self.dataset.name}/records"
+        params = {
+            'select': f'{field}, count(*) as n',
+            'group_by': field,
+            'limit': 100
+        }
+        if where:
+            params['where'] = where
+        try:
+            return self._get_json(url, params).get('results', [])
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Erreur lors du partitionnement sur {field}: {e}")
+            raise
+    
+    def _split_windows(self, total: int, where: Optional[str] = None) -> List[FetchRange]:
+        """Découpe [0, total) en fenêtres d'offset alignées sur la taille de page"""
+        total = min(total, MAX_OFFSET_WINDOW)
+        if total <= 0:
+            return []
+        pages = math.ceil(total / self.page_size)
+        windows = min(pages, self.concurrency * 2)
+        pages_per_window = math.ceil(pages / windows)
+        step = pages_per_window * self.page_size
+        return [FetchRange(start, min(start + step, total), where) for start in range(0, total, step)]
+    
+    def plan_ranges(self, partition_field: Optional[str] = None, where: Optional[str] = None) -> List[FetchRange]:
+        """Planifie les plages à récupérer: fenêtres d'offset, puis partitions `where`
+        lorsque le plafond d'offset de la source est atteint"""
+        partition_field = partition_field or self.dataset.partition_field
+        total = self._count_records(where)
+        if total <= MAX_OFFSET_WINDOW or not partition_field:
+            if total > MAX_OFFSET_WINDOW:
+                logging.warning(f"{total} enregistrements au-delà du plafond d'offset et aucun champ de partition, "
+                                f"seuls {MAX_OFFSET_WINDOW} seront récupérés")
+            return self._split_windows(total, where)
+        
+        logging.info(f"{total} enregistrements au-delà du plafond d'offset, partitionnement sur {partition_field}")
+        ranges = []
+        partitioned = 0
+        for item in self._fetch_partition_values(partition_field, where):
+            value = item.get(partition_field)
+            count = item.get('n', 0)
+            if value is None:
+                partition = f'{partition_field} is null'
+            else:
+                escaped = str(value).replace('"', '\\"')
+                partition = f'{partition_field}="{escaped}"'
+            if where:
+                partition = f'({where}) and {partition}'
+            if count > MAX_OFFSET_WINDOW:
+                logging.warning(f"Partition {partition} trop volumineuse ({count}), seuls {MAX_OFFSET_WINDOW} enregistrements seront récupérés")
+            ranges.extend(self._split_windows(count, partition))
+            partitioned += count
+        if partitioned != total:
+            logging.warning(f"Le partitionnement couvre {partitioned} enregistrements sur {total}")
+        return ranges
+    
+    def _fetch_range(self, fetch_range: FetchRange) -> List[Tuple]:
+        """Récupère et transforme tous les enregistrements d'une plage"""
+        processed_projects = []
+        offset = fetch_range.start
+        while offset < fetch_range.end:
+            limit = min(self.tuner.page_size, fetch_range.end - offset)
+            batches, _ = self._page_batches(limit, offset, fetch_range.where)
+            received = 0
+            for records in batches:
+                received += len(records)
+                processed_projects.extend(self._process_records(records))
+            if not received:
+                break
+            offset += limit
+        return processed_projects
+    
+    @staticmethod
+    def _range_key(fetch_range: FetchRange) -> str:
+        return f"{fetch_range.start}-{fetch_range.end}:{fetch_range.where or ''}"
+    
+    def _collect_concurrently(self, where: Optional[str] = None, done: Optional[List[str]] = None):
+        """Récupère les plages planifiées avec un pool de workers borné"""
+        done = list(done or [])
+        ranges = [r for r in self.plan_ranges(where=where) if self._range_key(r) not in done]
+        logging.info(f"{len(ranges)} plages à récupérer avec {self.concurrency} workers"
+                     + (f" ({len(done)} déjà collectées)" if done else ""))
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            # Les workers héritent du contexte de l'appelant (logs du job en cours)
+            futures = {executor.submit(contextvars.copy_context().run, self._fetch_range, fetch_range): fetch_range
+                       for fetch_range in ranges}
+            try:
+                self._consume_ranges(futures, done)
+            except BaseException:
+                # Ne pas attendre les plages restantes en cas d'erreur ou d'annulation
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+    
+    def _consume_ranges(self, futures: Dict, done: List[str]):
+        """Insère les plages dans le thread principal au fur et à mesure qu'elles sont récupérées"""
+        for future in as_completed(futures):
+            fetch_range = futures[future]
+            processed_projects = future.result()
+            logging.info(f"Plage {fetch_range.start}-{fetch_range.end} ({fetch_range.where or 'tout'}): {len(processed_projects)} projets")
+            done.append(self._range_key(fetch_range))
+            self.position = {'source': 'ranges', 'done': list(done)}
+            # L'insertion reste dans le thread principal
+            if processed_projects:
+                self.total_collected += len(processed_projects)
+                self.insert_rows(processed_projects)
+                self._report_progress()
+    
+    def iter_export_batches(self, where: Optional[str] = None, skip: int = 0) -> Iterator[Tuple[int, List[Dict]]]:
+        """Découpe le flux de l'export en lots de taille fixe
+        
+        Produit (position après le lot, lot); les `skip` premiers
+        enregistrements, déjà ingérés par un run interrompu, sont ignorés.
+        """
+        batch = []
+        position = 0
+        for record in self.stream_export_records(where):
+            position += 1
+            if position <= skip:
+                continue
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield position, batch
+                batch = []
+        if batch:
+            yield position, batch
+    
+    def iter_record_pages(self, where: Optional[str] = None, start: int = 0) -> Iterator[Tuple[int, List[Dict]]]:
+        """Parcourt page par page les plages de plan_ranges en respectant le budget de requêtes
+        
+        Au-delà du plafond d'offset de la source, les plages sont des partitions
+        `where` comme pour la collecte concurrente. Produit (position, page), la
+        position étant le nombre d'enregistrements parcourus dans les plages
+        dans l'ordre du plan (l'offset de la page suivante sans partitionnement);
+        en mode stream_json, chaque page est produite par lots avec la position
+        de son début.
+        """
+        consumed = 0
+        for fetch_range in self.plan_ranges(where=where):
+            size = fetch_range.end - fetch_range.start
+            if consumed + size <= start:
+                consumed += size
+                continue
+            offset = fetch_range.start + max(start - consumed, 0)
+            while offset < fetch_range.end:
+                limit = min(self.tuner.page_size, fetch_range.end - offset)
+                batches, _ = self._page_batches(limit, offset, fetch_range.where)
+                page_position = consumed + offset - fetch_range.start
+                next_position = page_position if self.stream_json else page_position + limit
+                received = 0
+                for records in batches:
+                    received += len(records)
+                    yield next_position, records
+                if not received:
                     break
-                
                 offset += limit
-                time.sleep(1)  # Pause pour ne pas surcharger l'API
+            consumed += size
+    
+    def _collect_from_export(self, where: Optional[str] = None, skip: int = 0):
+        """Ingère l'export en flux par lots de taille fixe (mémoire constante)"""
+        if skip:
+            logging.info(f"Export: {skip} enregistrements déjà ingérés ignorés")
+        for position, batch in self.iter_export_batches(where, skip):
+            self.position = {'source': 'export', 'offset': position}
+            self._load_export_batch(batch)
+    
+    def _load_export_batch(self, records: List[Dict]):
+        """Transforme et insère un lot issu de l'export"""
+        processed_projects = self._process_records(records)
+        if processed_projects:
+            self.total_collected += len(processed_projects)
+            self.insert_rows(processed_projects)
+            self._report_progress()
+        logging.info(f"Export: {self.total_collected} projets ingérés")
+    
+    def _load_processed(self, processed_projects: List[Tuple]):
+        """Étape de chargement du pipeline"""
+        self.total_collected += len(processed_projects)
+        self.insert_rows(processed_projects)
+        self._report_progress()
+    
+    def _collect_pipelined(self, where: Optional[str] = None, start: int = 0):
+        """Récupération, transformation et insertion en parallèle via des files bornées"""
+        if self.source == 'export':
+            batches = self.iter_export_batches(where, skip=start)
+        else:
+            batches = self.iter_record_pages(where, start=start)
+        
+        # Positions des lots en attente, dans l'ordre de la source (les étapes conservent l'ordre)
+        positions = deque()
+        
+        def source():
+            for position, batch in batches:
+                positions.append(position)
+                yield batch
+        
+        def on_batch(index: int):
+            self.position = {'source': self.source, 'offset': positions.popleft()}
+        
+        pipeline = IngestPipeline(
+            source=source(),
+            transform=self._process_records,
+            load=self._load_processed,
+            queue_size=self.queue_size,
+            on_batch=on_batch
+        )
+        self.stage_counters = pipeline.run()
+    
+    def log_success(self):
+        """Log de succès et résumés d'un run terminé"""
+        self.log_collection(self.dataset.name, self.total_collected, 'success')
+        logging.info(f"Collecte terminée avec succès. {self.total_collected} projets collectés "
+                     f"({self.stats['inserted']} insérés, {self.stats['updated']} mis à jour, "
+                     f"{self.stats['unchanged']} inchangés)")
+        self.log_metrics()
+        self.log_rejects()
+        self.log_duplicates()
+        self.date_stats.log_summary()
+        self.tuner.log_summary()
+        if self.cache is not None:
+            self.cache.log_summary()
+    
+    def complete_collection(self):
+        """Termine un run chargé avec complete=False: point de reprise terminé puis log de succès"""
+        self.mark_checkpoint('completed')
+        self.log_success()
+    
+    def collect_all_data(self, where: Optional[str] = None, checkpoint: Optional[Dict] = None,
+                         upstream_modified: Optional[datetime] = None, complete: bool = True):
+        """Collecte toutes les données disponibles avec pagination
+        
+        Avec un point de reprise (voir load_checkpoint), le run interrompu est
+        poursuivi à sa dernière position validée avec ses compteurs, et la date
+        de modification amont reste celle lue au début du run interrompu
+        (`_run_upstream_modified`, marque haute à enregistrer après le run).
+        
+        Sans `complete`, le run reste en cours une fois les données chargées:
+        l'appelant le termine par complete_collection() après ses propres
+        étapes (contrôle et bascule d'un rechargement complet).
+        """
+        logging.info(f"Début de la collecte du jeu de données {self.dataset.name}")
+        self.total_collected = 0
+        self.stats = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.run_id = uuid.uuid4().hex
+        self._run_where = where
+        self._run_upstream_modified = upstream_modified
+        self.position = {}
+        self.metrics.reset()
+        self.date_stats = DateStats()
+        
+        position = {}
+        if checkpoint:
+            self.run_id = checkpoint['run_id']
+            self._run_where = where = checkpoint['where_clause']
+            # Les modifications publiées depuis le début du run interrompu n'ont peut-être pas été lues
+            self._run_upstream_modified = checkpoint['upstream_modified']
+            self.total_collected = checkpoint['records_collected']
+            self.stats = {'inserted': checkpoint['records_inserted'], 'updated': checkpoint['records_updated'],
+                          'unchanged': checkpoint['records_unchanged']}
+            self.position = position = checkpoint['position']
+        
+        try:
+            with self.db_session():
+                self.known_hashes = self.load_existing_hashes()
+                self.merged_skipped = 0
+                if self.dedup == 'merge':
+                    self.merged_keys = self.load_merged_keys()
+                if self.deduplicator is not None and self.table == self.dataset.table:
+                    self.index_existing_rows()
+                
+                # Total attendu pour le pourcentage d'avancement (une requête limit=1)
+                if self.progress_callback is not None:
+                    self.expected_total = self._count_records(where)
+                    self._report_progress()
+                
+                # Une position enregistrée par un autre chemin de collecte n'est pas réutilisable
+                if self.pipeline:
+                    source = self.source
+                elif self.source == 'export':
+                    source = 'export'
+                elif self.concurrency > 1:
+                    source = 'ranges'
+                else:
+                    source = 'records'
+                if position and position.get('source') != source:
+                    logging.warning(f"Position {position} enregistrée par une autre source que {source}, reprise depuis le début")
+                    position = {}
+                
+                if self.pipeline:
+                    self._collect_pipelined(where, position.get('offset', 0))
+                elif self.source == 'export':
+                    self._collect_from_export(where, position.get('offset', 0))
+                elif self.concurrency > 1:
+                    self._collect_concurrently(where, position.get('done'))
+                else:
+                    self._collect_serially(where, position.get('offset', 0))
+                
+                self.flush_bulk()
+                if complete:
+                    self._save_checkpoint(self.get_connection(), 'completed')
             
-            self.log_collection('parissetransforme', total_collected, 'success')
-            logging.info(f"Collecte terminée avec succès. {total_collected} projets collectés")
+            if complete:
+                self.log_success()
             
         except Exception as e:
             error_msg = str(e)
             logging.error(f"Erreur lors de la collecte: {error_msg}")
-            self.log_collection('parissetransforme', total_collected, 'error', error_msg)
+            self._rollback_pending()
+            self.mark_checkpoint('failed')
+            self.log_collection(self.dataset.name, self.total_collected, 'error', error_msg)
+            raise
+        finally:
+            if self._bulk_loader is not None:
+                self._bulk_loader.discard()
+            if self._transform_executor is not None:
+                self._transform_executor.shutdown()
+                self._transform_executor = None
+    
+    @property
+    def shadow_table(self) -> str:
+        return f"{self.dataset.table}_next"
+    
+    @property
+    def previous_table(self) -> str:
+        return f"{self.dataset.table}_prev"
+    
+    def prepare_shadow_table(self):
+        """Recrée la table fantôme vide, avec le schéma et les index courants du jeu de données"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(f"DROP TABLE IF EXISTS {self.shadow_table}")
+            cursor.execute(self.dataset.create_statement(self.shadow_table))
+            
+            connection.commit()
+            logging.info(f"Table fantôme {self.shadow_table} créée")
+            
+        except Error as e:
+            logging.error(f"Erreur lors de la création de la table fantôme: {e}")
             raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def check_shadow_table(self) -> Optional[str]:
+        """Contrôle la table fantôme avant la bascule
+        
+        Retourne la raison du refus, ou None si la table peut remplacer la
+        table en service: elle ne doit pas être vide, ni perdre plus de
+        `min_row_ratio` des lignes actuelles, ni contenir de clé nulle ou en double.
+        """
+        key = self.dataset.key
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(f"SELECT COUNT(*), COUNT({key}), COUNT(DISTINCT {key}) FROM {self.shadow_table}")
+            total, non_null, distinct = cursor.fetchone()
+            cursor.execute(f"SELECT COUNT(*) FROM {self.dataset.table}")
+            live_total = cursor.fetchone()[0]
+            
+        except Error as e:
+            logging.error(f"Erreur lors du contrôle de la table fantôme: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+        
+        logging.info(f"Table fantôme: {total} lignes (table en service: {live_total})")
+        if total == 0:
+            return "table fantôme vide"
+        if non_null != total:
+            return f"{total - non_null} lignes sans {key}"
+        if distinct != total:
+            return f"{total - distinct} valeurs de {key} en double"
+        if live_total and total < live_total * self.min_row_ratio:
+            return f"{total} lignes contre {live_total} en service (minimum {self.min_row_ratio:.0%})"
+        return None
+    
+    def swap_tables(self):
+        """Met la table fantôme en service par un seul RENAME TABLE atomique
+        
+        L'ancienne table est conservée sous le nom `<table>_prev` pour un retour arrière immédiat.
+        """
+        self._check_lease()
+        table = self.dataset.table
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(f"DROP TABLE IF EXISTS {self.previous_table}")
+            cursor.execute(
+                f"RENAME TABLE {table} TO {self.previous_table}, {self.shadow_table} TO {table}"
+            )
+            logging.info(f"Table {self.shadow_table} mise en service, ancienne table conservée dans {self.previous_table}")
+            
+        except Error as e:
+            logging.error(f"Erreur lors de la bascule des tables: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def restore_previous_table(self):
+        """Retour arrière: remet en service la table du rechargement précédent"""
+        self._check_lease()
+        table = self.dataset.table
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(f"DROP TABLE IF EXISTS {self.shadow_table}")
+            cursor.execute(
+                f"RENAME TABLE {table} TO {self.shadow_table}, {self.previous_table} TO {table}"
+            )
+            logging.info(f"Table {self.previous_table} remise en service, table écartée conservée dans {self.shadow_table}")
+            
+        except Error as e:
+            logging.error(f"Erreur lors du retour arrière: {e}")
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(connection)
+    
+    def collect_full(self):
+        """Recharge tout le jeu de données sans interruption de service
+        
+        Les données sont chargées dans une table fantôme pendant que la table
+        en service continue de répondre, puis les deux tables sont échangées
+        si les contrôles passent. Le run n'est terminé (log de succès, point de
+        reprise) et la marque haute repositionnée qu'après la bascule.
+        """
+        self.run_mode = 'full'
+        upstream_modified = self.fetch_dataset_modified()
+        # Un rechargement repris poursuit le remplissage de la table fantôme existante
+        checkpoint = self._find_resume_checkpoint()
+        if checkpoint is None:
+            self.prepare_shadow_table()
+        
+        self.table = self.shadow_table
+        try:
+            self.collect_all_data(checkpoint=checkpoint, upstream_modified=upstream_modified, complete=False)
+            # Les lignes doivent être validées avant le contrôle (le RENAME valide aussi implicitement)
+            self._commit_session()
+        finally:
+            self.table = self.dataset.table
+        
+        try:
+            reason = self.check_shadow_table()
+            if reason:
+                message = f"Rechargement complet abandonné, table en service conservée: {reason}"
+                logging.error(message)
+                raise RuntimeError(message)
+            self.swap_tables()
+        except Exception as e:
+            self.mark_checkpoint('failed')
+            self.log_collection(self.dataset.name, self.total_collected, 'error', str(e))
+            raise
+        
+        self.complete_collection()
+        if self._run_upstream_modified:
+            self.set_high_water_mark(self.dataset.name, self._run_upstream_modified)
+    
+    def collect_incremental(self):
+        """Collecte uniquement les enregistrements modifiés depuis la dernière marque haute"""
+        self.run_mode = 'incremental'
+        dataset_name = self.dataset.name
+        upstream_modified = self.fetch_dataset_modified()
+        mark = self.get_high_water_mark(dataset_name)
+        
+        # Reprise d'un run interrompu (la marque haute n'a pas bougé depuis): la marque
+        # enregistrée est la date amont lue au début du run interrompu, pas la date actuelle
+        checkpoint = self._find_resume_checkpoint()
+        if checkpoint is not None:
+            self.collect_all_data(checkpoint=checkpoint)
+            if self._run_upstream_modified:
+                self.set_high_water_mark(dataset_name, self._run_upstream_modified)
+            return
+        
+        if mark and upstream_modified and upstream_modified <= mark:
+            logging.info(f"Aucune modification en amont depuis {mark.isoformat()}, collecte ignorée")
+            self.log_collection(dataset_name, 0, 'success')
+            return
+        
+        where = None
+        if mark and self.watermark_field:
+            where = f"{self.watermark_field} > date'{mark.strftime('%Y-%m-%dT%H:%M:%S')}Z'"
+            logging.info(f"Collecte incrémentale: {where}")
+        elif mark:
+            logging.info("Aucun champ de modification configuré, collecte complète sans suppression de la table")
+        
+        self.collect_all_data(where, upstream_modified=upstream_modified)
+        
+        # La marque est celle observée avant la collecte pour ne rien manquer
+        if upstream_modified:
+            self.set_high_water_mark(dataset_name, upstream_modified)
 
-def main():
-    """Fonction principale"""
+def run_collection(collector: ParisOpenDataCollector, mode: str = 'incremental',
+                   leases: Optional[LeaseManager] = None):
+    """Crée le schéma puis collecte un jeu de données sur une seule connexion
+    
+    Avec `leases`, le bail du jeu de données est pris pour toute la durée du run
+    (LeaseUnavailable s'il est collecté sur un autre nœud).
+    """
+    with leases.acquire(collector.dataset.name) if leases is not None else nullcontext() as lease:
+        if lease is not None:
+            collector.lease = lease
+            lease.progress = lambda: (collector.run_id, collector.total_collected)
+        
+        with collector.db_session():
+            # Retour arrière vers la table du rechargement complet précédent
+            if mode == 'rollback':
+                collector.restore_previous_table()
+                return
+            
+            # Création du schéma de base de données
+            collector.create_database_schema()
+            collector.maintain_history()
+            
+            # Collecte des données
+            if mode == 'full':
+                collector.collect_full()
+            else:
+                collector.collect_incremental()
+
+def collect_datasets(db_config: DatabaseConfig, names: List[str], mode: str = 'incremental',
+                     max_workers: Optional[int] = None, concurrency: int = 1,
+                     requests_per_second: float = 4.0, page_size: int = 100, lease_ttl: float = 60,
+                     **options) -> Dict[str, str]:
+    """Collecte plusieurs jeux de données en parallèle, un job par jeu de données
+    
+    Les jobs partagent la session HTTP, le pool MySQL et le réglage du débit:
+    le plafond `requests_per_second` vaut pour l'ensemble des jeux de données.
+    Chaque job détient le bail de son jeu de données (durée `lease_ttl` en
+    secondes, 0 = sans bail): un jeu de données n'est collecté que par un seul
+    nœud à la fois. Retourne les erreurs par jeu de données (vide si tout a réussi).
+    """
+    leases = None
+    if lease_ttl > 0:
+        leases = LeaseManager(lambda: mysql.connector.connect(**db_config.__dict__), ttl=lease_ttl)
+        leases.ensure_table()
+    
+    definitions = [get_dataset(name) for name in names]
+    total_concurrency = max(1, concurrency) * len(definitions)
+    session = create_http_session(total_concurrency)
+    # Une connexion de session par job, plus une de marge
+    pool = create_connection_pool(db_config, len(definitions) + 1, f"collectors_{os.getpid()}",
+                                  allow_local_infile=options.get('load_method') == 'bulk')
+    tuner = AdaptiveTuner(TokenBucket(requests_per_second), requests_per_second,
+                          max_concurrency=total_concurrency, max_page_size=page_size)
+    
+    errors = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or len(definitions)) as executor:
+            futures = {}
+            for definition in definitions:
+                collector = ParisOpenDataCollector(
+                    db_config,
+                    concurrency=concurrency,
+                    requests_per_second=requests_per_second,
+                    page_size=page_size,
+                    dataset=definition,
+                    session=session,
+                    pool=pool,
+                    tuner=tuner,
+                    **options
+                )
+                futures[executor.submit(contextvars.copy_context().run, run_collection,
+                                        collector, mode, leases)] = definition.name
+            
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    logging.info(f"Jeu de données {name} collecté")
+                except Exception as e:
+                    logging.error(f"Échec de la collecte du jeu de données {name}: {e}")
+                    errors[name] = str(e)
+    finally:
+        if leases is not None:
+            leases.close()
+    return errors
+
+def prefetch_thumbnails(db_config: DatabaseConfig, names: List[str], cache_dir: str,
+                        max_bytes: int, workers: int = 4):
+    """Étape post-collecte: génère les miniatures des photos des jeux de données collectés"""
+    cache = ThumbnailCache(cache_dir, max_bytes=max_bytes)
+    try:
+        for name in names:
+            collector = ParisOpenDataCollector(db_config, dataset=get_dataset(name))
+            urls = collector.photo_urls()
+            if urls:
+                logging.info(f"Préchargement des miniatures du jeu de données {name}")
+                cache.prefetch(urls, workers)
+    finally:
+        cache.close()
+
+def parse_args(argv=None):
+    """Analyse les arguments de la ligne de commande"""
+    parser = argparse.ArgumentParser(description='Collecteur des données Paris OpenData')
+    parser.add_argument('--datasets', default=os.getenv('SCRAPER_DATASETS', PARIS_PROJECTS.name),
+                        help=f"Jeux de données à collecter, séparés par des virgules (disponibles: {', '.join(sorted(DATASETS))})")
+    parser.add_argument('--dataset-workers', type=int, default=None,
+                        help="Nombre de jeux de données collectés en parallèle (par défaut: tous)")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('SCRAPER_CONCURRENCY', 1)),
+                        help='Nombre de workers de récupération (1 = mode séquentiel)')
+    parser.add_argument('--rps', type=float, default=float(os.getenv('SCRAPER_RPS', 4)),
+                        help='Plafond de requêtes par seconde partagé entre les workers (débit auto-réglé en dessous)')
+    parser.add_argument('--max-retries', type=int, default=int(os.getenv('SCRAPER_MAX_RETRIES', 5)),
+                        help='Nombre maximal de tentatives par requête (429, 5xx, timeouts)')
+    parser.add_argument('--source', choices=['records', 'export'], default=os.getenv('SCRAPER_SOURCE', 'records'),
+                        help="records: pagination de /records, export: téléchargement en flux de /exports/jsonl")
+    parser.add_argument('--mode', choices=['incremental', 'full', 'rollback'], default=os.getenv('SCRAPER_MODE', 'incremental'),
+                        help="incremental: upsert des modifications depuis la marque haute, "
+                             "full: rechargement dans une table fantôme puis bascule atomique, "
+                             "rollback: remet en service la table précédant le dernier rechargement complet")
+    parser.add_argument('--min-row-ratio', type=float, default=float(os.getenv('SCRAPER_MIN_ROW_RATIO', 0.5)),
+                        help="Part minimale des lignes en service que doit contenir la table fantôme pour être basculée")
+    parser.add_argument('--watermark-field', default=os.getenv('SCRAPER_WATERMARK_FIELD'),
+                        help="Champ de date de modification des enregistrements utilisé pour filtrer la source")
+    parser.add_argument('--pipeline', action='store_true',
+                        default=os.getenv('SCRAPER_PIPELINE', 'false').lower() == 'true',
+                        help="Exécute récupération, transformation et insertion en parallèle")
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help="Taille des files entre les étapes du pipeline")
+    parser.add_argument('--cache-dir', default=os.getenv('SCRAPER_CACHE_DIR', 'http_cache'),
+                        help="Répertoire du cache HTTP conditionnel (chaîne vide pour le désactiver)")
+    parser.add_argument('--cache-max-mb', type=int, default=int(os.getenv('SCRAPER_CACHE_MAX_MB', 200)),
+                        help="Taille maximale du cache HTTP en Mo (éviction LRU)")
+    parser.add_argument('--transform-workers', type=int, default=int(os.getenv('SCRAPER_TRANSFORM_WORKERS', 1)),
+                        help="Nombre de processus de transformation pour les gros lots (1 = dans le processus courant)")
+    parser.add_argument('--commit-every', type=int, default=int(os.getenv('SCRAPER_COMMIT_EVERY', 1)),
+                        help="Nombre de lots insérés entre deux COMMIT (0 = une transaction par run)")
+    parser.add_argument('--load-method', choices=['upsert', 'bulk'], default=os.getenv('SCRAPER_LOAD_METHOD', 'upsert'),
+                        help="upsert: executemany par lot, bulk: fichier TSV chargé par LOAD DATA LOCAL INFILE puis fusionné")
+    parser.add_argument('--bulk-rows', type=int, default=int(os.getenv('SCRAPER_BULK_ROWS', 50000)),
+                        help="Nombre de lignes accumulées avant chaque LOAD DATA en mode bulk")
+    parser.add_argument('--resume', action='store_true',
+                        default=os.getenv('SCRAPER_RESUME', 'false').lower() == 'true',
+                        help="Reprend le dernier run interrompu à son dernier point de reprise validé")
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help="Taille des lots d'insertion en mode export et en décodage en flux")
+    parser.add_argument('--page-size', type=int, default=int(os.getenv('SCRAPER_PAGE_SIZE', 100)),
+                        help="Taille de page maximale demandée à /records (l'API publique la plafonne à 100)")
+    parser.add_argument('--stream-json', action='store_true',
+                        default=os.getenv('SCRAPER_STREAM_JSON', 'false').lower() == 'true',
+                        help="Décode les pages de /records au fil de la réception, par lots de --batch-size")
+    parser.add_argument('--prefetch-thumbnails', action='store_true',
+                        default=os.getenv('SCRAPER_PREFETCH_THUMBNAILS', 'false').lower() == 'true',
+                        help="Génère après la collecte les miniatures des photos (cache THUMBNAIL_CACHE_DIR de l'API)")
+    parser.add_argument('--dedup', choices=['off', 'flag', 'merge'], default=os.getenv('SCRAPER_DEDUP', 'off'),
+                        help="Quasi-doublons des nouvelles lignes (MinHash/LSH et proximité): "
+                             "flag les signale, merge supprime l'ancienne ligne au profit de la nouvelle")
+    parser.add_argument('--no-history', dest='history', action='store_false',
+                        default=os.getenv('SCRAPER_HISTORY', 'true').lower() == 'true',
+                        help="N'enregistre pas l'historique des colonnes modifiées (<table>_history)")
+    parser.add_argument('--history-retention-days', type=int,
+                        default=int(os.getenv('SCRAPER_HISTORY_RETENTION_DAYS', 0)),
+                        help="Durée de conservation de l'historique en jours, purgé par mois entier (0 = illimitée)")
+    parser.add_argument('--lease-ttl', type=float, default=float(os.getenv('SCRAPER_LEASE_TTL', 60)),
+                        help="Durée du bail de collecte d'un jeu de données en secondes, prolongé toutes les "
+                             "ttl/3 s et repris par un autre nœud à expiration (0 = sans bail)")
+    return parser.parse_args(argv)
+
+def run(args, progress_callback: Optional[Callable[[str, int, Optional[int]], None]] = None):
+    """Exécute la collecte décrite par les arguments de parse_args (lève une exception en cas d'échec)"""
     # Configuration de la base de données
     db_config = DatabaseConfig(
         host=os.getenv('DB_HOST', 'localhost'),
@@ -368,19 +1798,67 @@ def main():
         password=os.getenv('DB_PASSWORD', 'root')
     )
     
-    # Initialisation du collecteur
-    collector = ParisOpenDataCollector(db_config)
+    # Cache HTTP conditionnel (ETag / Last-Modified)
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+    
+    names = [name.strip() for name in args.datasets.split(',') if name.strip()]
     
     try:
-        # Suppression des tables existantes
-        collector.drop_existing_table()
-        
-        # Création du schéma de base de données
-        collector.create_database_schema()
-        
-        # Collecte des données
-        collector.collect_all_data()
-        
+        errors = collect_datasets(
+            db_config,
+            names,
+            mode=args.mode,
+            max_workers=args.dataset_workers,
+            concurrency=args.concurrency,
+            requests_per_second=args.rps,
+            page_size=args.page_size,
+            source=args.source,
+            batch_size=args.batch_size,
+            watermark_field=args.watermark_field,
+            commit_every=args.commit_every,
+            pipeline=args.pipeline,
+            queue_size=args.queue_size,
+            cache=cache,
+            transform_workers=args.transform_workers,
+            max_retries=args.max_retries,
+            min_row_ratio=args.min_row_ratio,
+            load_method=args.load_method,
+            bulk_rows=args.bulk_rows,
+            resume=args.resume,
+            stream_json=args.stream_json,
+            dedup=args.dedup,
+            history=args.history,
+            history_retention_days=args.history_retention_days,
+            lease_ttl=args.lease_ttl,
+            progress_callback=progress_callback
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+    
+    if args.prefetch_thumbnails:
+        try:
+            prefetch_thumbnails(
+                db_config,
+                [name for name in names if name not in errors],
+                os.getenv('THUMBNAIL_CACHE_DIR', 'thumbnail_cache'),
+                int(os.getenv('THUMBNAIL_CACHE_MAX_MB', 500)) * 1024 * 1024
+            )
+        except Exception as e:
+            # Les données sont collectées: un échec des miniatures ne fait pas échouer le run
+            logging.error(f"Erreur lors du préchargement des miniatures: {e}")
+    
+    if errors:
+        raise RuntimeError(f"{len(errors)} jeu(x) de données en échec: {'; '.join(f'{name}: {error}' for name, error in sorted(errors.items()))}")
+
+def main(argv=None):
+    """Fonction principale"""
+    args = parse_args(argv)
+    
+    try:
+        run(args)
         logging.info("Processus de collecte terminé avec succès")
         
     except Exception as e:
@@ -390,4 +1868,4 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Script de test de la grille de geo_lookup
+
+Des arrondissements synthétiques (pavage irrégulier, polygone troué avec un
+îlot dans le trou, zone en deux parties, zone concave) sont indexés avec
+plusieurs tailles de cellule, puis des points tirés au hasard sont classés
+par la grille et comparés à une recherche exhaustive par nombre d'enroulement,
+indépendante du test pair-impair de geo_lookup.
+
+    python test_geo_lookup.py --points 20000 --seed 1
+"""
+
+import argparse
+import random
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import transform
+from geo_lookup import ArrondissementIndex, Polygon, Ring
+
+# Emprise des zones synthétiques (longitude, latitude), proche de celle de Paris
+MIN_X, MIN_Y = 2.20, 48.80
+STEP = 0.04
+
+def _winding_number(ring: Ring, x: float, y: float) -> int:
+    """Nombre d'enroulement de l'anneau autour du point"""
+    winding = 0
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        cross = (x2 - x1) * (y - y1) - (x - x1) * (y2 - y1)
+        if y1 <= y < y2 and cross > 0:
+            winding += 1
+        elif y2 <= y < y1 and cross < 0:
+            winding -= 1
+        x1, y1 = x2, y2
+    return winding
+
+def brute_force(areas: Sequence[Tuple[int, List[Polygon]]], x: float, y: float) -> Optional[int]:
+    """Numéro de la zone contenant le point, en testant tous les polygones"""
+    for label, polygons in areas:
+        for polygon in polygons:
+            if _winding_number(polygon[0], x, y) and not any(_winding_number(hole, x, y) for hole in polygon[1:]):
+                return label
+    return None
+
+def synthetic_areas(rng: random.Random) -> List[Tuple[int, List[Polygon]]]:
+    """Pavage 3x3 à sommets décalés, dont une case trouée, plus un îlot, une zone en deux parties et une zone concave"""
+    # Sommets partagés par les cases voisines, décalés pour des limites obliques
+    vertices = {}
+    for i in range(4):
+        for j in range(4):
+            jitter = 0 if i in (0, 3) or j in (0, 3) else STEP * 0.3
+            vertices[i, j] = (MIN_X + i * STEP + rng.uniform(-jitter, jitter),
+                              MIN_Y + j * STEP + rng.uniform(-jitter, jitter))
+    areas = []
+    for i in range(3):
+        for j in range(3):
+            outer = [vertices[i, j], vertices[i + 1, j], vertices[i + 1, j + 1], vertices[i, j + 1]]
+            areas.append((len(areas) + 1, [[outer]]))
+
+    # Trou dans la case centrale et îlot au milieu du trou
+    cx, cy = MIN_X + 1.5 * STEP, MIN_Y + 1.5 * STEP
+    hole = [(cx - 0.012, cy - 0.010), (cx + 0.011, cy - 0.012), (cx + 0.013, cy + 0.011), (cx - 0.010, cy + 0.012)]
+    areas[4][1][0].append(hole)
+    areas.append((10, [[[(cx - 0.004, cy - 0.003), (cx + 0.003, cy - 0.004), (cx + 0.004, cy + 0.004),
+                         (cx - 0.003, cy + 0.003)]]]))
+
+    # Zone en deux parties et zone concave (en U) à droite du pavage
+    right = MIN_X + 3 * STEP
+    areas.append((11, [[[(right, MIN_Y), (right + STEP, MIN_Y), (right + STEP, MIN_Y + STEP), (right, MIN_Y + STEP)]],
+                       [[(right, MIN_Y + 2 * STEP), (right + STEP, MIN_Y + 2 * STEP),
+                         (right + STEP, MIN_Y + 3 * STEP), (right, MIN_Y + 3 * STEP)]]]))
+    areas.append((12, [[[(right, MIN_Y + STEP + 0.002), (right + STEP, MIN_Y + STEP + 0.002),
+                         (right + STEP, MIN_Y + 2 * STEP - 0.002), (right + 0.7 * STEP, MIN_Y + 2 * STEP - 0.002),
+                         (right + 0.7 * STEP, MIN_Y + STEP + 0.012), (right + 0.3 * STEP, MIN_Y + STEP + 0.012),
+                         (right + 0.3 * STEP, MIN_Y + 2 * STEP - 0.002), (right, MIN_Y + 2 * STEP - 0.002)]]]))
+    return areas
+
+class GeoLookupTester:
+    def __init__(self, points: int, seed: int):
+        self.points = points
+        self.rng = random.Random(seed)
+        self.areas = synthetic_areas(self.rng)
+        self.test_results = []
+
+    def log_test(self, test_name: str, success: bool, details: str = ""):
+        """Enregistre le résultat d'un test"""
+        print(f"{'PASS' if success else 'FAIL'} {test_name}")
+        if details:
+            print(f"    {details}")
+        self.test_results.append(success)
+
+    def random_points(self) -> List[Tuple[float, float]]:
+        """Points (latitude, longitude) couvrant l'emprise et ses abords"""
+        return [(self.rng.uniform(MIN_Y - 0.01, MIN_Y + 3 * STEP + 0.01),
+                 self.rng.uniform(MIN_X - 0.01, MIN_X + 4 * STEP + 0.01)) for _ in range(self.points)]
+
+    def test_grid_matches_brute_force(self, cell_size: float):
+        """Toutes les cellules (pleines, vides ou traversées par une limite) donnent la zone exacte"""
+        index = ArrondissementIndex(self.areas, cell_size)
+        points = self.random_points()
+        started = time.perf_counter()
+        found = index.classify(points)
+        elapsed = time.perf_counter() - started
+        mismatches = [(point, got, brute_force(self.areas, point[1], point[0]))
+                      for point, got in zip(points, found) if got != brute_force(self.areas, point[1], point[0])]
+        labels = {label for label in found if label is not None}
+        self.log_test(f"Grille {index.nx}x{index.ny} (cellules de {cell_size}°)", not mismatches,
+                      f"{len(mismatches)} écarts, ex. {mismatches[0]}" if mismatches
+                      else f"{len(points)} points, {len(labels)} zones atteintes, {elapsed * 1000:.0f} ms")
+
+    def test_hole_and_island(self):
+        """Un point du trou est hors zone, un point de l'îlot appartient à l'îlot"""
+        index = ArrondissementIndex(self.areas, 0.0025)
+        cx, cy = MIN_X + 1.5 * STEP, MIN_Y + 1.5 * STEP
+        in_hole, in_island = index.locate(cy + 0.008, cx), index.locate(cy, cx)
+        self.log_test("Trou et îlot", in_hole is None and in_island == 10,
+                      f"trou: {in_hole}, îlot: {in_island}")
+
+    def test_annotate_keeps_records(self):
+        """annotate_arrondissements retourne des copies et ne modifie pas les enregistrements reçus"""
+        index = ArrondissementIndex(self.areas, 0.0025)
+        get_index = transform.get_index
+        transform.get_index = lambda: index
+        try:
+            records = [{'geo_point_2d': {'lat': lat, 'lon': lon}} for lat, lon in self.random_points()[:100]]
+            originals = [dict(record) for record in records]
+            annotated = transform.annotate_arrondissements(records)
+        finally:
+            transform.get_index = get_index
+        expected = [brute_force(self.areas, record['geo_point_2d']['lon'], record['geo_point_2d']['lat'])
+                    for record in records]
+        self.log_test("Enregistrements non modifiés",
+                      records == originals and [record[transform.GEO_ARRONDISSEMENT] for record in annotated] == expected)
+
+    def run_all_tests(self) -> bool:
+        for cell_size in (0.0025, 0.01, 0.05):
+            self.test_grid_matches_brute_force(cell_size)
+        self.test_hole_and_island()
+        self.test_annotate_keeps_records()
+        passed = sum(self.test_results)
+        print(f"Tests réussis: {passed}/{len(self.test_results)}")
+        return passed == len(self.test_results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de la grille de geo_lookup sur des zones synthétiques")
+    parser.add_argument('--points', type=int, default=20000, help="Points tirés par taille de cellule")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    exit(0 if GeoLookupTester(args.points, args.seed).run_all_tests() else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Script de test du cache de miniatures contre le stub OpenData
+
+Les photos sont servies par opendata_stub (/media/<largeur>x<hauteur>.jpg)
+sur un port local; chaque test utilise un répertoire de cache temporaire.
+Couvre le premier accès (téléchargement), les accès suivants (cache), les
+requêtes simultanées sur une même URL (un seul téléchargement, verrou par
+URL libéré), l'éviction LRU et la lecture d'un fichier évincé après son
+ouverture.
+
+    python test_thumbnails.py
+"""
+
+import shutil
+import tempfile
+import threading
+import time
+
+import requests
+
+from opendata_stub import OpenDataStub, StubConfig
+from thumbnails import ThumbnailCache, ThumbnailError
+
+class SlowSession(requests.Session):
+    """Session qui ralentit chaque téléchargement pour que les requêtes simultanées se recouvrent"""
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def get(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return super().get(*args, **kwargs)
+
+class ThumbnailTester:
+    def __init__(self):
+        self.stub = OpenDataStub(StubConfig()).start()
+        host, port = self.stub.server_address[:2]
+        self.media_url = f"http://{host}:{port}/media"
+        self.directories = []
+        self.test_results = []
+
+    def log_test(self, test_name: str, success: bool, details: str = ""):
+        """Enregistre le résultat d'un test"""
+        print(f"{'PASS' if success else 'FAIL'} {test_name}")
+        if details:
+            print(f"    {details}")
+        self.test_results.append(success)
+
+    def new_cache(self, **kwargs) -> ThumbnailCache:
+        directory = tempfile.mkdtemp(prefix='thumbnails-')
+        self.directories.append(directory)
+        return ThumbnailCache(directory, **kwargs)
+
+    def media_requests(self) -> int:
+        return self.stub.stats['media']
+
+    def test_miss_then_hit(self):
+        """Premier accès téléchargé et réduit dans toutes les largeurs, les suivants servis par le cache"""
+        cache = self.new_cache()
+        url = f"{self.media_url}/800x600.jpg"
+        before = self.media_requests()
+        first = cache.get(url, 320)
+        second = cache.get(url, 320)
+        other_width = cache.get(url, 100)
+        requests_made = self.media_requests() - before
+        self.log_test("Téléchargement puis cache",
+                      requests_made == 1 and cache.stats['downloads'] == 1 and cache.stats['hits'] == 2
+                      and first.key == second.key and other_width.width == 160,
+                      f"requêtes /media: {requests_made}, stats: {cache.stats}")
+        cache.close()
+
+    def test_concurrent_same_url(self, threads: int = 8):
+        """Requêtes simultanées sur une même URL: un seul téléchargement, verrou de l'URL retiré ensuite"""
+        cache = self.new_cache(session=SlowSession(0.2))
+        url = f"{self.media_url}/640x480.jpg"
+        barrier = threading.Barrier(threads)
+        results, errors = [], []
+
+        def request():
+            barrier.wait()
+            try:
+                results.append(cache.get(url, 160).key)
+            except Exception as e:
+                errors.append(e)
+
+        before = self.media_requests()
+        workers = [threading.Thread(target=request) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        requests_made = self.media_requests() - before
+        self.log_test(f"{threads} requêtes simultanées",
+                      not errors and len(set(results)) == 1 and len(results) == threads
+                      and requests_made == 1 and cache.stats['downloads'] == 1 and not cache._url_locks,
+                      f"requêtes /media: {requests_made}, erreurs: {errors}, verrous restants: {len(cache._url_locks)}")
+        cache.close()
+
+    def test_eviction(self):
+        """Au-delà de la taille maximale, les miniatures les moins récemment utilisées sont évincées"""
+        probe = self.new_cache()
+        probe.get(f"{self.media_url}/1000x750.jpg")
+        photo_bytes = probe._db.execute("SELECT SUM(size) FROM thumbnails").fetchone()[0]
+        probe.close()
+
+        # Place pour une photo et demie: la deuxième photo évince la première
+        cache = self.new_cache(max_bytes=int(photo_bytes * 1.5))
+        first, second = f"{self.media_url}/1000x750.jpg", f"{self.media_url}/1001x750.jpg"
+        opened = cache.get(first, 640, open_file=True)
+        cache.get(second, 640)
+        total = cache._db.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+        # Le fichier ouvert avant l'éviction reste lisible en entier
+        readable = len(opened.file.read()) == opened.size
+        opened.file.close()
+        before = self.media_requests()
+        cache.get(first, 640)
+        self.log_test("Éviction LRU",
+                      cache.stats['evictions'] > 0 and total <= cache.max_bytes and readable
+                      and self.media_requests() - before == 1,
+                      f"taille {total}/{cache.max_bytes} octets, stats: {cache.stats}, "
+                      f"fichier ouvert lisible: {readable}")
+        cache.close()
+
+    def test_missing_photo(self):
+        """Une photo introuvable lève ThumbnailError et compte une erreur"""
+        cache = self.new_cache()
+        try:
+            cache.get(f"{self.media_url}/absente.jpg")
+            raised = False
+        except ThumbnailError:
+            raised = True
+        self.log_test("Photo introuvable", raised and cache.stats['errors'] == 1 and not cache._url_locks,
+                      f"stats: {cache.stats}")
+        cache.close()
+
+    def run_all_tests(self) -> bool:
+        try:
+            self.test_miss_then_hit()
+            self.test_concurrent_same_url()
+            self.test_eviction()
+            self.test_missing_photo()
+        finally:
+            self.stub.stop()
+            for directory in self.directories:
+                shutil.rmtree(directory, ignore_errors=True)
+        passed = sum(self.test_results)
+        print(f"Tests réussis: {passed}/{len(self.test_results)}")
+        return passed == len(self.test_results)
+
+def main():
+    exit(0 if ThumbnailTester().run_all_tests() else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Limitation de débit, reprises et auto-réglage des appels à l'API OpenData
+
+- TokenBucket: seau à jetons partagé entre les workers, qui peut être mis en
+  pause lorsque l'API renvoie un en-tête Retry-After
+- RetryPolicy: reprises avec backoff exponentiel et gigue sur les erreurs
+  transitoires (429, 5xx, timeouts, coupures réseau)
+- AdaptiveTuner: ajuste débit, concurrence et taille de page selon la
+  latence et le taux d'erreur observés (augmentation additive, diminution
+  multiplicative), sans dépasser le plafond de requêtes par seconde
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+import requests
+
+# Codes HTTP considérés comme transitoires
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Seau à jetons: `rate` requêtes par seconde, rafales jusqu'à `capacity`"""
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def pause(self, seconds: float):
+        """Suspend toutes les requêtes (Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Attend qu'un jeton soit disponible puis le consomme"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """Délai avant la tentative suivante (backoff exponentiel, gigue complète)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def retry_after(response: Optional[requests.Response]) -> Optional[float]:
+        """Délai demandé par l'en-tête Retry-After (secondes ou date HTTP)"""
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class AdaptiveTuner:
+    """Auto-réglage du débit, de la concurrence et de la taille de page"""
+    def __init__(self, bucket: TokenBucket, max_rps: float, max_concurrency: int = 1,
+                 max_page_size: int = 100, min_page_size: int = 20,
+                 target_latency: float = 1.0, window: int = 10):
+        self.bucket = bucket
+        self.max_rps = max_rps
+        self.min_rps = min(0.2, max_rps) if max_rps > 0 else 0.0
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_page_size = max_page_size
+        self.min_page_size = min(min_page_size, max_page_size)
+        self.target_latency = target_latency
+        self.window = window
+
+        self.rps = max_rps / 2 if max_rps > 0 else 0.0
+        self.concurrency = self.max_concurrency
+        self.page_size = max_page_size
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'errors': 0}
+
+        self._latencies = []
+        self._active = 0
+        self._condition = threading.Condition()
+        self.bucket.set_rate(self.rps)
+
+    @contextmanager
+    def slot(self):
+        """Limite le nombre de requêtes simultanées à la concurrence courante"""
+        with self._condition:
+            while self._active >= self.concurrency:
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def record_success(self, latency: float):
+        with self._condition:
+            self.stats['requests'] += 1
+            self._latencies.append(latency)
+            if len(self._latencies) < self.window:
+                return
+            average = sum(self._latencies) / len(self._latencies)
+            self._latencies = []
+            if average <= self.target_latency:
+                # Augmentation additive tant que l'API répond vite
+                if self.max_rps > 0:
+                    self.rps = min(self.max_rps, self.rps + max(0.5, self.max_rps / 10))
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                self.page_size = min(self.max_page_size, self.page_size + 20)
+            elif average > 2 * self.target_latency:
+                self.concurrency = max(1, self.concurrency - 1)
+            self._apply()
+
+    def record_failure(self, kind: str):
+        """Diminution multiplicative après un 429, une erreur 5xx ou un timeout"""
+        with self._condition:
+            self.stats['retries'] += 1
+            self.stats['throttled' if kind == 'throttled' else 'errors'] += 1
+            self._latencies = []
+            if self.max_rps > 0:
+                self.rps = max(self.min_rps, self.rps / 2)
+            self.concurrency = max(1, self.concurrency // 2)
+            if kind == 'timeout':
+                self.page_size = max(self.min_page_size, self.page_size // 2)
+            self._apply()
+
+    def _apply(self):
+        self.bucket.set_rate(self.rps)
+        self._condition.notify_all()
+
+    def log_summary(self):
+        logging.info(
+            f"Débit: {self.stats['requests']} requêtes, {self.stats['retries']} reprises "
+            f"({self.stats['throttled']} limitations 429, {self.stats['errors']} erreurs), "
+            f"réglage final {self.rps:.1f} req/s, concurrence {self.concurrency}, pages de {self.page_size}"
+        )
@@ -0,0 +1,288 @@
+"""
+Miniatures des photos de projets, avec cache disque LRU
+
+Chaque photo source est téléchargée une fois puis réduite dans toutes les
+largeurs de THUMBNAIL_WIDTHS (JPEG). Les miniatures sont indexées par URL et
+empreinte du contenu source: une photo modifiée sous la même URL produit de
+nouvelles clés, et la clé sert d'ETag. Comme ResponseCache, l'index (SQLite)
+garde la date du dernier accès pour évincer les miniatures les moins
+récemment utilisées au-delà de la taille maximale. L'URL source est
+revérifiée après `refresh_after` secondes.
+
+Pillow est nécessaire pour générer les miniatures; le module reste
+importable sans lui (ThumbnailError à la génération).
+"""
+
+import contextvars
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+import requests
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+# Largeurs générées; une largeur demandée est ramenée à la plus proche supérieure
+THUMBNAIL_WIDTHS = (160, 320, 640)
+
+class ThumbnailError(Exception):
+    """Photo source indisponible ou illisible"""
+
+@dataclass
+class Thumbnail:
+    path: str
+    key: str
+    width: int
+    # Fichier ouvert au moment de la lecture du cache (get(open_file=True)): une éviction
+    # ultérieure ne le supprime pas pour le lecteur; à fermer par l'appelant
+    file: Optional[BinaryIO] = None
+    size: Optional[int] = None
+
+def snap_width(width: Optional[int], widths: Iterable[int] = THUMBNAIL_WIDTHS) -> int:
+    """Largeur générée la plus proche au-dessus de `width` (la plus grande au-delà)"""
+    widths = sorted(widths)
+    if not width:
+        return widths[len(widths) // 2]
+    return next((candidate for candidate in widths if candidate >= width), widths[-1])
+
+def render_thumbnails(body: bytes, widths: Iterable[int], quality: int = 80) -> Dict[int, bytes]:
+    """Réduit une image dans chaque largeur (sans agrandissement) et l'encode en JPEG"""
+    if Image is None:
+        raise ThumbnailError("Pillow n'est pas installé")
+    widths = sorted(widths)
+    try:
+        with Image.open(io.BytesIO(body)) as image:
+            # Décodage JPEG directement à une résolution réduite proche de la plus grande largeur
+            image.draft('RGB', (widths[-1], max(1, image.height * widths[-1] // max(1, image.width))))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            thumbnails = {}
+            for width in widths:
+                resized = image
+                if image.width > width:
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.LANCZOS)
+                output = io.BytesIO()
+                resized.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+                thumbnails[width] = output.getvalue()
+            return thumbnails
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"Image illisible: {e}") from e
+
+class ThumbnailCache:
+    def __init__(self, directory: str, max_bytes: int = 500 * 1024 * 1024,
+                 session: Optional[requests.Session] = None, widths: Iterable[int] = THUMBNAIL_WIDTHS,
+                 refresh_after: float = 7 * 24 * 3600, max_source_bytes: int = 20 * 1024 * 1024,
+                 timeout: int = 15):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.widths = tuple(sorted(widths))
+        self.refresh_after = refresh_after
+        self.max_source_bytes = max_source_bytes
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.stats = {'hits': 0, 'downloads': 0, 'errors': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        # Un verrou par URL et le nombre de threads qui l'utilisent: une photo demandée
+        # simultanément n'est téléchargée qu'une fois
+        self._url_locks: Dict[str, List] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT,
+                checked_at REAL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                content_hash TEXT,
+                width INTEGER,
+                size INTEGER,
+                last_access REAL
+            )
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def make_key(url: str, content_hash: str, width: int) -> str:
+        """Clé d'une miniature dérivée de l'URL, de l'empreinte de la source et de la largeur"""
+        return hashlib.sha256(f"{url}#{content_hash}@{width}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    def _cached(self, url: str, width: int, fresh_only: bool = True,
+                open_file: bool = False) -> Optional[Thumbnail]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash, checked_at FROM sources WHERE url = ?", (url,)
+            ).fetchone()
+        if not row or (fresh_only and time.time() - row[1] > self.refresh_after):
+            return None
+        key = self.make_key(url, row[0], width)
+        path = self._path(key)
+        thumbnail = Thumbnail(path, key, width)
+        if open_file:
+            # L'ouverture vaut vérification: le fichier reste lisible même s'il est évincé ensuite
+            try:
+                thumbnail.file = open(path, 'rb')
+            except FileNotFoundError:
+                return None
+            thumbnail.size = os.fstat(thumbnail.file.fileno()).st_size
+        elif not os.path.exists(path):
+            return None
+        with self._lock:
+            self._db.execute("UPDATE thumbnails SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return thumbnail
+
+    @contextmanager
+    def _url_lock(self, url: str):
+        """Verrou de l'URL, retiré du dictionnaire quand plus aucun thread ne l'attend ni ne le détient"""
+        with self._lock:
+            entry = self._url_locks.setdefault(url, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._url_locks[url]
+
+    def get(self, url: str, width: Optional[int] = None, open_file: bool = False) -> Thumbnail:
+        """Retourne la miniature de `url` à la largeur générée la plus proche
+
+        Avec `open_file`, `file` est ouvert dès la lecture du cache (à fermer par l'appelant).
+        """
+        width = snap_width(width, self.widths)
+        thumbnail = self._cached(url, width, open_file=open_file)
+        if thumbnail is not None:
+            self.stats['hits'] += 1
+            return thumbnail
+
+        with self._url_lock(url):
+            # Générée entre-temps par une autre requête
+            thumbnail = self._cached(url, width, open_file=open_file)
+            if thumbnail is not None:
+                self.stats['hits'] += 1
+                return thumbnail
+            try:
+                self._generate(url)
+            except ThumbnailError:
+                self.stats['errors'] += 1
+                raise
+            # Lue avant de rendre le verrou, sans attendre une éviction par une autre génération
+            thumbnail = self._cached(url, width, fresh_only=False, open_file=open_file)
+        if thumbnail is None:
+            raise ThumbnailError(f"Miniature évincée aussitôt générée (cache trop petit): {url}")
+        return thumbnail
+
+    def _download(self, url: str) -> bytes:
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                body = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    body.extend(chunk)
+                    if len(body) > self.max_source_bytes:
+                        raise ThumbnailError(f"Photo trop volumineuse (> {self.max_source_bytes} octets): {url}")
+                return bytes(body)
+        except requests.exceptions.RequestException as e:
+            raise ThumbnailError(f"Photo indisponible: {e}") from e
+
+    def _generate(self, url: str):
+        """Télécharge la source et génère toutes les largeurs si son contenu a changé"""
+        body = self._download(url)
+        self.stats['downloads'] += 1
+        content_hash = hashlib.md5(body).hexdigest()
+        missing = [width for width in self.widths
+                   if not os.path.exists(self._path(self.make_key(url, content_hash, width)))]
+        if missing:
+            for width, data in render_thumbnails(body, missing).items():
+                self._store(self.make_key(url, content_hash, width), url, content_hash, width, data)
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO sources (url, content_hash, checked_at) VALUES (?, ?, ?)
+            """, (url, content_hash, time.time()))
+            self._db.commit()
+        self._evict()
+
+    def _store(self, key: str, url: str, content_hash: str, width: int, data: bytes):
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO thumbnails (key, url, content_hash, width, size, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, url, content_hash, width, len(data), time.time()))
+            self._db.commit()
+
+    def _evict(self):
+        """Supprime les miniatures les moins récemment utilisées au-delà de la taille maximale"""
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self._db.execute(
+                "SELECT key, size FROM thumbnails ORDER BY last_access ASC"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+                self._db.execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+                total -= size
+                self.stats['evictions'] += 1
+            self._db.commit()
+
+    def prefetch(self, urls: Iterable[str], workers: int = 4) -> Dict[str, int]:
+        """Génère à l'avance les miniatures des URLs données (les photos déjà en cache sont ignorées)"""
+        urls = list(dict.fromkeys(url for url in urls if url))
+        before = dict(self.stats)
+
+        def fetch(url: str):
+            try:
+                self.get(url)
+            except ThumbnailError as e:
+                logging.warning(f"Miniature non générée pour {url}: {e}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Chaque tâche hérite du contexte de l'appelant (logs du job en cours)
+            for future in [executor.submit(contextvars.copy_context().run, fetch, url) for url in urls]:
+                future.result()
+        summary = {name: self.stats[name] - before[name] for name in ('hits', 'downloads', 'errors')}
+        logging.info(f"Miniatures: {len(urls)} photos, {summary['downloads']} téléchargées, "
+                     f"{summary['hits']} déjà en cache, {summary['errors']} en erreur")
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,245 @@
+"""
+Transformation des enregistrements Paris se transforme en lignes prêtes à insérer
+
+Les lignes sont des tuples dans l'ordre de PROJECT_COLUMNS, directement
+utilisables par `cursor.executemany`. `transform_batch` traite une page ou un
+lot d'export entier (les dates passent par le normaliseur mémoïsé de
+date_parser), et les gros lots peuvent être répartis sur un pool de
+processus. L'arrondissement est déduit des coordonnées par geo_lookup (un
+appel de classification par lot), le code postal ne servant qu'en l'absence
+de point ou de fichier de limites.
+"""
+
+import hashlib
+import json
+import logging
+import math
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from date_parser import DateStats, date_normalizer
+from geo_lookup import get_index
+
+# Colonnes de paris_projects alimentées par le collecteur, dans l'ordre des lignes
+DATA_COLUMNS = (
+    'record_id', 'nom_projet', 'description', 'categorie', 'sous_categorie',
+    'arrondissement', 'adresse', 'code_postal', 'latitude', 'longitude',
+    'etat_avancement', 'date_debut', 'date_fin', 'budget', 'maitre_ouvrage',
+    'url_parisfr', 'url_photo', 'credit_photo'
+)
+PROJECT_COLUMNS = DATA_COLUMNS + ('content_hash',)
+
+# Positions utilisées pour la validation des lignes
+RECORD_ID = PROJECT_COLUMNS.index('record_id')
+LATITUDE = PROJECT_COLUMNS.index('latitude')
+LONGITUDE = PROJECT_COLUMNS.index('longitude')
+CONTENT_HASH = PROJECT_COLUMNS.index('content_hash')
+DATE_DEBUT = PROJECT_COLUMNS.index('date_debut')
+DATE_FIN = PROJECT_COLUMNS.index('date_fin')
+BUDGET = PROJECT_COLUMNS.index('budget')
+
+# Motifs de rejet de validate_project_rows (code enregistré avec la ligne rejetée -> libellé)
+REJECT_REASONS = {
+    'missing_coordinates': "coordonnées manquantes",
+    'invalid_coordinates': "coordonnées hors des plages valides",
+    'outside_paris': "coordonnées hors de l'emprise de Paris",
+    'date_order': "date de fin antérieure à la date de début",
+    'invalid_budget': "budget négatif ou aberrant",
+}
+# Emprise de Paris, bois de Boulogne et de Vincennes compris (lat min, lon min, lat max, lon max)
+PARIS_BOUNDS = (48.80, 2.20, 48.92, 2.48)
+MAX_BUDGET = 10_000_000_000
+
+# Clé ajoutée aux copies des enregistrements bruts par annotate_arrondissements
+GEO_ARRONDISSEMENT = '_arrondissement'
+
+def parse_date(date_str: str) -> Optional[str]:
+    """Parse une date depuis différents formats"""
+    return date_normalizer.normalize(date_str)
+
+def compute_content_hash(project: Dict) -> str:
+    """Calcule une empreinte stable du contenu d'un projet traité"""
+    content = {key: value for key, value in project.items() if key != 'content_hash'}
+    serialized = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(serialized.encode()).hexdigest()
+
+def record_point(record: Dict) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) du champ geo_point_2d, ou None"""
+    geo_point = record.get('geo_point_2d')
+    if not isinstance(geo_point, dict):
+        return None
+    try:
+        return float(geo_point['lat']), float(geo_point['lon'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def annotate_arrondissements(records: List[Dict]) -> List[Dict]:
+    """Classe les points d'un lot en un appel
+    
+    Retourne des copies des enregistrements portant le numéro d'arrondissement;
+    les enregistrements reçus (page ou lot de l'appelant) ne sont pas modifiés.
+    """
+    index = get_index()
+    if index is None:
+        return records
+    numbers = index.classify([record_point(record) for record in records])
+    return [{**record, GEO_ARRONDISSEMENT: number} for record, number in zip(records, numbers)]
+
+def postal_arrondissement(code_postal: Optional[str]) -> Optional[int]:
+    """Numéro d'arrondissement d'un code postal parisien (750xx)"""
+    if code_postal and code_postal.startswith('750'):
+        try:
+            arr_num = int(code_postal[-2:])
+            if 1 <= arr_num <= 20:
+                return arr_num
+        except (ValueError, TypeError):
+            pass
+    return None
+
+def transform_record(record: Dict, parse: Callable[[str], Optional[str]] = parse_date) -> Tuple:
+    """Transforme un enregistrement brut en ligne (ordre de PROJECT_COLUMNS)"""
+
+    # Extraction des coordonnées géographiques
+    geo_point = record.get('geo_point_2d')
+    latitude = longitude = None
+    if geo_point and isinstance(geo_point, dict):
+        latitude = geo_point.get('lat')
+        longitude = geo_point.get('lon')
+
+    # Nettoyage du budget
+    budget = None
+    if record.get('budget'):
+        try:
+            budget = float(str(record['budget']).replace('€', '').replace(',', '.').strip())
+        except (ValueError, AttributeError):
+            pass
+
+    # Arrondissement contenant le point (classé par lot dans transform_batch si le jeu de données
+    # le demande), sinon code postal
+    code_postal = record.get('code_postal')
+    if GEO_ARRONDISSEMENT in record:
+        arr_num = record[GEO_ARRONDISSEMENT]
+    else:
+        index = get_index()
+        point = record_point(record) if index is not None else None
+        arr_num = index.locate(*point) if point is not None else None
+    if arr_num is None:
+        arr_num = postal_arrondissement(code_postal)
+    arrondissement = f"{arr_num}e arrondissement" if arr_num is not None else None
+
+    # Génération d'un record_id unique basé sur le titre et l'adresse
+    record_id = None
+    titre = record.get('titre_descriptif', '')
+    adresse = record.get('adresse', '')
+    if titre or adresse:
+        unique_string = f"{titre}_{adresse}_{code_postal}"
+        record_id = hashlib.md5(unique_string.encode()).hexdigest()
+
+    values = (
+        record_id,
+        record.get('titre_descriptif'),
+        record.get('corps_descriptif'),
+        record.get('categorie'),
+        record.get('sous_categorie'),
+        arrondissement,
+        record.get('adresse'),
+        record.get('code_postal'),
+        latitude,
+        longitude,
+        record.get('sous_categorie'),
+        parse(record.get('date_debut')),
+        parse(record.get('date_liv')),
+        budget,
+        record.get('categorie'),
+        record.get('url_parisfr'),
+        record.get('url_pj'),
+        record.get('credit_photo')
+    )
+    return values + (compute_content_hash(dict(zip(DATA_COLUMNS, values))),)
+
+def validate_project_rows(rows: List[Tuple]) -> List[Optional[Tuple[str, str]]]:
+    """Valide un lot de lignes colonne par colonne
+
+    Retourne pour chaque ligne None si elle est valide, sinon le code du
+    premier motif de rejet (voir REJECT_REASONS) et son détail.
+    """
+    reasons: List[Optional[Tuple[str, str]]] = [None] * len(rows)
+    if not rows:
+        return reasons
+    columns = list(zip(*rows))
+    min_lat, min_lon, max_lat, max_lon = PARIS_BOUNDS
+
+    def reject(index: int, code: str, detail: str):
+        if reasons[index] is None:
+            reasons[index] = (code, detail)
+
+    # Les contrôles sont appliqués par ordre de priorité, seul le premier motif est conservé
+    for index, (latitude, longitude) in enumerate(zip(columns[LATITUDE], columns[LONGITUDE])):
+        if latitude is None or longitude is None:
+            reject(index, 'missing_coordinates', "coordonnées manquantes")
+        elif not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180):
+            reject(index, 'invalid_coordinates', f"coordonnées invalides ({latitude}, {longitude})")
+        elif not (min_lat <= latitude <= max_lat) or not (min_lon <= longitude <= max_lon):
+            reject(index, 'outside_paris', f"coordonnées hors de Paris ({latitude}, {longitude})")
+    for index, (date_debut, date_fin) in enumerate(zip(columns[DATE_DEBUT], columns[DATE_FIN])):
+        # Dates normalisées au format YYYY-MM-DD: l'ordre lexicographique est chronologique
+        if date_debut and date_fin and date_fin < date_debut:
+            reject(index, 'date_order', f"date de fin {date_fin} antérieure au début {date_debut}")
+    for index, budget in enumerate(columns[BUDGET]):
+        if budget is not None and not (math.isfinite(budget) and 0 <= budget <= MAX_BUDGET):
+            reject(index, 'invalid_budget', f"budget hors limites ({budget})")
+    return reasons
+
+def row_to_project(row: Tuple) -> Dict:
+    """Convertit une ligne en dictionnaire colonne -> valeur"""
+    return dict(zip(PROJECT_COLUMNS, row))
+
+def project_to_row(project: Dict) -> Tuple:
+    """Convertit un dictionnaire de projet en ligne"""
+    return tuple(project.get(column) for column in PROJECT_COLUMNS)
+
+def transform_batch(records: List[Dict], transform: Callable[[Dict], Tuple] = transform_record,
+                    date_stats: Optional[DateStats] = None, classify_arrondissements: bool = False) -> List[Tuple]:
+    """Transforme un lot d'enregistrements bruts en lignes
+
+    Les enregistrements en erreur sont ignorés avec un avertissement, comme
+    dans le traitement unitaire. Les compteurs de dates du lot sont ajoutés
+    à `date_stats`. Avec `classify_arrondissements` (option du jeu de
+    données), les points du lot sont d'abord classés par arrondissement.
+    """
+    if classify_arrondissements:
+        records = annotate_arrondissements(records)
+    rows = []
+    append = rows.append
+    with date_normalizer.recording() as batch_stats:
+        for record in records:
+            try:
+                append(transform(record))
+            except Exception as e:
+                logging.warning(f"Erreur lors du traitement de l'enregistrement {record.get('record_id', 'unknown')}: {e}")
+    if date_stats is not None:
+        date_stats.merge(batch_stats)
+    return rows
+
+def _transform_chunk(records: List[Dict], transform: Callable[[Dict], Tuple],
+                     classify_arrondissements: bool = False) -> Tuple[List[Tuple], DateStats]:
+    """Exécuté dans un processus de transformation: lignes et compteurs de dates du morceau"""
+    stats = DateStats()
+    return transform_batch(records, transform, stats, classify_arrondissements), stats
+
+def transform_batch_parallel(records: List[Dict], executor: Executor, chunk_size: int = 2000,
+                             transform: Callable[[Dict], Tuple] = transform_record,
+                             date_stats: Optional[DateStats] = None,
+                             classify_arrondissements: bool = False) -> List[Tuple]:
+    """Répartit un gros lot sur un pool de processus en conservant l'ordre des lignes"""
+    if len(records) <= chunk_size:
+        return transform_batch(records, transform, date_stats, classify_arrondissements)
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+    rows = []
+    worker = partial(_transform_chunk, transform=transform, classify_arrondissements=classify_arrondissements)
+    for chunk_rows, chunk_stats in executor.map(worker, chunks):
+        rows.extend(chunk_rows)
+        if date_stats is not None:
+            date_stats.merge(chunk_stats)
+    return rows
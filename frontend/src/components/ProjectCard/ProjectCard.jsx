@@ -3,6 +3,7 @@ import styled from 'styled-components';
 import { FiMapPin, FiCalendar, FiDollarSign, FiExternalLink } from 'react-icons/fi';
 import { format } from 'date-fns';
 import { fr } from 'date-fns/locale';
+import { dataService } from '../../services/api';
 
 const Card = styled.div`
   background: white;
@@ -182,6 +183,7 @@ const formatDate = (dateString) => {
 
 const ProjectCard = ({ project, onClick }) => {
   const {
+    id,
     nomProjet,
     description,
     categorie,
@@ -208,7 +210,7 @@ const ProjectCard = ({ project, onClick }) => {
 
   return (
     <Card onClick={handleClick}>
-      <CardImage hasImage={!!urlPhoto} imageUrl={urlPhoto}>
+      <CardImage hasImage={!!urlPhoto} imageUrl={urlPhoto && dataService.getThumbnailUrl(id)}>
         {!urlPhoto && '🏗️'}
         {urlPhoto && creditPhoto && (
           <div style={{
@@ -52,6 +52,7 @@ const StatusBadge = styled.div`
           color: #dc2626;
         `;
       case 'timeout':
+      case 'cancelled':
         return `
           background: #fef3c7;
           color: #d97706;
@@ -167,6 +168,7 @@ const ScraperControl = () => {
   const lastStatus = status.last_status;
   const lastRun = status.last_run ? new Date(status.last_run).toLocaleString('fr-FR') : 'Jamais';
   const lastError = status.last_error;
+  const job = status.job;
 
   const getStatusIcon = () => {
     if (isRunning) return <FiRefreshCw className="spin" />;
@@ -177,6 +179,7 @@ const ScraperControl = () => {
       case 'error':
         return <FiX />;
       case 'timeout':
+      case 'cancelled':
         return <FiClock />;
       default:
         return <FiAlertCircle />;
@@ -193,6 +196,8 @@ const ScraperControl = () => {
         return 'Erreur';
       case 'timeout':
         return 'Timeout';
+      case 'cancelled':
+        return 'Annulé';
       default:
         return 'Inactif';
     }
@@ -244,6 +249,17 @@ const ScraperControl = () => {
               {!lastStatus ? 'Aucun' : getStatusText()}
             </StatusValue>
           </StatusCard>
+
+          {job && (
+            <StatusCard>
+              <StatusLabel>Progression</StatusLabel>
+              <StatusValue>
+                {job.records} enregistrements
+                {job.percent_complete != null && ` (${job.percent_complete} %)`}
+                {` · ${job.records_per_second} enr/s`}
+              </StatusValue>
+            </StatusCard>
+          )}
         </StatusGrid>
 
         {lastError && (
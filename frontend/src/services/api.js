@@ -47,12 +47,21 @@ export const dataService = {
     return api.get(`/projects/${id}`);
   },
   
+  getProjectHistory: (id, limit = 100) => {
+    return api.get(`/projects/${id}/history`, { params: { limit } });
+  },
+  
   getStatistics: () => {
     return api.get('/statistics');
   },
   
   getMetadata: () => {
     return api.get('/metadata');
+  },
+  
+  // URL de la miniature servie (et mise en cache) par le backend
+  getThumbnailUrl: (id, width = 640) => {
+    return `${api.defaults.baseURL}/projects/${id}/thumbnail?w=${width}`;
   }
 };
 